@@ -0,0 +1,192 @@
+'''
+Benchmark of the total scenario pipeline (run_rea_scenario_total) on synthetic scenario tables
+Runs headless (no Excel): the model is either the native engine or a fake backend with trivial arithmetic,
+so fake results measure pipeline overhead (ingestion, solver calls, csv/journal writes, logging) only
+Each table size runs in a fresh process; scenarios/sec, peak memory (RSS) and per-stage times (run_metrics.json)
+are stored in benchmarks/results/<commit>.json so two commits can be compared
+
+Run from the scripts folder:
+    python -m benchmarks.pipeline_benchmark --sizes 10 1000 100000 --backend fake
+    python -m benchmarks.pipeline_benchmark --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+'''
+import argparse
+from datetime import datetime
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import git
+import numpy as np
+import pandas as pd
+import models.rea.backends as rea_backends
+import util.analysis_util as analysis_util
+from util.constants import *
+from util.run_metrics import METRICS_FILE
+
+BENCHMARK_DIR = Path(__file__).parent
+RESULTS_FOLDER = BENCHMARK_DIR / 'results'
+DEFAULT_SIZES = (10, 1000, 100000)
+BASE_CONFIG = 'total_exhibits_config.json'
+
+class FakeBackend(rea_backends.REABackend):
+    '''Backend with closed-form arithmetic in place of the REA model (gains linear in annual reintroduction)'''
+
+    def __init__(self, config, main_logger = None, warning_logger = None):
+        super().__init__(config, main_logger, warning_logger)
+        self.inputs = dict(config['excel'].get('input_values_default', {}))
+        self.outputs = {}
+
+    def set_inputs(self, input_values, scenario_number):
+        self.inputs.update(input_values)
+
+    def get_input(self, key):
+        return self.inputs[key]
+
+    def set_input(self, key, value):
+        self.inputs[key] = value
+
+    def calculate(self):
+        direct_loss = float(self.inputs['number_killed'])
+        indirect_loss = direct_loss * self.inputs['maximum_age'] / 100
+        gain_per_individual = self.inputs['no_reintroduction_years'] / self.inputs['discount_factor']
+        self.outputs = {
+            'direct_loss': direct_loss,
+            'indirect_loss': indirect_loss,
+            'total_loss': direct_loss + indirect_loss,
+            'total_gains': self.inputs['annual_reintroduction'] * gain_per_individual,
+        }
+
+    def loss_ratio(self):
+        return self.outputs['total_gains'] / self.outputs['total_loss']
+
+    def get_output(self, key):
+        return self.outputs[key]
+
+    def read_outputs(self, output_cells, decimals):
+        return {key: round(self.outputs[key], decimals) for key in output_cells}
+
+    def qc_status(self):
+        return 'PASS'
+
+def synthetic_scenarios(size, seed = 0) -> pd.DataFrame:
+    '''Scenario table with every REAScenarioInputs field varied over plausible ranges'''
+    rng = np.random.default_rng(seed)
+    start_year = rng.integers(2000, 2030, size)
+    return pd.DataFrame({
+        'scenario_name': [f's{number}' for number in range(size)],
+        'number_killed': rng.integers(1000, 1000000, size),
+        'start_year_analysis': start_year,
+        'start_year_reproduction': start_year + rng.integers(0, 3, size),
+        'discount_start_year': start_year,
+        'maximum_age': rng.choice([10, 30, 60], size),
+        'discount_factor': rng.choice([1.0, 1.03, 1.05], size),
+        'no_reintroduction_years': rng.integers(1, 20, size),
+        'start_year_reintroduction': start_year + rng.integers(0, 10, size),
+        'annual_reintroduction': rng.integers(100, 100000, size),
+    })
+
+def _run_size(size, backend, work_dir, queue):
+    '''Runs pipeline on a synthetic table in this (fresh) process and puts its measurements on queue'''
+    with open(CONFIG_DIR / BASE_CONFIG) as f:
+        config = json.load(f)
+    source_dir = Path(work_dir) / 'source'
+    source_dir.mkdir(parents=True, exist_ok=True)
+    synthetic_scenarios(size).to_csv(source_dir / config['files']['input_file'], index=False)
+    #fake and native backends never open the REA workbook
+    (source_dir / config['files']['rea_file']).write_bytes(b'')
+    config['directories']['copy_source'] = str(source_dir)
+    config['misc'].update(model_engine='native', workers=1)
+    #times the pipeline, not the model (runners refuse the native engine while it is experimental)
+    config['native_model']['experimental'] = False
+    config['result_cache']['enabled'] = False
+    config_file = Path(work_dir) / 'benchmark_config.json'
+    with open(config_file, 'w') as f:
+        json.dump(config, f)
+
+    if backend == 'fake':
+        rea_backends.create_backend = lambda config, rea_file = None, main_logger = None, warning_logger = None: FakeBackend(config, main_logger, warning_logger)
+    #progress lines for every scenario are not useful here
+    sys.stdout = sys.stderr = open(os.devnull, 'w')
+
+    analysis_util.run_rea_scenario_total(config_file, use_cache=False)
+
+    run_directory = max(RESULTS_DIR.glob(f'{Path(sys.modules["__main__"].__file__).stem}_*'), key=os.path.getmtime)
+    with open(run_directory / METRICS_FILE) as f:
+        metrics = json.load(f)
+    shutil.rmtree(run_directory)
+    queue.put({
+        'scenarios': size,
+        'seconds': metrics['run_seconds'],
+        'scenarios_per_second': size / metrics['run_seconds'],
+        #ru_maxrss is in kilobytes on Linux
+        'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': metrics['stages'],
+    })
+
+def run_benchmarks(sizes = DEFAULT_SIZES, backend = 'fake') -> dict:
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            queue = context.Queue()
+            process = context.Process(target=_run_size, args=(size, backend, work_dir, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+        print(f'{size} scenarios: {result["scenarios_per_second"]:.1f} scenarios/sec, {result["peak_memory_mb"]:.0f} MB peak')
+        results.append(result)
+
+    repo = git.Repo(search_parent_directories=True)
+    return {
+        'commit': repo.head.object.hexsha,
+        'dirty': repo.is_dirty(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'backend': backend,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+def save_results(results, path = None) -> Path:
+    path = Path(path) if path else RESULTS_FOLDER / f'{results["commit"][:10]}{"-dirty" if results["dirty"] else ""}_{results["backend"]}.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def compare(base_file, new_file):
+    '''Print scenarios/sec, peak memory and mean stage times of new results relative to base results'''
+    with open(base_file) as f:
+        base = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+    print(f'{base["commit"][:10]} ({base["backend"]}) -> {new["commit"][:10]} ({new["backend"]})')
+    base_results = {result['scenarios']: result for result in base['results']}
+    for result in new['results']:
+        old = base_results.get(result['scenarios'])
+        if old is None:
+            continue
+        print(f'{result["scenarios"]} scenarios: {old["scenarios_per_second"]:.1f} -> {result["scenarios_per_second"]:.1f} scenarios/sec '
+              f'(x{result["scenarios_per_second"] / old["scenarios_per_second"]:.2f}), '
+              f'{old["peak_memory_mb"]:.0f} -> {result["peak_memory_mb"]:.0f} MB peak')
+        for stage, stats in result['stages'].items():
+            if stage in old['stages'] and old['stages'][stage]['mean'] > 0:
+                print(f'  {stage}: mean {old["stages"][stage]["mean"] * 1000:.3f} -> {stats["mean"] * 1000:.3f} ms '
+                      f'(x{stats["mean"] / old["stages"][stage]["mean"]:.2f})')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='scenario table sizes to benchmark')
+    parser.add_argument('--backend', choices=['fake', 'native'], default='fake', help='model backend (fake measures pipeline overhead only)')
+    parser.add_argument('--output', help='results file (default benchmarks/results/<commit>_<backend>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='compare two results files instead of running')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        print(f'Results written to {save_results(run_benchmarks(args.sizes, args.backend), args.output)}')
@@ -0,0 +1,335 @@
+'''
+Model backends for evaluating REA scenarios
+Runners talk to a backend instead of the workbook directly so the model engine can be selected in the config file:
+    "misc": {"model_engine": "excel"}   -> live Excel instance of the REA workbook (xlwings)
+    "misc": {"model_engine": "native"}  -> NumPy implementation in models.rea.engine
+    "misc": {"model_engine": "compiled"} -> workbook formulas compiled to Python (models.rea.workbook_compiler)
+'''
+import hashlib
+import json
+import logging
+from pathlib import Path
+import chincheron_util.excel_util as xl
+import models.rea.engine as rea_engine
+import models.rea.model_pool as model_pool
+import models.rea.workbook_compiler as workbook_compiler
+import util.constants as constants
+import util.excel_util as excel_util
+
+DEFAULT_ENGINE = 'excel'
+
+class REABackend:
+    '''Common interface for objects that evaluate REA scenarios'''
+
+    #Excel GoalSeek defaults
+    goal_seek_max_iterations = 100
+    goal_seek_max_change = 0.001
+
+    def __init__(self, config, main_logger: logging.Logger | None = None, warning_logger: logging.Logger | None = None):
+        self.config = config
+        self.input_cells = config['excel']['input_cells']
+        self.output_cells = config['excel'].get('output_cells_excluded', {})
+        self.main_logger = main_logger if main_logger is not None else logging.getLogger(__name__)
+        self.warning_logger = warning_logger if warning_logger is not None else logging.getLogger(__name__)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def process_id(self):
+        '''Id of an external process running the model (e.g., Excel) so a hung instance can be stopped; None if in process'''
+        return None
+
+    def _loss_ratio_at(self, annual_reintroduction):
+        self.set_input('annual_reintroduction', annual_reintroduction)
+        self.calculate()
+        return self.loss_ratio()
+
+    def run_goal_seek(self, target_value):
+        '''Set loss ratio to target value by changing annual reintroduction (secant iteration, like Excel GoalSeek)'''
+        x0 = float(self.get_input('annual_reintroduction')) or 1.0
+        x1 = x0 * 1.01
+        f0 = self._loss_ratio_at(x0) - target_value
+        evaluations = 1
+        #starting value already solves the scenario (e.g. warm start from a near identical scenario)
+        if abs(f0) < self.goal_seek_max_change:
+            return evaluations
+        for _ in range(self.goal_seek_max_iterations):
+            f1 = self._loss_ratio_at(x1) - target_value
+            evaluations += 1
+            if abs(f1) < self.goal_seek_max_change or f1 == f0:
+                break
+            x0, x1, f0 = x1, x1 - f1 * (x1 - x0) / (f1 - f0), f1
+        self.set_input('annual_reintroduction', x1)
+        return evaluations
+
+class ExcelBackend(REABackend):
+    '''Evaluates scenarios through a live Excel instance of the REA workbook'''
+
+    def __init__(self, rea_file: Path | str, config, main_logger = None, warning_logger = None):
+        super().__init__(config, main_logger, warning_logger)
+        self.rea_file = Path(rea_file)
+        self.sheet_name = config['excel']['sheet_name']['input_sheet']
+        self.wb = None
+        self.app = None
+        self.sheet = None
+        #cell block plans for bulk range I/O, planned once per run for each set of keys
+        self._plans = {}
+
+    def _plan(self, cells):
+        plan_key = tuple(cells.items())
+        if plan_key not in self._plans:
+            self._plans[plan_key] = excel_util.plan_cell_blocks(cells)
+        return self._plans[plan_key]
+
+    def open(self):
+        self.wb, self.app = xl.load_workbook(self.rea_file)
+        self.main_logger.info(f'REA model workbook loaded ({self.rea_file})')
+        self.sheet = xl.load_worksheet(self.wb, self.sheet_name, self.warning_logger)
+        self.main_logger.info(f'REA input sheet loaded ({self.sheet})')
+
+    def close(self):
+        if self.wb: self.wb.close()
+        if self.app: self.app.quit()
+        self.wb = None
+        self.app = None
+        self.sheet = None
+
+    def process_id(self):
+        return self.app.pid if self.app else None
+
+    def set_inputs(self, input_values, scenario_number):
+        '''Write all inputs with as few range operations as possible'''
+        cells = {key: self.input_cells[key] for key in input_values if key in self.input_cells}
+        excel_util.write_blocks(self.sheet, self._plan(cells), input_values)
+        self.main_logger.info(f'Scenario {scenario_number}: Excel cells set to scenario inputs')
+
+    def get_input(self, key):
+        return self.sheet[self.input_cells[key]].value
+
+    def set_input(self, key, value):
+        self.sheet[self.input_cells[key]].value = value
+
+    def run_goal_seek(self, target_value):
+        '''Set loss ratio to target value by changing annual reintroduction (Excel GoalSeek)'''
+        xl.run_goal_seek(self.sheet, self.input_cells['loss_ratio'], self.input_cells['annual_reintroduction'], target_value)
+
+    def loss_ratio(self):
+        return self.sheet[self.input_cells['loss_ratio']].value
+
+    def calculate(self):
+        self.wb.app.calculate()
+
+    def get_output(self, key):
+        return self.sheet[self.output_cells[key]].value
+
+    def read_outputs(self, output_cells, decimals):
+        '''Read all outputs with as few range operations as possible (e.g., all yearly ranges as one block)'''
+        return excel_util.read_blocks(self.sheet, self._plan(output_cells), decimals)
+
+    def qc_status(self):
+        return self.sheet[self.input_cells['qc_test']].value
+
+class NativeBackend(REABackend):
+    '''
+    Evaluates scenarios with the NumPy REA engine (no Excel required)
+    Experimental (see models.rea.engine); a warning is logged while native_model.experimental is true in the config
+    '''
+
+    def __init__(self, config, main_logger = None, warning_logger = None):
+        super().__init__(config, main_logger, warning_logger)
+        native_config = config['native_model']
+        self.horizon_years = native_config['horizon_years']
+        self.demographics = rea_engine.Demographics.from_config(native_config)
+        self.inputs = dict(config['excel'].get('input_values_default', {}))
+        self.results = None
+        #loss and unit gain trajectories are only recomputed when the inputs they depend on change
+        self.trajectory_cache = rea_engine.TrajectoryCache(native_config.get('trajectory_cache_entries', rea_engine.DEFAULT_TRAJECTORY_CACHE_ENTRIES))
+
+    def open(self):
+        self.main_logger.info(f'Native REA engine loaded (version {rea_engine.ENGINE_VERSION})')
+        if self.config['native_model'].get('experimental', True):
+            self.warning_logger.warning('Native REA engine is experimental: native_model demographics are placeholders and results are not verified against the workbook')
+
+    def close(self):
+        if self.trajectory_cache.hits or self.trajectory_cache.misses:
+            self.main_logger.info(self.trajectory_cache.summary())
+
+    def set_inputs(self, input_values, scenario_number):
+        self.inputs.update(input_values)
+        self.results = None
+        self.main_logger.info(f'Scenario {scenario_number}: Native engine inputs set to scenario inputs')
+
+    def get_input(self, key):
+        return self.inputs[key]
+
+    def set_input(self, key, value):
+        self.inputs[key] = value
+        self.results = None
+
+    def calculate(self):
+        self.results = rea_engine.evaluate(self.inputs, self.demographics, self.horizon_years, self.trajectory_cache)
+        return self.results
+
+    def loss_ratio(self):
+        return self._current_results()['loss_ratio']
+
+    def _current_results(self):
+        if self.results is None:
+            self.calculate()
+        return self.results
+
+    def get_output(self, key):
+        return self._current_results()[key]
+
+    def read_outputs(self, output_cells, decimals):
+        results = self._current_results()
+        outputs = {}
+        for key in output_cells:
+            value = results[key]
+            if hasattr(value, 'tolist'):
+                value = value.tolist()
+            outputs[key] = xl.round_cells(value, decimals)
+        return outputs
+
+    def qc_status(self):
+        return self._current_results()['qc_test']
+
+    def evaluate_batch(self, scenarios):
+        '''Evaluate a whole scenario table in one vectorized pass (see models.rea.engine.evaluate_batch)'''
+        defaults = self.config['excel'].get('input_values_default', {})
+        return rea_engine.evaluate_batch(scenarios, self.demographics, self.horizon_years, defaults, cache=self.trajectory_cache)
+
+class CompiledWorkbookBackend(REABackend):
+    '''
+    Evaluates scenarios with the REA workbook's formulas compiled to Python (no Excel required)
+    Compiled graphs are cached in compiled_model.cache_dir (relative to the project folder), keyed by workbook hash
+    '''
+
+    def __init__(self, rea_file: Path | str, config, main_logger = None, warning_logger = None):
+        super().__init__(config, main_logger, warning_logger)
+        self.rea_file = Path(rea_file)
+        self.sheet_name = config['excel']['sheet_name']['input_sheet']
+        cache_dir = Path(config.get('compiled_model', {}).get('cache_dir', 'cache/compiled_models'))
+        self.cache_dir = cache_dir if cache_dir.is_absolute() else constants.PROJECT_BASE_DIR / cache_dir
+        self.model = None
+
+    def open(self):
+        #loss ratio and QC cells are listed with the inputs in config but are formulas read back as outputs
+        formula_cells = ('loss_ratio', 'qc_test')
+        input_cells = {key: cell for key, cell in self.input_cells.items() if key not in formula_cells}
+        output_cells = {
+            **{key: self.input_cells[key] for key in formula_cells if key in self.input_cells},
+            **self.config['excel'].get('output_cells_excluded', {}),
+            **self.config['excel'].get('output_cells_excluded_yearly', {}),
+        }
+        self.model = workbook_compiler.compile_workbook(self.rea_file, self.sheet_name, input_cells, output_cells, self.cache_dir, self.main_logger)
+        self.main_logger.info(f'REA model workbook compiled ({self.rea_file})')
+
+    def close(self):
+        self.model = None
+
+    def set_inputs(self, input_values, scenario_number):
+        for key, value in input_values.items():
+            self.model.set_input(key, value)
+        self.main_logger.info(f'Scenario {scenario_number}: Compiled workbook inputs set to scenario inputs')
+
+    def get_input(self, key):
+        return self.model.read(self.input_cells[key], self.sheet_name)
+
+    def set_input(self, key, value):
+        self.model.set_input(key, value)
+
+    def calculate(self):
+        self.model.calculate()
+
+    def get_output(self, key):
+        return self.model.read(self.output_cells[key], self.sheet_name)
+
+    def read_outputs(self, output_cells, decimals):
+        return {key: xl.round_cells(self.model.read(cell, self.sheet_name), decimals) for key, cell in output_cells.items()}
+
+    def loss_ratio(self):
+        return self.model.read(self.input_cells['loss_ratio'], self.sheet_name)
+
+    def qc_status(self):
+        return self.model.read(self.input_cells['qc_test'], self.sheet_name)
+
+def check_qc(qc_test, failed_writer, csv_data, scenario_number, main_logger = None, warning_logger = None):
+    '''
+    Checks result of model QC tests (from backend.qc_status) and write input/outputs to file if not "PASS"
+    failed_writer is the CSVResultWriter for the failed scenario file
+    '''
+
+    #setup loggers
+    if main_logger is None:
+        main_logger = logging.getLogger(__name__)
+    if warning_logger is None:
+        warning_logger = logging.getLogger(__name__)
+
+    main_logger.info(f'Checking whether model QC tests pass')
+    if qc_test == 'PASS':
+        main_logger.info(f'Scenario {scenario_number}: QC test passed: {qc_test}')
+    else:
+        main_logger.warning(f'Scenario {scenario_number}: QC test failed')
+        warning_logger.warning(f'Scenario {scenario_number}: QC test failed')
+        failed_writer.write_row(csv_data)
+        warning_logger.warning(f'Scenario {scenario_number}: Failed scenario inputs/outputs written to failed scenario outputs file ')
+
+def create_backend(config, rea_file: Path | str | None = None, main_logger = None, warning_logger = None) -> REABackend:
+    '''
+    Create model backend specified by "model_engine" in the misc section of the config file
+    If the model_pool section is enabled, returns a client of the model pool daemon instead (see models.rea.model_pool)
+    '''
+    if config.get('model_pool', {}).get('enabled', False):
+        return model_pool.ModelPoolClient.from_config(config, model_fingerprint(config, rea_file), main_logger, warning_logger)
+    engine = config.get('misc', {}).get('model_engine', DEFAULT_ENGINE)
+    if engine == 'excel':
+        return ExcelBackend(rea_file, config, main_logger, warning_logger)
+    elif engine == 'native':
+        return NativeBackend(config, main_logger, warning_logger)
+    elif engine == 'compiled':
+        return CompiledWorkbookBackend(rea_file, config, main_logger, warning_logger)
+    else:
+        raise ValueError(f'Unknown model engine "{engine}" (expected "excel", "native" or "compiled")')
+
+def require_verified_engine(config):
+    '''
+    Raise ValueError if the config uses the native engine while native_model.experimental is true
+    Called by the runners that write report results; the flag is only cleared once the native engine matches the
+    recorded workbook outputs (tests/record_workbook_golden.py, golden test in tests/rea_engine_test.py)
+    '''
+    engine = config.get('misc', {}).get('model_engine', DEFAULT_ENGINE)
+    if engine == 'native' and config.get('native_model', {}).get('experimental', True):
+        raise ValueError('Native REA engine is experimental (native_model demographics are placeholders and results are not verified '
+                         'against the workbook); use the excel or compiled engine for report results')
+
+#native_model settings that do not change results (cache sizes, status flags); changing them keeps cached results valid
+NATIVE_SETTINGS_NOT_IN_FINGERPRINT = ('trajectory_cache_entries', 'experimental')
+
+def model_fingerprint(config, rea_file: Path | str | None = None) -> str:
+    '''
+    Hash identifying the model that produces results: engine plus workbook contents (excel/compiled)
+    or engine version and demographic settings (native)
+    Used by the result cache so stored results are only reused for the same model
+    '''
+    engine = config.get('misc', {}).get('model_engine', DEFAULT_ENGINE)
+    digest = hashlib.sha256(engine.encode())
+    if engine == 'native':
+        native_model = {key: value for key, value in config.get('native_model', {}).items() if key not in NATIVE_SETTINGS_NOT_IN_FINGERPRINT}
+        spec = {'engine_version': rea_engine.ENGINE_VERSION, 'native_model': native_model}
+        digest.update(json.dumps(spec, sort_keys=True).encode())
+    else:
+        if engine == 'compiled':
+            digest.update(workbook_compiler.COMPILER_VERSION.encode())
+        digest.update(Path(rea_file).read_bytes())
+    return digest.hexdigest()
@@ -0,0 +1,416 @@
+'''
+Native NumPy implementation of the REA age-structured (Leslie matrix) loss/gain model
+Mirrors the REA workbook so scenarios can be evaluated without Excel
+Output keys match the output_cells_excluded and output_cells_excluded_yearly sections of the config files
+
+Experimental: the demographics in the native_model section of the configs are placeholders, qc_test only approximates
+the workbook QC tests, and results have not been checked against recorded workbook outputs (the golden test in
+tests/rea_engine_test.py is skipped until tests/record_workbook_golden.py is run on a machine with Excel)
+The total and yearly runners refuse the native engine while native_model.experimental is true (see
+models.rea.backends.require_verified_engine); use the excel or compiled engine for report results
+
+All kernels work on a batch of scenarios at once (struct-of-arrays, one entry per scenario)
+Scenarios with a smaller maximum_age are padded with empty age classes; shorter horizons are masked
+
+Loss and unit gain trajectories (the population projections) depend only on a subset of the inputs (TRAJECTORY_INPUTS)
+and can be memoized in a TrajectoryCache: changing annual reintroduction (goal seek, rounding) or the discounting reuses
+both, and scenarios that differ only in their restoration inputs reuse the losses
+'''
+from collections import OrderedDict
+from dataclasses import dataclass, astuple
+import numpy as np
+import pandas as pd
+import models.rea.inputs as rea_input_class
+
+ENGINE_VERSION = '1.1.0'
+
+#scenarios evaluated together; bounds memory of the (scenarios x years) trajectories and yearly outputs
+DEFAULT_CHUNK_SIZE = 2048
+#trajectories kept by a TrajectoryCache (each is one or two arrays of horizon_years values)
+DEFAULT_TRAJECTORY_CACHE_ENTRIES = 4096
+
+INPUT_FIELDS = tuple(rea_input_class.REAScenarioInputs.__dataclass_fields__)
+TOTAL_OUTPUTS = ('direct_loss', 'indirect_loss', 'total_loss', 'total_gains')
+YEARLY_OUTPUTS = (
+    'years',
+    'discount_factor',
+    'direct_loss_yearly',
+    'indirect_loss_yearly',
+    'total_loss_yearly',
+    'total_gain_yearly',
+    'direct_loss_yearly_cumulative',
+    'indirect_loss_yearly_cumulative',
+    'total_loss_yearly_cumulative',
+    'total_gain_yearly_cumulative',
+    'discount_period',
+)
+
+#inputs each trajectory depends on (besides demographics and horizon); annual reintroduction only scales the unit gains
+#and discount_start_year/discount_factor only enter in summarize
+TRAJECTORY_INPUTS = {
+    'losses': ('number_killed', 'start_year_analysis', 'start_year_reproduction', 'maximum_age'),
+    'unit_gains': ('start_year_analysis', 'start_year_reproduction', 'maximum_age', 'start_year_reintroduction', 'no_reintroduction_years'),
+}
+
+def _per_scenario(value):
+    '''Reshape scalar or per-scenario value to a column for broadcasting against (scenarios, ages)'''
+    return np.reshape(np.asarray(value, dtype=float), (-1, 1))
+
+@dataclass
+class Demographics:
+    '''
+    Demographic rates used to build the Leslie matrix
+    Age classes run from 0 to maximum_age - 1; individuals in the last age class do not survive to the next year
+    Rates may be scalars or arrays with one value per scenario
+    '''
+    juvenile_survival: float
+    adult_survival: float
+    age_at_maturity: int
+    fecundity: float
+
+    @classmethod
+    def from_config(cls, native_config):
+        '''Create class object from the native_model section of a config file'''
+        demographics_config = native_config['demographics']
+        return cls(**{field_name: demographics_config[field_name] for field_name in cls.__dataclass_fields__})
+
+    def survival_rates(self, maximum_age):
+        '''
+        Annual survival from each age class to the next
+        Returns 1D array for a scalar maximum_age, or (scenarios, max ages) array padded with zero survival
+        '''
+        maximum_ages = np.atleast_1d(maximum_age).astype(int)
+        ages = np.arange(maximum_ages.max())
+        survival = np.where(ages < _per_scenario(self.age_at_maturity), _per_scenario(self.juvenile_survival), _per_scenario(self.adult_survival))
+        survival = np.where(ages < maximum_ages[:, None] - 1, survival, 0.0)
+        return survival[0] if np.ndim(maximum_age) == 0 else survival
+
+    def fecundity_rates(self, maximum_age):
+        '''
+        Age 0 recruits produced per individual in each age class
+        Returns 1D array for a scalar maximum_age, or (scenarios, max ages) array padded with zero fecundity
+        '''
+        maximum_ages = np.atleast_1d(maximum_age).astype(int)
+        ages = np.arange(maximum_ages.max())
+        fecundity = np.where(ages >= _per_scenario(self.age_at_maturity), _per_scenario(self.fecundity), 0.0)
+        fecundity = np.where(ages < maximum_ages[:, None], fecundity, 0.0)
+        return fecundity[0] if np.ndim(maximum_age) == 0 else fecundity
+
+def scenario_arrays(scenarios, defaults = None):
+    '''
+    Build struct-of-arrays (dict of REAScenarioInputs field -> 1D float array) for a batch of scenarios
+    scenarios may be a DataFrame, a dict of columns or a list of input dicts
+    Missing columns and missing (NaN) values are filled from defaults (e.g., input_values_default in config)
+    '''
+    if isinstance(scenarios, pd.DataFrame):
+        columns = {column: scenarios[column].to_numpy() for column in scenarios.columns}
+    elif isinstance(scenarios, dict):
+        columns = {key: np.atleast_1d(value) for key, value in scenarios.items()}
+    else:
+        scenarios = pd.DataFrame(list(scenarios))
+        columns = {column: scenarios[column].to_numpy() for column in scenarios.columns}
+
+    defaults = defaults or {}
+    size = max((len(values) for values in columns.values()), default=0)
+    arrays = {}
+    for field_name in INPUT_FIELDS:
+        default = defaults.get(field_name, np.nan)
+        values = pd.to_numeric(pd.Series(columns.get(field_name, np.full(size, np.nan))), errors='coerce').to_numpy(dtype=float)
+        values = np.where(np.isnan(values), default, values)
+        if np.isnan(values).any():
+            raise ValueError(f'Scenario input "{field_name}" missing and no default provided')
+        arrays[field_name] = values
+    return arrays
+
+def leslie_matrices(survival, fecundity, reproduction = True):
+    '''Build dense Leslie matrices (fecundity in first row, survival on the subdiagonal) for each scenario'''
+    survival = np.atleast_2d(survival)
+    scenarios, size = survival.shape
+    matrices = np.zeros((scenarios, size, size))
+    if reproduction:
+        matrices[:, 0, :] = np.atleast_2d(fecundity)
+    matrices[:, np.arange(1, size), np.arange(size - 1)] = survival[:, :-1]
+    return matrices
+
+def leslie_matrix(survival, fecundity, reproduction = True):
+    '''Build dense Leslie matrix for a single scenario'''
+    return leslie_matrices(survival, fecundity, reproduction)[0]
+
+def killed_age_distribution(survival, number_killed):
+    '''Distributes killed individuals across age classes in proportion to survivorship'''
+    survival = np.atleast_2d(survival)
+    survivorship = np.concatenate((np.ones((len(survival), 1)), np.cumprod(survival[:, :-1], axis=1)), axis=1)
+    distribution = _per_scenario(number_killed) * survivorship / survivorship.sum(axis=1, keepdims=True)
+    return distribution if np.ndim(number_killed) else distribution[0]
+
+def project(initial, survival, fecundity, reproduction_mask, additions = None):
+    '''
+    Project age-structured populations through time and return the total population in each year
+    initial, survival and fecundity are (scenarios, ages); reproduction_mask and additions are (scenarios, years)
+    reproduction_mask flags the years whose transition includes reproduction
+    additions (optional) are individuals added to age class 0 in each year (e.g., reintroductions)
+    Returns array of shape (scenarios, years)
+    The Leslie matrix is applied in compact form, O(ages) per year instead of O(ages^2): births are the fecundity row
+    times the population and the survival subdiagonal shifts each age class into the next (same results as project_dense)
+    '''
+    survival = np.atleast_2d(survival)
+    fecundity = np.atleast_2d(fecundity)
+    reproduction_mask = np.atleast_2d(reproduction_mask)
+    horizon = reproduction_mask.shape[1]
+    #survival from each age class into the next; the last age class does not survive
+    transition = survival[:, :-1]
+
+    population = np.array(np.atleast_2d(initial), dtype=float)
+    if additions is not None:
+        additions = np.atleast_2d(additions)
+        population[:, 0] += additions[:, 0]
+    totals = np.zeros((len(population), horizon))
+    totals[:, 0] = population.sum(axis=1)
+    for t in range(1, horizon):
+        births = np.einsum('sa,sa->s', fecundity, population)
+        population[:, 1:] = transition * population[:, :-1]
+        population[:, 0] = np.where(reproduction_mask[:, t - 1], births, 0.0)
+        if additions is not None:
+            population[:, 0] += additions[:, t]
+        totals[:, t] = population.sum(axis=1)
+    return totals
+
+def project_dense(initial, survival, fecundity, reproduction_mask, additions = None):
+    '''
+    Reference projection multiplying by dense Leslie matrices each year (O(ages^2) per year)
+    Same arguments and results as project; kept to check the compact kernel against
+    '''
+    survival_only = leslie_matrices(survival, fecundity, reproduction=False)
+    fecundity = np.atleast_2d(fecundity)
+    reproduction_mask = np.atleast_2d(reproduction_mask)
+    horizon = reproduction_mask.shape[1]
+
+    population = np.array(np.atleast_2d(initial), dtype=float)
+    if additions is not None:
+        additions = np.atleast_2d(additions)
+        population[:, 0] += additions[:, 0]
+    totals = np.zeros((len(population), horizon))
+    totals[:, 0] = population.sum(axis=1)
+    for t in range(1, horizon):
+        births = np.einsum('sa,sa->s', fecundity, population)
+        population = np.matmul(survival_only, population[:, :, None])[:, :, 0]
+        population[:, 0] += np.where(reproduction_mask[:, t - 1], births, 0.0)
+        if additions is not None:
+            population[:, 0] += additions[:, t]
+        totals[:, t] = population.sum(axis=1)
+    return totals
+
+def timeline(inputs, horizon_years):
+    '''Return years of the analysis, discount periods and discount factors for each scenario and year'''
+    years = _per_scenario(inputs['start_year_analysis']).astype(int) + np.arange(horizon_years)
+    discount_period = years - _per_scenario(inputs['discount_start_year']).astype(int)
+    discount = _per_scenario(inputs['discount_factor']) ** (-discount_period.astype(float))
+    return years, discount_period, discount
+
+def loss_trajectories_batch(inputs, demographics, horizon_years):
+    '''Undiscounted yearly direct and indirect losses (individuals) caused by the kill, shape (scenarios, years)'''
+    years, _, _ = timeline(inputs, horizon_years)
+    maximum_ages = np.atleast_1d(inputs['maximum_age'])
+    survival = demographics.survival_rates(maximum_ages)
+    fecundity = demographics.fecundity_rates(maximum_ages)
+    killed = killed_age_distribution(survival, np.atleast_1d(inputs['number_killed']).astype(float))
+
+    no_reproduction = np.zeros(years.shape, dtype=bool)
+    reproduction = years >= _per_scenario(inputs['start_year_reproduction'])
+    direct = project(killed, survival, fecundity, no_reproduction)
+    total = project(killed, survival, fecundity, reproduction)
+    return direct, total - direct
+
+def unit_gain_trajectory_batch(inputs, demographics, horizon_years):
+    '''Undiscounted yearly gains (individuals) from reintroducing one individual per reintroduction year, shape (scenarios, years)'''
+    years, _, _ = timeline(inputs, horizon_years)
+    maximum_ages = np.atleast_1d(inputs['maximum_age'])
+    survival = demographics.survival_rates(maximum_ages)
+    fecundity = demographics.fecundity_rates(maximum_ages)
+
+    start = _per_scenario(inputs['start_year_reintroduction'])
+    releases = ((years >= start) & (years < start + _per_scenario(inputs['no_reintroduction_years']))).astype(float)
+    reproduction = years >= _per_scenario(inputs['start_year_reproduction'])
+    return project(np.zeros(survival.shape), survival, fecundity, reproduction, releases)
+
+def loss_trajectories(inputs, demographics, horizon_years):
+    '''Undiscounted yearly direct and indirect losses (individuals) for a single scenario'''
+    direct, indirect = loss_trajectories_batch(inputs, demographics, horizon_years)
+    return direct[0], indirect[0]
+
+def unit_gain_trajectory(inputs, demographics, horizon_years):
+    '''Undiscounted yearly gains from reintroducing one individual per reintroduction year for a single scenario'''
+    return unit_gain_trajectory_batch(inputs, demographics, horizon_years)[0]
+
+class TrajectoryCache:
+    '''
+    Memo of loss and unit gain trajectories keyed by the inputs they depend on (TRAJECTORY_INPUTS), demographics and horizon
+    Least recently used trajectories are dropped beyond max_entries; per-scenario (array) demographics are not cached
+    '''
+
+    def __init__(self, max_entries = DEFAULT_TRAJECTORY_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def losses(self, inputs, demographics, horizon_years):
+        '''Same as loss_trajectories_batch, computing only trajectories not in the cache'''
+        return self._trajectories('losses', loss_trajectories_batch, inputs, demographics, horizon_years)
+
+    def unit_gains(self, inputs, demographics, horizon_years):
+        '''Same as unit_gain_trajectory_batch, computing only trajectories not in the cache'''
+        return self._trajectories('unit_gains', lambda *args: (unit_gain_trajectory_batch(*args),), inputs, demographics, horizon_years)[0]
+
+    def _trajectories(self, kind, compute, inputs, demographics, horizon_years):
+        if any(np.ndim(value) for value in vars(demographics).values()):
+            return compute(inputs, demographics, horizon_years)
+        context = (kind, horizon_years, astuple(demographics))
+        keys = [context + row for row in zip(*(np.asarray(inputs[field_name]).tolist() for field_name in TRAJECTORY_INPUTS[kind]))]
+        #first scenario of each trajectory not cached
+        missing = {}
+        for index, key in enumerate(keys):
+            if key not in self.entries and key not in missing:
+                missing[key] = index
+        #held here as well so a batch larger than the cache does not evict its own trajectories
+        computed = {}
+        if missing:
+            indices = np.fromiter(missing.values(), dtype=int, count=len(missing))
+            arrays = compute({field_name: values[indices] for field_name, values in inputs.items()}, demographics, horizon_years)
+            for position, key in enumerate(missing):
+                computed[key] = tuple(array[position] for array in arrays)
+                self.entries[key] = computed[key]
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+
+        rows = []
+        for key in keys:
+            if key in computed:
+                rows.append(computed[key])
+            else:
+                self.entries.move_to_end(key)
+                rows.append(self.entries[key])
+        return tuple(np.stack([row[position] for row in rows]) for position in range(len(rows[0])))
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return f'Trajectory cache: {self.hits} reused, {self.misses} computed ({rate:.0%} reused), {len(self.entries)} held'
+
+def summarize(years, discount_period, discount, direct, indirect, gains, year_mask = None):
+    '''
+    Discount yearly trajectories and build the output dictionary
+    Yearly arguments are (scenarios, years); years outside year_mask are excluded from totals and set to NaN
+    '''
+    if year_mask is None:
+        year_mask = np.ones(np.shape(direct), dtype=bool)
+    direct_yearly = np.where(year_mask, direct * discount, 0.0)
+    indirect_yearly = np.where(year_mask, indirect * discount, 0.0)
+    total_loss_yearly = direct_yearly + indirect_yearly
+    total_gain_yearly = np.where(year_mask, gains * discount, 0.0)
+
+    yearly = {
+        'years': years,
+        'discount_factor': discount,
+        'direct_loss_yearly': direct_yearly,
+        'indirect_loss_yearly': indirect_yearly,
+        'total_loss_yearly': total_loss_yearly,
+        'total_gain_yearly': total_gain_yearly,
+        'direct_loss_yearly_cumulative': np.cumsum(direct_yearly, axis=-1),
+        'indirect_loss_yearly_cumulative': np.cumsum(indirect_yearly, axis=-1),
+        'total_loss_yearly_cumulative': np.cumsum(total_loss_yearly, axis=-1),
+        'total_gain_yearly_cumulative': np.cumsum(total_gain_yearly, axis=-1),
+        'discount_period': discount_period,
+    }
+    results = {
+        'direct_loss': direct_yearly.sum(axis=-1),
+        'indirect_loss': indirect_yearly.sum(axis=-1),
+        'total_loss': total_loss_yearly.sum(axis=-1),
+        'total_gains': total_gain_yearly.sum(axis=-1),
+    }
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results['loss_ratio'] = np.where(results['total_loss'] != 0, results['total_gains'] / results['total_loss'], np.nan)
+    results['qc_test'] = qc_test(yearly, results, year_mask)
+
+    yearly_array = np.stack([np.asarray(yearly[key], dtype=float) for key in YEARLY_OUTPUTS], axis=-1)
+    yearly_array[~year_mask] = np.nan
+    results['yearly'] = yearly_array
+    results['year_mask'] = year_mask
+    return results
+
+def qc_test(yearly, totals, year_mask):
+    '''Heuristic checks in the spirit of the workbook QC tests (not the same tests); returns array of "PASS"/"FAIL" (one per scenario)'''
+    passed = np.ones(len(year_mask), dtype=bool)
+    for key in YEARLY_OUTPUTS:
+        if key in ('years', 'discount_period'):
+            continue
+        values = np.where(year_mask, yearly[key], 0.0)
+        scale = np.abs(values).max(axis=-1)
+        passed &= np.isfinite(values).all(axis=-1)
+        passed &= (values >= -1e-9 * scale[:, None]).all(axis=-1)
+    passed &= np.isclose(yearly['total_loss_yearly_cumulative'][:, -1], totals['total_loss'])
+    return np.where(passed, 'PASS', 'FAIL')
+
+def evaluate_batch(scenarios, demographics, horizon_years, defaults = None, chunk_size = DEFAULT_CHUNK_SIZE, cache: TrajectoryCache | None = None):
+    '''
+    Evaluate a batch of scenarios in one vectorized pass
+    scenarios is a DataFrame, dict of columns or list of input dicts (see scenario_arrays)
+    horizon_years may be an int or one value per scenario (shorter horizons are masked)
+    cache (optional) supplies loss and unit gain trajectories computed for earlier scenarios with the same inputs
+    Returns dict with:
+        'yearly': array (scenarios x years x series) in YEARLY_OUTPUTS order (NaN outside each scenario's horizon)
+        'year_mask': boolean array (scenarios x years)
+        total outputs, 'loss_ratio' and 'qc_test': one value per scenario
+    '''
+    inputs = scenario_arrays(scenarios, defaults)
+    size = len(inputs['number_killed'])
+    horizons = np.broadcast_to(np.asarray(horizon_years, dtype=int), (size,))
+    max_horizon = int(horizons.max()) if size else 0
+
+    chunks = []
+    for start in range(0, size, chunk_size):
+        chunk = {key: values[start:start + chunk_size] for key, values in inputs.items()}
+        year_mask = np.arange(max_horizon) < horizons[start:start + chunk_size, None]
+        years, discount_period, discount = timeline(chunk, max_horizon)
+        chunk_demographics = _demographics_slice(demographics, start, chunk_size)
+        if cache is None:
+            direct, indirect = loss_trajectories_batch(chunk, chunk_demographics, max_horizon)
+            unit_gains = unit_gain_trajectory_batch(chunk, chunk_demographics, max_horizon)
+        else:
+            direct, indirect = cache.losses(chunk, chunk_demographics, max_horizon)
+            unit_gains = cache.unit_gains(chunk, chunk_demographics, max_horizon)
+        gains = _per_scenario(chunk['annual_reintroduction']) * unit_gains
+        chunks.append(summarize(years, discount_period, discount, direct, indirect, gains, year_mask))
+
+    if not chunks:
+        return {'yearly': np.zeros((0, max_horizon, len(YEARLY_OUTPUTS))), 'year_mask': np.zeros((0, max_horizon), dtype=bool),
+                **{key: np.zeros(0) for key in (*TOTAL_OUTPUTS, 'loss_ratio')}, 'qc_test': np.zeros(0, dtype=str)}
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+def _demographics_slice(demographics, start, chunk_size):
+    '''Select the chunk of per-scenario demographic rates (scalar rates are shared)'''
+    return Demographics(**{
+        field_name: value[start:start + chunk_size] if np.ndim(value) else value
+        for field_name, value in vars(demographics).items()
+    })
+
+def scenario_results(batch_results, index):
+    '''Extract a single scenario from evaluate_batch results in the same layout as evaluate'''
+    mask = batch_results['year_mask'][index]
+    results = {key: batch_results['yearly'][index, mask, position] for position, key in enumerate(YEARLY_OUTPUTS)}
+    results['years'] = results['years'].astype(int)
+    results['discount_period'] = results['discount_period'].astype(int)
+    for key in (*TOTAL_OUTPUTS, 'loss_ratio'):
+        results[key] = float(batch_results[key][index])
+    results['qc_test'] = str(batch_results['qc_test'][index])
+    return results
+
+def evaluate(inputs, demographics, horizon_years, cache: TrajectoryCache | None = None):
+    '''
+    Evaluate a single scenario
+    inputs is a dict of REAScenarioInputs fields
+    Returns dict containing the total outputs, yearly outputs, loss ratio and QC test result
+    '''
+    return scenario_results(evaluate_batch([inputs], demographics, horizon_years, cache=cache), 0)
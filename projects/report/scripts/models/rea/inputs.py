@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field, asdict
 import json
 import pandas as pd
+from pathlib import Path
 
 def load_config(config_path='config.json'):
     """Load configuration from JSON file"""
@@ -67,3 +68,59 @@ class REAScenarioInputs:
         return asdict(self)
 
 
+
+
+INPUT_FIELDS = tuple(REAScenarioInputs.__dataclass_fields__)
+
+class ScenarioBatch:
+    '''
+    Columnar batch of scenario inputs built once from a scenario table (one list per REAScenarioInputs field)
+    Defaults are merged with the table column-wise: missing columns and missing (NaN) values take the default
+    Replaces creating a REAScenarioInputs object (and re-reading the config file) for every scenario
+    '''
+    __slots__ = ('names', 'columns')
+
+    def __init__(self, names, columns):
+        self.names = names
+        self.columns = columns
+
+    @classmethod
+    def from_table(cls, scenarios: pd.DataFrame, default_values: dict):
+        '''Create batch from scenario table and input_values_default from the config file'''
+        columns = {}
+        for field_name in INPUT_FIELDS:
+            default = default_values.get(field_name)
+            if field_name in scenarios.columns:
+                column = scenarios[field_name]
+                columns[field_name] = [value if present else default for value, present in zip(column.tolist(), column.notna().tolist())]
+            else:
+                columns[field_name] = [default] * len(scenarios)
+        names = scenarios['scenario_name'].tolist() if 'scenario_name' in scenarios.columns else [None] * len(scenarios)
+        return cls(names, columns)
+
+    def __len__(self):
+        return len(self.names)
+
+    def inputs(self, index) -> dict:
+        '''Scenario inputs of one scenario (0-based index) as a dict (same as REAScenarioInputs.to_dict)'''
+        return {field_name: values[index] for field_name, values in self.columns.items()}
+
+    def records(self):
+        '''Yields (scenario number, scenario name, scenario inputs dict) with scenario numbers starting at 1'''
+        for index, scenario_name in enumerate(self.names):
+            yield index + 1, scenario_name, self.inputs(index)
+
+    def batches(self, batch_size = 2048):
+        '''Yields ScenarioBatch chunks of at most batch_size scenarios (same as models.rea.sweeps.Sweep.batches)'''
+        for start in range(0, len(self), batch_size):
+            yield ScenarioBatch(self.names[start:start + batch_size], {field_name: values[start:start + batch_size] for field_name, values in self.columns.items()})
+
+def read_scenario_tables(scenario_file) -> dict:
+    '''
+    Read every scenario table in the scenario input file in one pass: {worksheet name: DataFrame}
+    csv files hold a single table, keyed by file name without suffix
+    '''
+    scenario_file = Path(scenario_file)
+    if scenario_file.suffix.lower() == '.csv':
+        return {scenario_file.stem: pd.read_csv(scenario_file)}
+    return pd.read_excel(scenario_file, sheet_name=None)
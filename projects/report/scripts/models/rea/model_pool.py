@@ -0,0 +1,418 @@
+'''
+Warm pool of model backends served over a local socket
+A pool daemon keeps instances of the model open (e.g., Excel with the REA workbook loaded), each in its own process,
+and evaluates scenarios sent by runs, so runs skip model startup and a run that dies leaves no instances behind:
+    python -m models.rea.model_pool total_exhibits_config.json
+Runs evaluate scenarios on the pool when the model_pool section of their config file is enabled:
+    "model_pool": {"enabled": true, "address": ["localhost", 50621], "instances": 2,
+                   "health_check_seconds": 30, "request_timeout_seconds": 300}
+Idle instances are pinged every health_check_seconds; an instance that does not answer a ping or a request in time is
+killed (with its Excel process) and restarted
+Each daemon authenticates clients with a random key written to authkey_file (default cache/model_pool.key in the project
+folder, readable only by the user who started the daemon) and only evaluates requests for the model it has loaded
+(same models.rea.backends.model_fingerprint as the run)
+'''
+from datetime import datetime
+import logging
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+import os
+from pathlib import Path
+import queue
+import secrets
+import shutil
+import signal
+import threading
+import chincheron_util.config as config_util
+import util.logger_setup as logger_setup
+from util.constants import *
+
+DEFAULT_ADDRESS = ('localhost', 50621)
+DEFAULT_AUTHKEY_FILE = 'cache/model_pool.key'
+AUTHKEY_BYTES = 32
+DEFAULT_INSTANCES = 2
+DEFAULT_HEALTH_CHECK_SECONDS = 30
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 300
+#seconds allowed for an instance to load its model and for a ping to be answered
+START_TIMEOUT_SECONDS = 300
+PING_TIMEOUT_SECONDS = 10
+
+class ModelPoolError(RuntimeError):
+    '''Request could not be evaluated by the pool (instance hung, died or none available)'''
+
+def pool_settings(config) -> dict:
+    '''Settings of the model_pool section of the config file with defaults'''
+    pool_config = config.get('model_pool', {})
+    return {
+        'address': tuple(pool_config.get('address', DEFAULT_ADDRESS)),
+        'authkey_file': Path(PROJECT_BASE_DIR) / pool_config.get('authkey_file', DEFAULT_AUTHKEY_FILE),
+        'instances': pool_config.get('instances', DEFAULT_INSTANCES),
+        'health_check_seconds': pool_config.get('health_check_seconds', DEFAULT_HEALTH_CHECK_SECONDS),
+        'request_timeout_seconds': pool_config.get('request_timeout_seconds', DEFAULT_REQUEST_TIMEOUT_SECONDS),
+    }
+
+def write_authkey(path: Path | str) -> bytes:
+    '''New random key for a pool daemon, written to a file only the current user can read (mode 0600)'''
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    authkey = secrets.token_bytes(AUTHKEY_BYTES)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+        f.write(authkey)
+    return authkey
+
+def read_authkey(path: Path | str) -> bytes:
+    try:
+        return Path(path).read_bytes()
+    except FileNotFoundError:
+        raise ModelPoolError(f'No model pool key found at {path} (is the pool daemon running?)')
+
+def _instance_main(connection, config, rea_file, log_directory, backend_factory):
+    '''
+    Instance process: load the model once, then answer requests from the daemon until told to close
+    Requests: ('ping',), ('evaluate', kind, request config, args) and ('close',)
+    '''
+    #imported here: analysis_util and backends import this module
+    import models.rea.backends as rea_backends
+    import util.analysis_util as analysis_util
+
+    main_logger, warning_logger, detail_logger, _ = logger_setup.setup_loggers(log_directory, config['misc'].get('detail_logging', True))
+    backend = None
+    try:
+        backend = (backend_factory or rea_backends.create_backend)(config, rea_file, main_logger, warning_logger)
+        backend.open()
+        connection.send(('ready', backend.process_id()))
+        while True:
+            request = connection.recv()
+            if request[0] == 'close':
+                break
+            try:
+                if request[0] == 'ping':
+                    reply = ('ok', None)
+                else:
+                    _, kind, request_config, args = request
+                    evaluate = getattr(analysis_util, f'evaluate_scenario_{kind}')
+                    reply = ('ok', evaluate(backend, request_config, *args, main_logger, warning_logger, detail_logger))
+            except Exception as e:
+                warning_logger.error(f'Pool request {request[0]} failed', exc_info=e)
+                reply = ('error', repr(e))
+            connection.send(reply)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if backend is not None:
+            backend.close()
+        logger_setup.close_loggers()
+
+class _Instance:
+    '''Daemon side of one instance process'''
+
+    def __init__(self, number, config, rea_file, directory, backend_factory, logger):
+        self.number = number
+        self.config = config
+        self.rea_file = rea_file
+        self.directory = Path(directory) / f'instance_{number}'
+        self.backend_factory = backend_factory
+        self.logger = logger
+        self.process = None
+        self.connection = None
+        self.model_pid = None
+        self.requests = 0
+        self.restarts = 0
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        rea_file = self.rea_file
+        #excel instances cannot share one open workbook file, so each instance gets its own copy
+        if rea_file is not None and Path(rea_file).exists():
+            rea_file = self.directory / Path(rea_file).name
+            shutil.copy(self.rea_file, rea_file)
+        context = multiprocessing.get_context('spawn')
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_instance_main, args=(child_connection, self.config, rea_file, self.directory, self.backend_factory), daemon=True)
+        self.process.start()
+        child_connection.close()
+        status, self.model_pid = self._receive(START_TIMEOUT_SECONDS)
+        self.logger.info(f'Instance {self.number} started (process {self.process.pid}, model process {self.model_pid})')
+
+    def _receive(self, timeout):
+        if not self.connection.poll(timeout):
+            raise TimeoutError(f'Instance {self.number} did not answer within {timeout} seconds')
+        return self.connection.recv()
+
+    def call(self, request, timeout):
+        self.connection.send(request)
+        return self._receive(timeout)
+
+    def kill(self):
+        '''Stop instance process and its model process (e.g., a hung Excel instance)'''
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self.model_pid:
+            try:
+                os.kill(self.model_pid, signal.SIGTERM)
+            except OSError:
+                pass
+        self.model_pid = None
+
+    def restart(self, reason):
+        self.logger.warning(f'Restarting instance {self.number}: {reason}')
+        self.kill()
+        self.restarts += 1
+        self.start()
+
+    def close(self):
+        try:
+            self.connection.send(('close',))
+            self.process.join(PING_TIMEOUT_SECONDS)
+        except (OSError, EOFError):
+            pass
+        #instance closed its model itself
+        if not self.process.is_alive():
+            self.model_pid = None
+        self.kill()
+
+class ModelPool:
+    '''
+    N instance processes with a loaded model; evaluate() runs a request on a free instance
+    backend_factory (optional): function (config, rea_file, main_logger, warning_logger) -> backend used by instances
+    (default models.rea.backends.create_backend); must be importable by the spawned instance processes
+    '''
+
+    def __init__(self, config, rea_file: Path | str | None, directory: Path | str, backend_factory = None, logger: logging.Logger | None = None):
+        #imported here: backends imports this module
+        import models.rea.backends as rea_backends
+
+        settings = pool_settings(config)
+        #requests for any other model (e.g. a run with a newer workbook) are rejected
+        self.model_fingerprint = rea_backends.model_fingerprint(config, rea_file)
+        self.instance_count = settings['instances']
+        self.health_check_seconds = settings['health_check_seconds']
+        self.request_timeout = settings['request_timeout_seconds']
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        #instances load the model themselves instead of connecting to a pool
+        instance_config = {**config, 'model_pool': {'enabled': False}}
+        self.instances = [_Instance(number, instance_config, rea_file, directory, backend_factory, self.logger) for number in range(1, self.instance_count + 1)]
+        self.idle = queue.Queue()
+        self.stopped = threading.Event()
+        self.monitor = None
+
+    def start(self):
+        for instance in self.instances:
+            instance.start()
+            self.idle.put(instance)
+        self.monitor = threading.Thread(target=self._health_checks, daemon=True)
+        self.monitor.start()
+
+    def _checkout(self, timeout):
+        try:
+            return self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ModelPoolError(f'No pool instance free within {timeout} seconds')
+
+    def _call(self, instance, request, timeout):
+        '''Send request to a checked out instance; a hung or dead instance is restarted and the request fails'''
+        try:
+            return instance.call(request, timeout)
+        except (TimeoutError, OSError, EOFError) as e:
+            try:
+                instance.restart(repr(e))
+            except Exception as restart_error:
+                self.logger.error(f'Instance {instance.number} could not be restarted', exc_info=restart_error)
+            raise ModelPoolError(f'Instance {instance.number} failed: {e!r}')
+
+    def evaluate(self, model_fingerprint, kind, config, args):
+        '''Run analysis_util.evaluate_scenario_<kind>(backend, config, *args, loggers) on a free instance if the run uses the pool's model'''
+        if model_fingerprint != self.model_fingerprint:
+            raise ModelPoolError('Model pool has a different model loaded than the run (restart the pool to load the current workbook and settings)')
+        instance = self._checkout(self.request_timeout)
+        try:
+            status, result = self._call(instance, ('evaluate', kind, config, args), self.request_timeout)
+            instance.requests += 1
+        finally:
+            self.idle.put(instance)
+        if status == 'error':
+            raise ModelPoolError(result)
+        return result
+
+    def _health_checks(self):
+        '''Ping idle instances every health_check_seconds (busy instances are checked by their request timeout)'''
+        while not self.stopped.wait(self.health_check_seconds):
+            for _ in range(self.instance_count):
+                try:
+                    instance = self.idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if not instance.process.is_alive():
+                        instance.restart('process died')
+                    else:
+                        self._call(instance, ('ping',), PING_TIMEOUT_SECONDS)
+                except Exception as e:
+                    self.logger.warning(f'Health check of instance {instance.number} failed: {e!r}')
+                finally:
+                    self.idle.put(instance)
+
+    def status(self) -> list[dict]:
+        return [{'instance': instance.number, 'alive': instance.process is not None and instance.process.is_alive(),
+                 'requests': instance.requests, 'restarts': instance.restarts} for instance in self.instances]
+
+    def close(self):
+        self.stopped.set()
+        for instance in self.instances:
+            instance.close()
+
+class ModelPoolServer:
+    '''
+    Serves a ModelPool on a local socket (multiprocessing.connection); one thread per connected run
+    Clients authenticate with authkey (a new random key if not given, see write_authkey)
+    '''
+
+    def __init__(self, pool: ModelPool, address = DEFAULT_ADDRESS, authkey: bytes | None = None):
+        authkey = authkey if authkey is not None else secrets.token_bytes(AUTHKEY_BYTES)
+        self.pool = pool
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.authkey = authkey
+        self.stopped = threading.Event()
+
+    def serve_forever(self):
+        try:
+            while True:
+                try:
+                    connection = self.listener.accept()
+                except (multiprocessing.AuthenticationError, EOFError, ConnectionError) as e:
+                    #client without the daemon's key (or gone while authenticating); keep serving the others
+                    self.pool.logger.warning(f'Model pool connection refused: {e!r}')
+                    continue
+                if self.stopped.is_set():
+                    connection.close()
+                    break
+                threading.Thread(target=self._serve_client, args=(connection,), daemon=True).start()
+        finally:
+            self.listener.close()
+
+    def _serve_client(self, connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    #client disconnected (e.g., run finished or died)
+                    return
+                operation = request[0]
+                try:
+                    if operation == 'evaluate':
+                        reply = ('ok', self.pool.evaluate(*request[1:]))
+                    elif operation == 'status':
+                        reply = ('ok', self.pool.status())
+                    elif operation == 'shutdown':
+                        connection.send(('ok', None))
+                        self.shutdown()
+                        return
+                    else:
+                        reply = ('error', f'Unknown request "{operation}"')
+                except ModelPoolError as e:
+                    reply = ('error', str(e))
+                connection.send(reply)
+
+    def shutdown(self):
+        self.stopped.set()
+        #wake up accept in serve_forever
+        Client(self.address, authkey=self.authkey).close()
+
+class ModelPoolClient:
+    '''
+    Connection of a run to the pool daemon; runners use it in place of a model backend
+    (analysis_util.evaluate_scenario_total/yearly send the whole scenario to the pool)
+    model_fingerprint: models.rea.backends.model_fingerprint of the run's model, sent with each request
+    '''
+
+    def __init__(self, config, model_fingerprint, address, authkey: bytes, main_logger = None, warning_logger = None):
+        self.config = config
+        self.model_fingerprint = model_fingerprint
+        self.address = address
+        self.authkey = authkey
+        self.main_logger = main_logger if main_logger is not None else logging.getLogger(__name__)
+        self.warning_logger = warning_logger if warning_logger is not None else logging.getLogger(__name__)
+        self.connection = None
+
+    @classmethod
+    def from_config(cls, config, model_fingerprint = None, main_logger = None, warning_logger = None):
+        '''Client of the daemon at the configured address, authenticated with the key the daemon wrote to authkey_file'''
+        settings = pool_settings(config)
+        return cls(config, model_fingerprint, settings['address'], read_authkey(settings['authkey_file']), main_logger, warning_logger)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self.connection = Client(self.address, authkey=self.authkey)
+        self.main_logger.info(f'Connected to model pool at {self.address}')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def process_id(self):
+        return None
+
+    def _request(self, *request):
+        self.connection.send(request)
+        status, result = self.connection.recv()
+        if status == 'error':
+            raise ModelPoolError(result)
+        return result
+
+    def evaluate(self, kind, *args):
+        '''Result of analysis_util.evaluate_scenario_<kind> with args after backend and config (loggers are the instance's)'''
+        return self._request('evaluate', self.model_fingerprint, kind, self.config, args)
+
+    def status(self) -> list[dict]:
+        return self._request('status')
+
+    def shutdown(self):
+        self._request('shutdown')
+
+def serve(config_file: Path | str, backend_factory = None):
+    '''Start pool daemon for the model of a config file (workbook copied from copy_source) and serve until shut down'''
+    config = config_util.load_config(CONFIG_DIR / config_file)
+    settings = pool_settings(config)
+    directory = Path(RESULTS_DIR) / 'model_pool' / f'pool_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    main_logger, _, _, console_logger = logger_setup.setup_loggers(directory)
+    rea_file = Path(config['directories']['copy_source']) / config['files']['rea_file']
+
+    pool = ModelPool(config, rea_file, directory, backend_factory, main_logger)
+    authkey = None
+    try:
+        pool.start()
+        authkey = write_authkey(settings['authkey_file'])
+        server = ModelPoolServer(pool, settings['address'], authkey)
+        console_logger.info(f'Model pool with {pool.instance_count} instances serving on {server.address} (logs in {directory})')
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if authkey is not None:
+            settings['authkey_file'].unlink(missing_ok=True)
+        pool.close()
+        console_logger.info(f'Model pool stopped')
+        logger_setup.close_loggers()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', help='config file whose model the pool loads (model_pool section sets address and instances)')
+    parser.add_argument('--stop', action='store_true', help='shut down a running pool instead of starting one')
+    args = parser.parse_args()
+    if args.stop:
+        with ModelPoolClient.from_config(config_util.load_config(CONFIG_DIR / args.config)) as client:
+            client.shutdown()
+    else:
+        serve(args.config)
@@ -0,0 +1,239 @@
+'''
+Monte Carlo uncertainty of REA outputs with the native engine
+Uncertain scenario inputs and demographic rates are declared as distributions in the monte_carlo section of the
+config file; fields not listed keep input_values_default / native_model demographics:
+    "monte_carlo": {
+        "draws": 100000,
+        "seed": 12345,
+        "chunk_size": 2048,
+        "quantiles": [0.05, 0.5, 0.95],
+        "distributions": {
+            "discount_factor": {"distribution": "triangular", "low": 1.0, "mode": 1.03, "high": 1.07},
+            "number_killed": {"distribution": "lognormal", "median": 500000, "sigma": 0.3},
+            "adult_survival": {"distribution": "normal", "mean": 0.9, "sd": 0.02, "min": 0, "max": 1}
+        }
+    }
+Distributions: normal (mean, sd), lognormal (median, sigma of log), uniform (low, high), triangular (low, mode, high)
+and choice (values, optional weights); optional min/max clip draws
+Draws are evaluated in chunks of chunk_size so memory is bounded by the chunk, not the number of draws
+Each field has its own random stream (from seed and field name), so draws do not depend on chunk size and adding a
+distribution does not change the draws of the others
+'''
+import contextlib
+import math
+import zlib
+import numpy as np
+import models.rea.engine as rea_engine
+import models.rea.inputs as rea_input_class
+import chincheron_util.math_util as math_util
+
+DEFAULT_DRAWS = 10000
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEFAULT_TOLERANCE = 0.01
+DEMOGRAPHIC_FIELDS = tuple(rea_engine.Demographics.__dataclass_fields__)
+#fields that only take whole numbers (draws are rounded)
+INTEGER_FIELDS = ('number_killed', 'start_year_analysis', 'start_year_reproduction', 'discount_start_year', 'maximum_age',
+                  'no_reintroduction_years', 'start_year_reintroduction', 'age_at_maturity')
+OUTPUTS = ('direct_loss', 'indirect_loss', 'total_loss', 'total_gains_per_individual', 'annual_reintroduction_exact', 'annual_reintroduction_rounded')
+#fraction of draws at which running estimates are reported for convergence checks
+CHECKPOINTS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+class Distribution:
+    '''Sampler of one uncertain field'''
+    KINDS = {
+        'normal': ('mean', 'sd'),
+        'lognormal': ('median', 'sigma'),
+        'uniform': ('low', 'high'),
+        'triangular': ('low', 'mode', 'high'),
+        'choice': ('values',),
+    }
+
+    def __init__(self, field_name, spec: dict):
+        kind = spec.get('distribution')
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown distribution "{kind}" for {field_name} (expected one of {list(self.KINDS)})')
+        missing = [parameter for parameter in self.KINDS[kind] if parameter not in spec]
+        if missing:
+            raise ValueError(f'{kind} distribution for {field_name} needs {missing}')
+        self.field_name = field_name
+        self.kind = kind
+        self.spec = spec
+
+    def sample(self, rng: np.random.Generator, size) -> np.ndarray:
+        spec = self.spec
+        if self.kind == 'normal':
+            values = rng.normal(spec['mean'], spec['sd'], size)
+        elif self.kind == 'lognormal':
+            values = rng.lognormal(math.log(spec['median']), spec['sigma'], size)
+        elif self.kind == 'uniform':
+            values = rng.uniform(spec['low'], spec['high'], size)
+        elif self.kind == 'triangular':
+            values = rng.triangular(spec['low'], spec['mode'], spec['high'], size)
+        else:
+            weights = spec.get('weights')
+            if weights is not None:
+                weights = np.asarray(weights, dtype=float) / np.sum(weights)
+            values = rng.choice(np.asarray(spec['values']), size, p=weights)
+        if 'min' in spec or 'max' in spec:
+            values = np.clip(values, spec.get('min'), spec.get('max'))
+        if self.field_name in INTEGER_FIELDS:
+            values = np.rint(values).astype(int)
+        return values
+
+class MonteCarlo:
+    '''
+    Samples the declared distributions around a base scenario and evaluates draws in vectorized chunks
+    Required annual reintroduction uses the closed form (gains are linear in annual reintroduction):
+        annual reintroduction = target value * total loss / total gains per reintroduced individual
+    Exact and rounded annual reintroduction are rounded as in the deterministic runs: exact to decimal_precision
+    (result_decimal_precision), then up to a whole number; decimal_precision None keeps the unrounded exact value
+    '''
+
+    def __init__(self, distributions: dict, default_values: dict, demographics: rea_engine.Demographics, horizon_years,
+                 draws = DEFAULT_DRAWS, seed = 0, chunk_size = rea_engine.DEFAULT_CHUNK_SIZE, target_value = 1,
+                 decimal_precision = None):
+        for field_name in distributions:
+            if field_name not in rea_input_class.INPUT_FIELDS and field_name not in DEMOGRAPHIC_FIELDS:
+                raise ValueError(f'Unknown uncertain field "{field_name}" (expected a scenario input or one of {DEMOGRAPHIC_FIELDS})')
+        if 'annual_reintroduction' in distributions:
+            raise ValueError('annual_reintroduction is solved for, not sampled')
+        self.distributions = {field_name: Distribution(field_name, spec) for field_name, spec in distributions.items()}
+        self.default_values = {field_name: default_values.get(field_name) for field_name in rea_input_class.INPUT_FIELDS}
+        self.demographics = demographics
+        self.horizon_years = horizon_years
+        self.draws = draws
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.target_value = target_value
+        self.decimal_precision = decimal_precision
+
+    @classmethod
+    def from_config(cls, config):
+        '''Create from the monte_carlo, native_model, excel (input_values_default), goal_seek and misc sections of a config file'''
+        monte_carlo_config = config['monte_carlo']
+        native_config = config['native_model']
+        return cls(
+            monte_carlo_config['distributions'],
+            config['excel']['input_values_default'],
+            rea_engine.Demographics.from_config(native_config),
+            native_config['horizon_years'],
+            draws=monte_carlo_config.get('draws', DEFAULT_DRAWS),
+            seed=monte_carlo_config.get('seed', 0),
+            chunk_size=monte_carlo_config.get('chunk_size', rea_engine.DEFAULT_CHUNK_SIZE),
+            target_value=config.get('goal_seek', {}).get('target_value', 1),
+            decimal_precision=config['misc']['result_decimal_precision'],
+        )
+
+    def _generators(self) -> dict:
+        '''One random stream per uncertain field, seeded from the run seed and the field name'''
+        return {field_name: np.random.default_rng([self.seed, zlib.crc32(field_name.encode())]) for field_name in self.distributions}
+
+    def evaluate(self, sampled: dict, size) -> dict:
+        '''Outputs of size draws; fields not sampled keep their default values'''
+        #losses do not depend on annual reintroduction, so one evaluation at one individual per year gives the unit gains
+        columns = {field_name: values for field_name, values in sampled.items() if field_name in self.default_values}
+        columns['annual_reintroduction'] = np.ones(size)
+        demographics = rea_engine.Demographics(**{
+            field_name: sampled.get(field_name, getattr(self.demographics, field_name)) for field_name in DEMOGRAPHIC_FIELDS
+        })
+        results = rea_engine.evaluate_batch(columns, demographics, self.horizon_years, self.default_values, chunk_size=size)
+        unit_gain = results['total_gains']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            required = np.where(unit_gain > 0, self.target_value * results['total_loss'] / unit_gain, np.nan)
+        exact, rounded = self.round_annual_reintroduction(required)
+        return {
+            'direct_loss': results['direct_loss'],
+            'indirect_loss': results['indirect_loss'],
+            'total_loss': results['total_loss'],
+            'total_gains_per_individual': unit_gain,
+            'annual_reintroduction_exact': exact,
+            'annual_reintroduction_rounded': rounded,
+        }
+
+    def round_annual_reintroduction(self, required):
+        '''(exact, rounded) annual reintroduction of each draw with the math_util rounding of analysis_util.evaluate_scenario_total (NaN stays NaN)'''
+        if self.decimal_precision is None:
+            exact = required
+        else:
+            exact = np.array([math_util.round_outputs(float(value), self.decimal_precision) for value in required])
+        rounded = np.array([math_util.round_annual_reintro(value) if math.isfinite(value) else np.nan for value in exact], dtype=float)
+        return exact, rounded
+
+    def run(self, draws_writer = None, metrics = None):
+        '''
+        Sample and evaluate all draws chunk by chunk and return MonteCarloResult
+        draws_writer (optional): called with {column: array} of sampled inputs and outputs of each chunk (e.g. to write draws to csv)
+        metrics (optional): util.run_metrics.RunMetrics timing sampling and evaluation of each chunk
+        '''
+        span = metrics.span if metrics is not None else lambda stage: contextlib.nullcontext()
+        generators = self._generators()
+        outputs = {name: np.empty(self.draws) for name in OUTPUTS}
+        for start in range(0, self.draws, self.chunk_size):
+            size = min(self.chunk_size, self.draws - start)
+            with span('sample'):
+                sampled = {field_name: distribution.sample(generators[field_name], size) for field_name, distribution in self.distributions.items()}
+            with span('evaluate'):
+                chunk_outputs = self.evaluate(sampled, size)
+            for name in OUTPUTS:
+                outputs[name][start:start + size] = chunk_outputs[name]
+            if draws_writer is not None:
+                draws_writer({'draw': np.arange(start + 1, start + size + 1), **sampled, **chunk_outputs})
+        return MonteCarloResult(outputs)
+
+class MonteCarloResult:
+    '''Draws of each output (arrays in draw order) with summary statistics and convergence diagnostics'''
+
+    def __init__(self, outputs: dict):
+        self.outputs = outputs
+
+    def summary(self, quantiles = DEFAULT_QUANTILES, tolerance = DEFAULT_TOLERANCE) -> dict:
+        '''{output: statistics} with mean, sd, Monte Carlo standard error, quantiles (with 95% intervals) and convergence'''
+        return {name: summarize_draws(values, quantiles, tolerance) for name, values in self.outputs.items()}
+
+def quantile_interval(sorted_values, quantile, z = 1.96):
+    '''Distribution-free interval of a quantile from order statistics (normal approximation to the binomial)'''
+    n = len(sorted_values)
+    half_width = z * math.sqrt(n * quantile * (1 - quantile))
+    lower = min(max(math.floor(n * quantile - half_width), 0), n - 1)
+    upper = min(max(math.ceil(n * quantile + half_width), 0), n - 1)
+    return float(sorted_values[lower]), float(sorted_values[upper])
+
+def summarize_draws(values, quantiles = DEFAULT_QUANTILES, tolerance = DEFAULT_TOLERANCE) -> dict:
+    '''
+    Statistics of the draws of one output; non-finite draws (e.g. no gains from reintroduction) are counted and excluded
+    Convergence: running mean and quantiles at CHECKPOINTS fractions of the draws; converged if the estimates at the last two
+    checkpoints differ by less than tolerance (relative) and the Monte Carlo standard error is below tolerance of the mean
+    '''
+    values = np.asarray(values, dtype=float)
+    finite = values[np.isfinite(values)]
+    n = len(finite)
+    statistics = {'draws': len(values), 'invalid_draws': len(values) - n}
+    if n < 2:
+        return {**statistics, 'converged': False}
+
+    sorted_values = np.sort(finite)
+    mean = float(finite.mean())
+    sd = float(finite.std(ddof=1))
+    standard_error = sd / math.sqrt(n)
+    statistics.update(mean=mean, sd=sd, standard_error=standard_error, min=float(sorted_values[0]), max=float(sorted_values[-1]))
+    statistics['quantiles'] = {
+        str(quantile): {'value': float(np.quantile(sorted_values, quantile)), 'interval_95': quantile_interval(sorted_values, quantile)}
+        for quantile in quantiles
+    }
+
+    running = []
+    for fraction in CHECKPOINTS:
+        head = finite[:max(int(n * fraction), 1)]
+        running.append({'draws': len(head), 'mean': float(head.mean()), **{str(q): float(value) for q, value in zip(quantiles, np.quantile(head, quantiles))}})
+    statistics['running'] = running
+
+    def relative_change(key):
+        previous, last = running[-2][key], running[-1][key]
+        scale = max(abs(last), abs(previous))
+        return abs(last - previous) / scale if scale else 0.0
+
+    changes = {key: relative_change(key) for key in ('mean', *map(str, quantiles))}
+    statistics['last_relative_change'] = changes
+    relative_error = standard_error / abs(mean) if mean else 0.0
+    statistics['converged'] = max(changes.values()) < tolerance and relative_error < tolerance
+    return statistics
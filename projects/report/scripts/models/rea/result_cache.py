@@ -0,0 +1,180 @@
+'''
+Persistent cache of scenario results shared across runs (SQLite file)
+Entries are keyed by a hash of the model fingerprint (workbook contents or native engine version),
+the normalized scenario inputs and every setting that changes the stored result (solver, outputs read, precision)
+Settings are read from the result_cache section of the config file:
+    "result_cache": {"enabled": false, "path": "cache/results.sqlite", "max_size_mb": 256}
+The shipped configs leave the cache disabled; once enabled, the entry scripts bypass it with --no-cache
+Least recently used entries are evicted once stored results exceed max_size_mb
+Several processes (e.g. concurrent jobs of a run plan) may share one cache file: it is opened in WAL mode, every store
+is committed at once and lookups only queue their last used time, written in one short transaction now and then
+The stored size is kept up to date as results are stored; it is only summed over the whole file when the cache is
+opened, when another process has stored results since (PRAGMA data_version) and before evicting
+'''
+import hashlib
+import json
+import logging
+import numbers
+from pathlib import Path
+import sqlite3
+import time
+
+DEFAULT_PATH = 'cache/results.sqlite'
+DEFAULT_MAX_SIZE_MB = 256
+#number of cache hits whose last used time is queued before it is written to the cache file
+TOUCH_INTERVAL = 100
+#seconds to wait for another process writing to the cache file
+BUSY_TIMEOUT_SECONDS = 30
+
+def normalize_value(value):
+    '''Numbers as int if whole (5.0, numpy.int64(5) -> 5) else float so equal inputs always hash the same'''
+    if isinstance(value, bool) or not isinstance(value, numbers.Number):
+        return value
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def _json_default(value):
+    '''numpy scalars (e.g. inputs read from a scenario table) are stored as python numbers'''
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} values cannot be stored in the result cache')
+
+def scenario_key(model_fingerprint: str, scenario_inputs: dict, settings: dict) -> str:
+    '''Hash of model fingerprint, scenario inputs (normalized) and result settings'''
+    spec = {
+        'model': model_fingerprint,
+        'inputs': {key: normalize_value(value) for key, value in scenario_inputs.items()},
+        'settings': settings,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+class ResultCache:
+    '''
+    Size-bounded LRU store of scenario results (any JSON-serializable value)
+    Use get/put with keys from scenario_key; hits and misses are counted for the run log
+    '''
+
+    def __init__(self, path: Path | str, max_size_mb: float = DEFAULT_MAX_SIZE_MB, logger: logging.Logger | None = None):
+        self.path = Path(path)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.connection = None
+        self.size = 0
+        #data_version of the cache file when size was last updated (changes when another connection commits)
+        self.data_version = None
+        #{key: last used time} of hits not yet written
+        self.touched = {}
+
+    @classmethod
+    def from_config(cls, config, base_dir: Path | str, logger = None, enabled = True):
+        '''Create cache from the result_cache section of the config file; returns None if disabled'''
+        cache_config = config.get('result_cache', {})
+        if not enabled or not cache_config.get('enabled', False):
+            return None
+        path = Path(cache_config.get('path', DEFAULT_PATH))
+        if not path.is_absolute():
+            path = Path(base_dir) / path
+        return cls(path, cache_config.get('max_size_mb', DEFAULT_MAX_SIZE_MB), logger)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+        #readers do not block the writer (and the other way around) in WAL mode
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(f'PRAGMA busy_timeout={int(BUSY_TIMEOUT_SECONDS * 1000)}')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)'
+            )
+            self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self.size = self._stored_size()
+        self.data_version = self._data_version()
+        self.logger.info(f'Result cache opened ({self.path}, {self.size / 1024 / 1024:.1f} MB stored)')
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self._write_touches()
+        finally:
+            self.connection.close()
+            self.connection = None
+
+    def _stored_size(self) -> int:
+        '''Size of all stored results, including those stored by other processes'''
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def _data_version(self) -> int:
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def get(self, key: str):
+        '''Stored result for key (None on a miss); marks entry as recently used'''
+        row = self.connection.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched[key] = time.time()
+        if len(self.touched) >= TOUCH_INTERVAL:
+            self._write_touches()
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        '''Store result for key (committed at once), evicting least recently used entries if the cache is over its size limit'''
+        payload = json.dumps(value, default=_json_default)
+        #queued last used times first, so eviction sees every recent hit
+        self._write_touches()
+        with self.connection:
+            if self._data_version() != self.data_version:
+                #results stored by other processes since the size was last updated
+                self.size = self._stored_size()
+            replaced = self.connection.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, payload, len(payload), time.time())
+            )
+            self.size += len(payload) - (replaced[0] if replaced else 0)
+            if self.size > self.max_size:
+                self._evict()
+        self.data_version = self._data_version()
+        self.stores += 1
+
+    def _write_touches(self):
+        '''Write queued last used times of cache hits in one transaction'''
+        if not self.touched or self.connection is None:
+            return
+        with self.connection:
+            self.connection.executemany('UPDATE results SET last_used = ? WHERE key = ?', [(used, key) for key, used in self.touched.items()])
+        self.touched = {}
+
+    def _evict(self):
+        '''Delete least recently used entries until stored results fit in max_size (called within the store's transaction)'''
+        #summed again as other processes may have stored or evicted results
+        self.size = self._stored_size()
+        rows = self.connection.execute('SELECT key, size FROM results ORDER BY last_used').fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.size <= self.max_size:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self.connection.executemany('DELETE FROM results WHERE key = ?', evicted)
+        self.evictions += len(evicted)
+        self.logger.info(f'Result cache: evicted {len(evicted)} least recently used entries')
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = f'{self.hits / lookups:.0%}' if lookups else 'n/a'
+        return (f'Result cache: {self.hits} hits, {self.misses} misses (hit rate {hit_rate}), '
+                f'{self.stores} stored, {self.evictions} evicted, {self.size / 1024 / 1024:.1f} MB in {self.path}')
@@ -0,0 +1,133 @@
+'''
+Solvers for the annual reintroduction required for gains to equal losses
+Settings are read from the goal_seek section of the config file:
+    "method": "closed_form"  -> exact solution from the linear response of total gains to annual reintroduction
+    "method": "iterative"    -> backend goal seek (Excel GoalSeek for the excel engine)
+    "warm_start": true       -> iterative goal seeks start from the solution of the most similar scenario already solved
+                                (runners also order scenarios so each solve follows its nearest neighbour)
+The shipped configs use iterative: closed_form results have not yet been compared with Excel GoalSeek on the workbook
+'''
+from dataclasses import dataclass
+import logging
+import math
+import numpy as np
+
+DEFAULT_METHOD = 'iterative'
+DEFAULT_LINEARITY_TOLERANCE = 1e-6
+DEFAULT_WARM_START = True
+
+@dataclass
+class SolverResult:
+    '''Annual reintroduction solution and how it was reached'''
+    annual_reintroduction: float
+    method: str
+    evaluations: int | None
+    linear: bool | None = None
+
+def solve_annual_reintroduction(backend, goal_seek_config, scenario_number = None, logger: logging.Logger | None = None, initial_value = None) -> SolverResult:
+    '''
+    Set annual reintroduction so that the loss ratio (gains/losses) equals the target value
+    initial_value: starting point of an iterative goal seek (default: value left in the model)
+    Leaves the backend set to the solution and returns a SolverResult
+    '''
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    method = goal_seek_config.get('method', DEFAULT_METHOD)
+    target_value = goal_seek_config['target_value']
+    if method == 'closed_form':
+        tolerance = goal_seek_config.get('linearity_tolerance', DEFAULT_LINEARITY_TOLERANCE)
+        result = solve_closed_form(backend, target_value, tolerance)
+        if result.linear:
+            return result
+        logger.warning(f'Scenario {scenario_number}: Total gains not linear in annual reintroduction; falling back to iterative goal seek')
+        fallback = solve_iterative(backend, target_value, initial_value)
+        if fallback.evaluations is not None:
+            fallback.evaluations += result.evaluations
+        fallback.linear = False
+        return fallback
+    elif method == 'iterative':
+        return solve_iterative(backend, target_value, initial_value)
+    else:
+        raise ValueError(f'Unknown goal seek method "{method}" (expected "closed_form" or "iterative")')
+
+def solve_closed_form(backend, target_value, tolerance = DEFAULT_LINEARITY_TOLERANCE) -> SolverResult:
+    '''
+    Total gains scale linearly with annual reintroduction (losses do not depend on it), so
+        annual reintroduction = target value * total loss / total gains per reintroduced individual
+    One evaluation gives losses and unit gains; a second at the solution checks linearity
+    '''
+    backend.set_input('annual_reintroduction', 1)
+    backend.calculate()
+    total_loss = backend.get_output('total_loss')
+    unit_gain = backend.get_output('total_gains')
+    if not unit_gain or not math.isfinite(unit_gain):
+        return SolverResult(math.nan, 'closed_form', 1, linear=False)
+
+    solution = target_value * total_loss / unit_gain
+    backend.set_input('annual_reintroduction', solution)
+    backend.calculate()
+    linear = math.isclose(backend.loss_ratio(), target_value, rel_tol=tolerance)
+    return SolverResult(solution, 'closed_form', 2, linear=linear)
+
+def solve_iterative(backend, target_value, initial_value = None) -> SolverResult:
+    '''Iterative goal seek on the backend (Excel GoalSeek or native secant iteration); Excel does not report evaluations'''
+    if initial_value is not None:
+        backend.set_input('annual_reintroduction', initial_value)
+    evaluations = backend.run_goal_seek(target_value)
+    return SolverResult(backend.get_input('annual_reintroduction'), 'iterative', evaluations)
+
+def warm_start_enabled(goal_seek_config) -> bool:
+    '''Warm starts only matter for the iterative method (closed form needs no starting point)'''
+    return bool(goal_seek_config.get('warm_start', DEFAULT_WARM_START)) and goal_seek_config.get('method', DEFAULT_METHOD) == 'iterative'
+
+def _input_vector(scenario_inputs_dict, fields):
+    return np.array([float(scenario_inputs_dict[field_name]) for field_name in fields])
+
+def _distances(points, vector):
+    '''Sum over inputs of relative differences (inputs differ by orders of magnitude, e.g. number killed and discount factor)'''
+    scale = np.maximum(np.maximum(np.abs(points), np.abs(vector)), 1e-12)
+    return (np.abs(points - vector) / scale).sum(axis=1)
+
+class WarmStart:
+    '''Solutions of solved scenarios, looked up by the scenario inputs most similar to a new scenario'''
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.points = []
+        self.solutions = []
+        self._matrix = None
+
+    def add(self, scenario_inputs_dict, annual_reintroduction):
+        if annual_reintroduction is None or not math.isfinite(annual_reintroduction) or annual_reintroduction <= 0:
+            return
+        self.points.append(_input_vector(scenario_inputs_dict, self.fields))
+        self.solutions.append(annual_reintroduction)
+        self._matrix = None
+
+    def nearest(self, scenario_inputs_dict) -> float | None:
+        '''Solution of the most similar solved scenario (None before the first solve)'''
+        if not self.solutions:
+            return None
+        if self._matrix is None:
+            self._matrix = np.array(self.points)
+        distances = _distances(self._matrix, _input_vector(scenario_inputs_dict, self.fields))
+        return self.solutions[int(distances.argmin())]
+
+def similarity_order(records, fields) -> list:
+    '''
+    Scenario numbers of records ([(scenario number, scenario name, scenario inputs dict)]) in solve order
+    Scenarios are sorted by the inputs that vary, the input with most distinct values changing fastest, so adjacent
+    points of a sweep (e.g. discount factor) are solved one after another; scenarios with identical inputs stay in order
+    '''
+    records = list(records)
+    if not records:
+        return []
+    table = np.array([_input_vector(scenario_inputs_dict, fields) for _, _, scenario_inputs_dict in records])
+    distinct = [len(np.unique(table[:, column])) for column in range(table.shape[1])]
+    #outer sort keys vary least; np.lexsort sorts by its last key first
+    columns = [column for column in sorted(range(len(fields)), key=lambda column: distinct[column], reverse=True) if distinct[column] > 1]
+    if not columns:
+        return [scenario_number for scenario_number, _, _ in records]
+    order = np.lexsort([table[:, column] for column in columns])
+    return [records[index][0] for index in order]
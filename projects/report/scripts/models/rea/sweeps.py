@@ -0,0 +1,123 @@
+'''
+Declarative parameter sweeps over REAScenarioInputs fields
+A sweep section (in a run config, or in a figure config instead of a scenario worksheet) declares axes on top of
+input_values_default; scenarios are generated on demand instead of being written out in a scenario input file:
+    "sweep": {
+        "name": "DR {discount_factor} age {maximum_age}",
+        "axes": [
+            {"discount_factor": [1.0, 1.03, 1.05]},
+            {"maximum_age": {"start": 10, "stop": 60, "step": 10}},
+            {"start_year_analysis": [2016, 2020], "discount_start_year": [2016, 2020]}
+        ]
+    }
+Axes are combined as a Cartesian product (first axis varies slowest); fields listed in the same axis are zipped
+Values are a list, {"start", "stop", "step"} (stop included) or {"start", "stop", "num"} (evenly spaced)
+name is an optional format string of scenario inputs (default "field=value, ..." of the swept fields)
+'''
+from collections.abc import Sequence
+import itertools
+import math
+import numpy as np
+import models.rea.inputs as rea_input_class
+
+def axis_values(spec) -> list:
+    '''Values of one swept field from its list or range spec'''
+    if isinstance(spec, list):
+        return spec
+    if not isinstance(spec, dict):
+        raise ValueError(f'Sweep values must be a list or a range, not {spec!r}')
+    start, stop = spec['start'], spec['stop']
+    if 'num' in spec:
+        values = np.linspace(start, stop, spec['num'])
+    elif 'step' in spec:
+        step = spec['step']
+        #small tolerance so a stop reached by floating point steps is included
+        count = math.floor((stop - start) / step + 1e-9) + 1
+        values = start + step * np.arange(max(count, 0))
+    else:
+        raise ValueError(f'Sweep range {spec!r} needs "step" or "num"')
+    if all(isinstance(value, int) for value in (start, stop, spec.get('step', 0))) and 'num' not in spec:
+        return [int(value) for value in values]
+    return [round(float(value), 10) for value in values]
+
+class _SweepNames(Sequence):
+    '''Scenario names of a sweep, built when indexed'''
+    def __init__(self, sweep):
+        self.sweep = sweep
+
+    def __len__(self):
+        return len(self.sweep)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.sweep.scenario_name(self.sweep.swept_inputs(index))
+
+class Sweep:
+    '''
+    Scenarios of a declared sweep, generated lazily
+    Same interface as models.rea.inputs.ScenarioBatch (records, inputs, names, len) so runners accept either;
+    batches() yields columnar ScenarioBatch chunks for vectorized engines
+    '''
+
+    def __init__(self, axes: list[dict[str, list]], default_values: dict, name_format: str | None = None, limit: int | None = None):
+        for axis in axes:
+            if len({len(values) for values in axis.values()}) > 1:
+                raise ValueError(f'Zipped sweep fields {list(axis)} must have the same number of values')
+            for field_name in axis:
+                if field_name not in rea_input_class.INPUT_FIELDS:
+                    raise ValueError(f'Unknown sweep field "{field_name}" (expected one of {rea_input_class.INPUT_FIELDS})')
+        self.axes = axes
+        self.default_values = {field_name: default_values.get(field_name) for field_name in rea_input_class.INPUT_FIELDS}
+        self.name_format = name_format
+        self.sizes = [len(next(iter(axis.values()))) if axis else 1 for axis in axes]
+        size = math.prod(self.sizes)
+        self.size = size if limit is None else min(size, limit)
+        self.names = _SweepNames(self)
+
+    @classmethod
+    def from_config(cls, sweep_config, default_values: dict):
+        '''Create sweep from a sweep config section and input_values_default from the config file'''
+        axes = [{field_name: axis_values(spec) for field_name, spec in axis.items()} for axis in sweep_config['axes']]
+        return cls(axes, default_values, sweep_config.get('name'))
+
+    def head(self, limit):
+        '''First limit scenarios of the sweep (e.g. debug runs)'''
+        return Sweep(self.axes, self.default_values, self.name_format, limit)
+
+    def __len__(self):
+        return self.size
+
+    def swept_inputs(self, index) -> dict:
+        '''Values of the swept fields for scenario index (0-based)'''
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        positions = np.unravel_index(index, self.sizes) if self.sizes else ()
+        return {field_name: values[position] for axis, position in zip(self.axes, positions) for field_name, values in axis.items()}
+
+    def scenario_name(self, swept_inputs) -> str:
+        if self.name_format:
+            return self.name_format.format(**{**self.default_values, **swept_inputs})
+        return ', '.join(f'{field_name}={value}' for field_name, value in swept_inputs.items())
+
+    def inputs(self, index) -> dict:
+        '''Scenario inputs of one scenario (0-based index) as a dict (same as REAScenarioInputs.to_dict)'''
+        return {**self.default_values, **self.swept_inputs(index)}
+
+    def records(self):
+        '''Yields (scenario number, scenario name, scenario inputs dict) with scenario numbers starting at 1'''
+        combinations = itertools.product(*(zip(*axis.values()) for axis in self.axes))
+        for index, combination in enumerate(itertools.islice(combinations, self.size)):
+            swept = {field_name: value for axis, values in zip(self.axes, combination) for field_name, value in zip(axis, values)}
+            yield index + 1, self.scenario_name(swept), {**self.default_values, **swept}
+
+    def batches(self, batch_size = 2048):
+        '''Yields ScenarioBatch chunks of at most batch_size scenarios (columns built with index arithmetic)'''
+        for start in range(0, self.size, batch_size):
+            indices = np.arange(start, min(start + batch_size, self.size))
+            positions = np.unravel_index(indices, self.sizes) if self.sizes else ()
+            columns = {field_name: [value] * len(indices) for field_name, value in self.default_values.items()}
+            for axis, axis_positions in zip(self.axes, positions):
+                for field_name, values in axis.items():
+                    columns[field_name] = [values[position] for position in axis_positions]
+            yield rea_input_class.ScenarioBatch([self.names[index] for index in indices], columns)
@@ -0,0 +1,574 @@
+'''
+Compiles the formula graph of an REA workbook into a Python callable (no Excel required)
+The workbook is parsed with openpyxl; only the cells between the configured input cells and output cells are compiled
+The parsed formulas (expression trees) are cached on disk as JSON, keyed by a hash of the workbook, the compiled cells and
+the compiler version, so later runs skip parsing; Python source is always generated in-process from the expression trees,
+which are checked node by node (so a cache file can hold data but never code)
+When inputs change only the cells downstream of the changed inputs are re-evaluated
+'''
+from collections import deque
+import hashlib
+import json
+import logging
+import math
+from pathlib import Path
+import re
+import numpy as np
+import openpyxl
+from openpyxl.formula.tokenizer import Tokenizer, Token
+from openpyxl.utils.cell import get_column_letter, range_boundaries
+from openpyxl.worksheet.formula import ArrayFormula
+
+COMPILER_VERSION = '1.2.0'
+
+CELL_PATTERN = re.compile(r'^\$?([A-Za-z]{1,3})\$?(\d+)$')
+
+#Excel operator precedence (higher binds tighter); unary minus and % are handled in the parser
+INFIX_PRECEDENCE = {'=': 1, '<>': 1, '<': 1, '>': 1, '<=': 1, '>=': 1, '&': 2, '+': 3, '-': 3, '*': 4, '/': 4, '^': 5}
+INFIX_PYTHON = {'^': '**'}
+#functions skipping blank (and text) cells of ranges passed to them; elsewhere blank cells read as 0
+SKIP_BLANK_FUNCTIONS = {'SUM', 'AVERAGE', 'MIN', 'MAX', 'COUNT', 'AND', 'OR'}
+
+class UnsupportedFormulaError(Exception):
+    '''Raised when a formula uses a feature the compiler cannot translate'''
+
+class ExcelError(Exception):
+    '''
+    Excel error value (e.g., #DIV/0!) raised while evaluating a cell; args[0] is the error code
+    Stored as the value of the cell, so cells referencing it get the same error
+    '''
+
+def cell_key(sheet, coordinate):
+    '''Normalized key for a cell: "<sheet>!<coordinate>" without $ signs'''
+    return f'{sheet}!{coordinate.replace("$", "").upper()}'
+
+def split_reference(reference, default_sheet):
+    '''Split "Sheet!A1:B2" into (sheet, "A1:B2"), using default sheet if none given'''
+    sheet, _, address = reference.rpartition('!')
+    sheet = sheet.strip("'").replace("''", "'") if sheet else default_sheet
+    return sheet, address.replace('$', '').upper()
+
+def workbook_hash(path, sheet_name, input_cells, output_cells):
+    '''Hash of workbook contents, compiled cell specification and compiler version'''
+    digest = hashlib.sha256(Path(path).read_bytes())
+    spec = {'compiler': COMPILER_VERSION, 'sheet': sheet_name, 'inputs': input_cells, 'outputs': output_cells}
+    digest.update(json.dumps(spec, sort_keys=True).encode())
+    return digest.hexdigest()
+
+# ---------------------------------------------------------------------------
+# Formula parsing
+# ---------------------------------------------------------------------------
+
+class FormulaParser:
+    '''Recursive descent parser turning openpyxl formula tokens into a nested tuple expression tree'''
+
+    def __init__(self, formula, sheet, defined_names = None):
+        self.tokens = [token for token in Tokenizer(formula).items if token.type != Token.WSPACE]
+        self.position = 0
+        self.sheet = sheet
+        self.defined_names = defined_names or {}
+        self.formula = formula
+
+    def parse(self):
+        node = self.expression(0)
+        if self.position != len(self.tokens):
+            raise UnsupportedFormulaError(f'Could not parse formula {self.formula}')
+        return node
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def expression(self, min_precedence):
+        left = self.unary()
+        while True:
+            token = self.peek()
+            if token is None or token.type != Token.OP_IN or INFIX_PRECEDENCE.get(token.value, -1) < min_precedence:
+                return left
+            self.take()
+            if token.value not in INFIX_PRECEDENCE:
+                raise UnsupportedFormulaError(f'Operator {token.value} not supported in {self.formula}')
+            right = self.expression(INFIX_PRECEDENCE[token.value] + 1)
+            left = ('op', token.value, left, right)
+
+    def unary(self):
+        token = self.peek()
+        if token is not None and token.type == Token.OP_PRE:
+            self.take()
+            operand = self.unary()
+            return ('neg', operand) if token.value == '-' else operand
+        node = self.primary()
+        while self.peek() is not None and self.peek().type == Token.OP_POST:
+            self.take()
+            node = ('pct', node)
+        return node
+
+    def primary(self):
+        token = self.take()
+        if token.type == Token.OPERAND:
+            return self.operand(token)
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            name = token.value[:-1].upper().removeprefix('_XLFN.')
+            args = []
+            if self.peek().type == Token.FUNC and self.peek().subtype == Token.CLOSE:
+                self.take()
+                return ('func', name, args)
+            while True:
+                args.append(self.expression(0))
+                separator = self.take()
+                if separator.type == Token.FUNC and separator.subtype == Token.CLOSE:
+                    return ('func', name, args)
+                if separator.type != Token.SEP or separator.subtype != Token.ARG:
+                    raise UnsupportedFormulaError(f'Unexpected token {separator.value} in {self.formula}')
+        if token.type == Token.PAREN and token.subtype == Token.OPEN:
+            node = self.expression(0)
+            self.take()
+            return node
+        raise UnsupportedFormulaError(f'Unexpected token {token.value} in {self.formula}')
+
+    def operand(self, token):
+        if token.subtype == Token.NUMBER:
+            return ('value', float(token.value) if any(char in token.value for char in '.eE') else int(token.value))
+        if token.subtype == Token.TEXT:
+            return ('value', token.value[1:-1].replace('""', '"'))
+        if token.subtype == Token.LOGICAL:
+            return ('value', token.value.upper() == 'TRUE')
+        if token.subtype == Token.ERROR:
+            return ('error', token.value)
+        return self.reference(token.value)
+
+    def reference(self, reference):
+        if reference.upper() in self.defined_names:
+            return self.reference(self.defined_names[reference.upper()])
+        sheet, address = split_reference(reference, self.sheet)
+        if ':' not in address:
+            if not CELL_PATTERN.match(address):
+                raise UnsupportedFormulaError(f'Reference {reference} not supported in {self.formula}')
+            return ('ref', cell_key(sheet, address))
+        min_col, min_row, max_col, max_row = range_boundaries(address)
+        if None in (min_col, min_row, max_col, max_row):
+            raise UnsupportedFormulaError(f'Whole row/column reference {reference} not supported in {self.formula}')
+        return ('range', sheet, min_col, min_row, max_col, max_row)
+
+def range_keys(sheet, min_col, min_row, max_col, max_row):
+    '''Cell keys covered by a range, row by row'''
+    return [cell_key(sheet, f'{get_column_letter(col)}{row}') for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+
+def references(node):
+    '''All cell keys referenced by an expression tree'''
+    kind = node[0]
+    if kind == 'ref':
+        return [node[1]]
+    if kind == 'range':
+        return range_keys(*node[1:])
+    if kind == 'op':
+        return references(node[2]) + references(node[3])
+    if kind in ('neg', 'pct'):
+        return references(node[1])
+    if kind == 'func':
+        return [key for arg in node[2] for key in references(arg)]
+    return []
+
+def _check_node(node, size, *types):
+    '''Expression trees may come from a cache file: check shape and types of a node before any of it reaches generated source'''
+    if not isinstance(node, (tuple, list)) or len(node) != size or not all(isinstance(value, kind) and not (isinstance(value, bool) and kind is int)
+                                                                           for value, kind in zip(node[1:], types)):
+        raise UnsupportedFormulaError(f'Invalid expression {node!r}')
+
+def to_python(node, skip_blanks = False):
+    '''
+    Translate an expression tree into Python source evaluated against the cell values mapping "v"
+    skip_blanks: a range is read with None for blank cells (argument of a function in SKIP_BLANK_FUNCTIONS)
+    Only known node kinds, operators and functions are emitted; names, text and numbers are written with repr
+    '''
+    if not isinstance(node, (tuple, list)) or not node:
+        raise UnsupportedFormulaError(f'Invalid expression {node!r}')
+    kind = node[0]
+    if kind == 'value':
+        _check_node(node, 2, (int, float, str, bool))
+        return repr(node[1])
+    if kind == 'error':
+        _check_node(node, 2, str)
+        return f'_error({node[1]!r})'
+    if kind == 'ref':
+        _check_node(node, 2, str)
+        return f'v[{node[1]!r}]'
+    if kind == 'range':
+        _check_node(node, 6, str, int, int, int, int)
+        blank = ', None' if skip_blanks else ''
+        return f'_range(v, {node[1]!r}, {node[2]}, {node[3]}, {node[4]}, {node[5]}{blank})'
+    if kind == 'neg':
+        _check_node(node, 2, (tuple, list))
+        return f'(-{to_python(node[1])})'
+    if kind == 'pct':
+        _check_node(node, 2, (tuple, list))
+        return f'({to_python(node[1])} / 100)'
+    if kind == 'op':
+        _check_node(node, 4, str, (tuple, list), (tuple, list))
+        if node[1] not in INFIX_PRECEDENCE:
+            raise UnsupportedFormulaError(f'Operator {node[1]!r} not supported')
+        left, right = to_python(node[2]), to_python(node[3])
+        if node[1] == '&':
+            return f'_concat({left}, {right})'
+        if node[1] == '/':
+            return f'_divide({left}, {right})'
+        if node[1] in ('=', '<>'):
+            #an error compared with a value is an error, not False
+            return f'({"" if node[1] == "=" else "not "}_equal({left}, {right}))'
+        return f'({left} {INFIX_PYTHON.get(node[1], node[1])} {right})'
+    if kind == 'func':
+        _check_node(node, 3, str, list)
+        name, args = node[1], [to_python(arg, node[1] in SKIP_BLANK_FUNCTIONS) for arg in node[2]]
+        if name == 'IF':
+            false_branch = args[2] if len(args) > 2 else 'False'
+            return f'(({args[1]}) if _truthy({args[0]}) else ({false_branch}))'
+        if name == 'IFERROR':
+            return f'_iferror(lambda: {args[0]}, lambda: {args[1]})'
+        if name not in EXCEL_FUNCTIONS:
+            raise UnsupportedFormulaError(f'Excel function {name} not supported')
+        return f'_f[{name!r}]({", ".join(args)})'
+    raise UnsupportedFormulaError(f'Unknown expression {node}')
+
+# ---------------------------------------------------------------------------
+# Runtime helpers used by the generated code
+# ---------------------------------------------------------------------------
+
+class CellValues(dict):
+    '''Cell values; empty cells referenced on their own read as 0 like in Excel arithmetic'''
+    def __missing__(self, key):
+        return 0
+
+def _range(values, sheet, min_col, min_row, max_col, max_row, blank = 0):
+    '''Values of a range; blank cells read as blank (0, or None where functions skip them)'''
+    cells = [[values.get(cell_key(sheet, f'{get_column_letter(col)}{row}'), blank) for col in range(min_col, max_col + 1)] for row in range(min_row, max_row + 1)]
+    if blank is not None:
+        try:
+            return np.array(cells, dtype=float)
+        except (TypeError, ValueError):
+            pass
+    return np.array(cells, dtype=object)
+
+def _flatten(args):
+    '''Numbers of function arguments; blank, text and logical cells of ranges are skipped and errors raised'''
+    for arg in args:
+        if isinstance(arg, np.ndarray):
+            for value in arg.ravel():
+                if isinstance(value, ExcelError):
+                    raise value
+                if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                    yield value
+        elif isinstance(arg, ExcelError):
+            raise arg
+        else:
+            yield arg
+
+def _error(code):
+    raise ExcelError(code)
+
+def _error_code(error, precedent_values):
+    '''Excel error code of an exception raised while evaluating a cell (an error in a precedent cell is passed on)'''
+    if isinstance(error, ExcelError):
+        return error.args[0]
+    if isinstance(error, ZeroDivisionError):
+        return '#DIV/0!'
+    #operations on an error value of a precedent fail with TypeError
+    for value in precedent_values:
+        if isinstance(value, ExcelError):
+            return value.args[0]
+    if isinstance(error, OverflowError) or (isinstance(error, ValueError) and 'math domain' in str(error)):
+        return '#NUM!'
+    return '#VALUE!'
+
+def _equal(left, right):
+    for value in (left, right):
+        if isinstance(value, ExcelError):
+            raise value
+    return left == right
+
+def _divide(numerator, denominator):
+    if isinstance(denominator, np.ndarray):
+        return numerator / denominator
+    if denominator == 0:
+        raise ExcelError('#DIV/0!')
+    return numerator / denominator
+
+def _concat(left, right):
+    return f'{_text(left)}{_text(right)}'
+
+def _text(value):
+    if isinstance(value, ExcelError):
+        raise value
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _truthy(value):
+    '''Condition of IF; an error condition makes the IF an error'''
+    if isinstance(value, ExcelError):
+        raise value
+    return bool(value)
+
+def _iferror(value, fallback):
+    try:
+        result = value()
+    except (ExcelError, ArithmeticError, TypeError, ValueError):
+        return fallback()
+    return fallback() if isinstance(result, ExcelError) else result
+
+def _average(*args):
+    values = list(_flatten(args))
+    if not values:
+        raise ExcelError('#DIV/0!')
+    return float(np.mean(values))
+
+def _round(number, digits = 0, direction = 'nearest'):
+    '''Excel rounding (half away from zero)'''
+    factor = 10 ** int(digits)
+    scaled = abs(number) * factor
+    if direction == 'nearest':
+        scaled = math.floor(scaled + 0.5)
+    elif direction == 'up':
+        scaled = math.ceil(scaled - 1e-12)
+    else:
+        scaled = math.floor(scaled + 1e-12)
+    return math.copysign(scaled / factor, number)
+
+def _index(array, row, column = 1):
+    array = np.atleast_2d(array)
+    if array.shape[0] == 1 and column == 1:
+        return array[0, int(row) - 1]
+    return array[int(row) - 1, int(column) - 1]
+
+EXCEL_FUNCTIONS = {
+    'SUM': lambda *args: sum(_flatten(args)),
+    'AVERAGE': _average,
+    'MIN': lambda *args: min(_flatten(args), default=0),
+    'MAX': lambda *args: max(_flatten(args), default=0),
+    'COUNT': lambda *args: len(list(_flatten(args))),
+    'ABS': abs,
+    'INT': math.floor,
+    'ROUND': lambda number, digits = 0: _round(number, digits),
+    'ROUNDUP': lambda number, digits = 0: _round(number, digits, 'up'),
+    'ROUNDDOWN': lambda number, digits = 0: _round(number, digits, 'down'),
+    'POWER': lambda number, power: number ** power,
+    'EXP': math.exp,
+    'LN': math.log,
+    'LOG10': math.log10,
+    'SQRT': math.sqrt,
+    'SUMPRODUCT': lambda *arrays: float(np.sum(np.prod(np.broadcast_arrays(*[np.asarray(array, dtype=float) for array in arrays]), axis=0))),
+    'AND': lambda *args: all(_flatten(args)),
+    'OR': lambda *args: any(_flatten(args)),
+    'NOT': lambda value: not value,
+    'INDEX': _index,
+}
+
+RUNTIME_NAMESPACE = {
+    '_range': _range,
+    '_error': _error,
+    '_divide': _divide,
+    '_concat': _concat,
+    '_equal': _equal,
+    '_truthy': _truthy,
+    '_iferror': _iferror,
+    '_f': EXCEL_FUNCTIONS,
+}
+
+# ---------------------------------------------------------------------------
+# Compilation and evaluation
+# ---------------------------------------------------------------------------
+
+def _defined_names(wb):
+    names = {}
+    for name, defined_name in wb.defined_names.items():
+        destinations = list(defined_name.destinations)
+        if len(destinations) == 1:
+            sheet, address = destinations[0]
+            names[name.upper()] = f"'{sheet}'!{address}"
+    return names
+
+def build_artifact(path, sheet_name, input_cells, output_cells):
+    '''
+    Parse workbook and compile the graph from input cells to output cells
+    input_cells and output_cells map config keys to addresses on sheet_name (e.g., "C7" or "H8:H186")
+    Returns JSON-serializable artifact (generated source, evaluation order, dependencies and constants)
+    '''
+    wb = openpyxl.load_workbook(path, data_only=False)
+    defined_names = _defined_names(wb)
+    inputs = {key: cell_key(*split_reference(address, sheet_name)) for key, address in input_cells.items()}
+    input_keys = set(inputs.values())
+
+    targets = []
+    for address in output_cells.values():
+        sheet, coordinate = split_reference(address, sheet_name)
+        targets.extend(range_keys(sheet, *range_boundaries(coordinate)) if ':' in coordinate else [cell_key(sheet, coordinate)])
+
+    formulas, dependencies, constants = {}, {}, {}
+    #current input values in the workbook are the starting values
+    for key in input_keys:
+        sheet, coordinate = key.split('!', 1)
+        if wb[sheet][coordinate].value is not None:
+            constants[key] = wb[sheet][coordinate].value
+    queue, seen = deque(targets), set(targets)
+    while queue:
+        key = queue.popleft()
+        if key in input_keys:
+            continue
+        sheet, coordinate = key.split('!', 1)
+        value = wb[sheet][coordinate].value
+        if isinstance(value, ArrayFormula):
+            value = value.text
+        if isinstance(value, str) and value.startswith('='):
+            expression = FormulaParser(value, sheet, defined_names).parse()
+            #translated once here so unsupported formulas fail at compile time, not when the graph is loaded
+            to_python(expression)
+            formulas[key] = expression
+            dependencies[key] = sorted(set(references(expression)))
+            for precedent in dependencies[key]:
+                if precedent not in seen:
+                    seen.add(precedent)
+                    queue.append(precedent)
+        elif value is not None:
+            constants[key] = value if isinstance(value, (int, float, str, bool)) else str(value)
+
+    #topological order of formula cells (Kahn's algorithm)
+    remaining = {key: sum(1 for precedent in precedents if precedent in formulas) for key, precedents in dependencies.items()}
+    dependents = {key: [] for key in formulas}
+    for key, precedents in dependencies.items():
+        for precedent in precedents:
+            if precedent in formulas:
+                dependents[precedent].append(key)
+    ready = deque(sorted(key for key, count in remaining.items() if count == 0))
+    order = []
+    while ready:
+        key = ready.popleft()
+        order.append(key)
+        for dependent in dependents[key]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    if len(order) != len(formulas):
+        raise UnsupportedFormulaError('Circular references between compiled cells are not supported')
+
+    return {
+        'compiler_version': COMPILER_VERSION,
+        'workbook_hash': workbook_hash(path, sheet_name, input_cells, output_cells),
+        'workbook': Path(path).name,
+        'inputs': inputs,
+        'order': order,
+        'dependencies': {key: dependencies[key] for key in order},
+        'constants': constants,
+        'formulas': {key: formulas[key] for key in order},
+    }
+
+def generate_source(artifact) -> str:
+    '''Python source of the compiled cells (one function per formula cell, in evaluation order) built from the expression trees'''
+    return '\n'.join(f'def _cell_{index}(v):\n    return {to_python(artifact["formulas"][key])}\n' for index, key in enumerate(artifact['order']))
+
+def compile_workbook(path, sheet_name, input_cells, output_cells, cache_dir = None, logger: logging.Logger | None = None):
+    '''
+    Return CompiledWorkbook for the workbook, loading the compiled graph from cache_dir when available
+    Cache files are named by workbook_hash so a changed workbook (or cell specification) is recompiled
+    '''
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    cache_file = None
+    if cache_dir is not None:
+        expected_hash = workbook_hash(path, sheet_name, input_cells, output_cells)
+        cache_file = Path(cache_dir) / f'{expected_hash}.json'
+        if cache_file.exists():
+            try:
+                artifact = json.loads(cache_file.read_text())
+                if artifact.get('workbook_hash') != expected_hash or artifact.get('compiler_version') != COMPILER_VERSION:
+                    raise UnsupportedFormulaError('compiled for another workbook or compiler version')
+                model = CompiledWorkbook(artifact)
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError, UnsupportedFormulaError) as e:
+                logger.warning(f'Compiled workbook cache {cache_file} not used ({e}); recompiling')
+            else:
+                logger.info(f'Compiled workbook loaded from cache ({cache_file})')
+                return model
+
+    artifact = build_artifact(path, sheet_name, input_cells, output_cells)
+    logger.info(f'Workbook {Path(path).name} compiled ({len(artifact["order"])} formula cells)')
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = cache_file.with_suffix('.tmp')
+        temporary_file.write_text(json.dumps(artifact))
+        temporary_file.replace(cache_file)
+    return CompiledWorkbook(artifact)
+
+class CompiledWorkbook:
+    '''Evaluates a compiled workbook graph, recalculating only cells downstream of changed inputs'''
+
+    def __init__(self, artifact):
+        namespace = dict(RUNTIME_NAMESPACE)
+        exec(compile(generate_source(artifact), f'<compiled {artifact["workbook"]}>', 'exec'), namespace)
+        self.order = artifact['order']
+        self.functions = [namespace[f'_cell_{index}'] for index in range(len(self.order))]
+        self.position = {key: index for index, key in enumerate(self.order)}
+        self.inputs = artifact['inputs']
+        self.precedents = artifact['dependencies']
+        self.dependents = {}
+        for key, precedents in artifact['dependencies'].items():
+            for precedent in precedents:
+                self.dependents.setdefault(precedent, []).append(key)
+        self.values = CellValues(artifact['constants'])
+        self._downstream = {}
+        self.dirty = set(self.order)
+        self.evaluations = 0
+
+    def downstream(self, key):
+        '''Formula cells that depend (directly or indirectly) on key'''
+        if key not in self._downstream:
+            found, queue = set(), deque([key])
+            while queue:
+                for dependent in self.dependents.get(queue.popleft(), []):
+                    if dependent not in found:
+                        found.add(dependent)
+                        queue.append(dependent)
+            self._downstream[key] = found
+        return self._downstream[key]
+
+    def set_input(self, name, value):
+        '''Set input cell (by config key) and mark downstream cells for recalculation'''
+        key = self.inputs[name]
+        if key in self.values and self.values[key] == value:
+            return
+        self.values[key] = value
+        self.dirty |= self.downstream(key)
+
+    def calculate(self):
+        '''Re-evaluate cells marked dirty in dependency order'''
+        for index in sorted(self.position[key] for key in self.dirty):
+            key = self.order[index]
+            try:
+                self.values[key] = self.functions[index](self.values)
+            except (ExcelError, ArithmeticError, TypeError, ValueError) as e:
+                self.values[key] = ExcelError(_error_code(e, (self.values.get(precedent) for precedent in self.precedents[key])))
+            self.evaluations += 1
+        self.dirty.clear()
+
+    def read(self, address, sheet_name):
+        '''Read single cell (value) or range (list for a single row/column, list of lists otherwise)'''
+        if self.dirty:
+            self.calculate()
+        sheet, coordinate = split_reference(address, sheet_name)
+        if ':' not in coordinate:
+            return self._read_value(cell_key(sheet, coordinate))
+        min_col, min_row, max_col, max_row = range_boundaries(coordinate)
+        rows = [[self._read_value(cell_key(sheet, f'{get_column_letter(col)}{row}')) for col in range(min_col, max_col + 1)] for row in range(min_row, max_row + 1)]
+        if min_col == max_col:
+            return [row[0] for row in rows]
+        if min_row == max_row:
+            return rows[0]
+        return rows
+
+    def _read_value(self, key):
+        value = self.values.get(key)
+        return value.args[0] if isinstance(value, ExcelError) else value
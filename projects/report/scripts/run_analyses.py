@@ -0,0 +1,14 @@
+import argparse
+import sys
+import util.run_plan as run_plan
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run several analysis configs as one plan (shared input copies and loaded models, independent jobs run concurrently)')
+    parser.add_argument('configs', nargs='+', metavar='[KIND:]CONFIG',
+                        help='config files in the config folder; KIND is total, yearly or monte_carlo (default: yearly if the config has figure configs, else total)')
+    parser.add_argument('--jobs', type=int, help='number of job groups run at the same time (default: all)')
+    parser.add_argument('--no-cache', action='store_true', help='rerun every scenario instead of reusing results from the result cache')
+    parser.add_argument('--incremental', action='store_true', help='only rerun scenarios added or changed since the last run; carry forward the rest')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile dump of each run to its results directory')
+    args = parser.parse_args()
+    sys.exit(run_plan.run_plan(args.configs, args.jobs, use_cache=not args.no_cache, incremental=args.incremental, profile=args.profile))
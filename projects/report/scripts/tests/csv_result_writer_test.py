@@ -0,0 +1,38 @@
+import csv
+from util.csv_util import CSVResultWriter
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+def test_rows_buffered_until_flush(tmp_path):
+    output_file = tmp_path / 'output.csv'
+    writer = CSVResultWriter(output_file, flush_rows=3, flush_seconds=3600)
+    writer.write_row({'scenario': 1, 'loss': 0.5})
+    writer.write_row({'scenario': 2, 'loss': 0.25})
+    assert read_rows(output_file) == [['scenario', 'loss']]
+    writer.write_row({'scenario': 3, 'loss': 0.125})
+    assert len(read_rows(output_file)) == 4
+    writer.write_row({'scenario': 4, 'loss': 0.0625})
+    writer.close()
+    assert read_rows(output_file)[-1] == ['4', '0.0625']
+    assert writer.rows_written == 4
+
+def test_header_written_once_when_appending(tmp_path):
+    output_file = tmp_path / 'output.csv'
+    with CSVResultWriter(output_file) as writer:
+        writer.write_row({'scenario': 1})
+    with CSVResultWriter(output_file) as writer:
+        writer.write_row({'scenario': 2})
+    assert read_rows(output_file) == [['scenario'], ['1'], ['2']]
+
+def test_no_file_without_rows(tmp_path):
+    CSVResultWriter(tmp_path / 'failed_scenario.csv').close()
+    assert not (tmp_path / 'failed_scenario.csv').exists()
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_rows_buffered_until_flush, test_header_written_once_when_appending, test_no_file_without_rows):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
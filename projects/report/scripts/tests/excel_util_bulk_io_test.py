@@ -0,0 +1,99 @@
+import json
+from openpyxl.utils.cell import get_column_letter, range_boundaries
+import util.excel_util
+from util.constants import *
+
+class CountingRange:
+    def __init__(self, sheet, address, ndim = None):
+        self.sheet = sheet
+        self.bounds = range_boundaries(address)
+        self.ndim = ndim
+
+    def options(self, ndim = None, **kwargs):
+        self.ndim = ndim
+        return self
+
+    def cells(self):
+        min_col, min_row, max_col, max_row = self.bounds
+        return [[f'{get_column_letter(col)}{row}' for col in range(min_col, max_col + 1)] for row in range(min_row, max_row + 1)]
+
+    @property
+    def value(self):
+        self.sheet.round_trips += 1
+        values = [[self.sheet.cells.get(cell) for cell in row] for row in self.cells()]
+        min_col, min_row, max_col, max_row = self.bounds
+        if self.ndim == 2:
+            return values
+        if min_col == max_col and min_row == max_row:
+            return values[0][0]
+        if min_col == max_col:
+            return [row[0] for row in values]
+        return values
+
+    @value.setter
+    def value(self, values):
+        self.sheet.round_trips += 1
+        if not isinstance(values, list):
+            values = [[values]]
+        for cell_row, value_row in zip(self.cells(), values):
+            for cell, value in zip(cell_row, value_row):
+                self.sheet.cells[cell] = value
+
+class CountingSheet:
+    '''Fake xlwings sheet counting every read/write of a cell or range (one COM round trip each)'''
+    def __init__(self):
+        self.cells = {}
+        self.round_trips = 0
+
+    def range(self, address):
+        return CountingRange(self, address)
+
+    def __getitem__(self, address):
+        return CountingRange(self, address)
+
+def load_yearly_config():
+    with open(CONFIG_DIR / 'yearly_exhibits_config.json') as f:
+        return json.load(f)['excel']
+
+def test_plan_groups_contiguous_cells():
+    excel_config = load_yearly_config()
+    input_cells = {key: excel_config['input_cells'][key] for key in excel_config['input_values_default']}
+    blocks = util.excel_util.plan_cell_blocks(input_cells)
+    assert [block.address for block in blocks] == ['C7:C11', 'C15:C15', 'C18:C20']
+
+    blocks = util.excel_util.plan_cell_blocks(excel_config['output_cells_excluded_yearly'])
+    assert [block.address for block in blocks] == ['H8:R186']
+
+def test_round_trips_per_scenario():
+    excel_config = load_yearly_config()
+    input_values = excel_config['input_values_default']
+    input_cells = {key: excel_config['input_cells'][key] for key in input_values}
+    output_cells = {**excel_config['output_cells_excluded'], **excel_config['output_cells_excluded_yearly']}
+
+    sheet = CountingSheet()
+    for row in range(8, 187):
+        for col in range(8, 19):
+            sheet.cells[f'{get_column_letter(col)}{row}'] = row * col / 7
+    for cell in ('F7', 'F8', 'F9', 'F11'):
+        sheet.cells[cell] = 1.234567
+
+    #cell by cell (existing functions)
+    util.excel_util.set_excel_inputs(sheet, input_values, input_cells, 1)
+    expected = util.excel_util.read_excel_outputs(sheet, output_cells, 5)
+    cell_by_cell = sheet.round_trips
+
+    #planned blocks
+    sheet.round_trips = 0
+    input_plan = util.excel_util.plan_cell_blocks(input_cells)
+    output_plan = util.excel_util.plan_cell_blocks(output_cells)
+    util.excel_util.write_blocks(sheet, input_plan, input_values)
+    outputs = util.excel_util.read_blocks(sheet, output_plan, 5)
+
+    assert cell_by_cell == len(input_cells) + len(output_cells) == 24
+    assert sheet.round_trips == 3 + 3 < cell_by_cell
+    assert outputs == expected
+    assert {cell: sheet.cells[cell] for cell in input_cells.values()} == {input_cells[key]: value for key, value in input_values.items()}
+
+if __name__ == "__main__":
+    test_plan_groups_contiguous_cells()
+    test_round_trips_per_scenario()
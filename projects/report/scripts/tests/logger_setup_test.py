@@ -0,0 +1,34 @@
+import logging
+import util.logger_setup as logger_setup
+
+def test_setup_is_idempotent_and_writes_on_close(tmp_path):
+    main_logger, warning_logger, detail_logger, console_logger = logger_setup.setup_loggers(tmp_path)
+    assert logger_setup.setup_loggers(tmp_path)[0] is main_logger
+    assert all(len(logger.handlers) == 1 for logger in (main_logger, warning_logger, detail_logger, console_logger))
+
+    main_logger.info('main message')
+    detail_logger.info(logger_setup.LazyMessage(lambda label: f'{label}: detail message', 'Scenario 1'))
+    warning_logger.warning('warning message')
+    logger_setup.close_loggers()
+
+    log_dir = tmp_path / 'logs'
+    assert 'main message' in (log_dir / 'main_log.log').read_text()
+    detailed = (log_dir / 'detailed_outputs.log').read_text()
+    assert 'main message' in detailed and 'Scenario 1: detail message' in detailed
+    assert 'warning message' in (log_dir / 'warnings.log').read_text()
+    assert 'detail message' not in (log_dir / 'main_log.log').read_text()
+
+def test_detail_messages_not_built_when_off(tmp_path):
+    built = []
+    _, _, detail_logger, _ = logger_setup.setup_loggers(tmp_path, detail_logging=False)
+    detail_logger.info(logger_setup.LazyMessage(lambda: built.append(1) or 'detail message'))
+    logger_setup.close_loggers()
+    assert built == []
+    assert 'detail message' not in (tmp_path / 'logs' / 'detailed_outputs.log').read_text()
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_setup_is_idempotent_and_writes_on_close(Path(tmp_dir) / 'a')
+        test_detail_messages_not_built_when_off(Path(tmp_dir) / 'b')
@@ -0,0 +1,79 @@
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+import pytest
+import models.rea.backends as rea_backends
+import models.rea.model_pool as model_pool
+import util.analysis_util as analysis_util
+from benchmarks.pipeline_benchmark import FakeBackend
+from util.constants import *
+
+class HangingBackend(FakeBackend):
+    '''Fake backend that hangs when asked to calculate a scenario with negative number killed'''
+    def calculate(self):
+        if self.inputs['number_killed'] < 0:
+            time.sleep(3600)
+        super().calculate()
+
+def fake_backend(config, rea_file = None, main_logger = None, warning_logger = None):
+    return HangingBackend(config, main_logger, warning_logger)
+
+def load_config():
+    with open(CONFIG_DIR / 'total_exhibits_config.json') as f:
+        config = json.load(f)
+    config['model_pool'].update(enabled=True, instances=2, health_check_seconds=0.5, request_timeout_seconds=5)
+    return config
+
+def test_pool_evaluates_and_restarts_hung_instances(tmp_path):
+    config = load_config()
+    rea_file = tmp_path / 'workbook.xlsx'
+    rea_file.write_bytes(b'workbook')
+    pool = model_pool.ModelPool(config, rea_file, tmp_path, backend_factory=fake_backend)
+    pool.start()
+    server = model_pool.ModelPoolServer(pool, ('localhost', 0), model_pool.write_authkey(tmp_path / 'model_pool.key'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        inputs = config['excel']['input_values_default']
+        loggers = [logging.getLogger(__name__)] * 3
+        expected = analysis_util.evaluate_scenario_total(fake_backend(config), config, 1, 'a', inputs, *loggers)
+        #clients need the daemon's key and the same model
+        assert (tmp_path / 'model_pool.key').read_bytes() == server.authkey and os.stat(tmp_path / 'model_pool.key').st_mode & 0o777 == 0o600
+        with pytest.raises(multiprocessing.AuthenticationError):
+            model_pool.ModelPoolClient(config, pool.model_fingerprint, server.address, b'guessed key').open()
+        rea_file.write_bytes(b'workbook changed after pool started')
+        with model_pool.ModelPoolClient(config, rea_backends.model_fingerprint(config, rea_file), server.address, server.authkey) as client:
+            with pytest.raises(model_pool.ModelPoolError):
+                client.evaluate('total', 1, 'a', config['excel']['input_values_default'])
+
+        fingerprint = pool.model_fingerprint
+        with model_pool.ModelPoolClient(config, fingerprint, server.address, model_pool.read_authkey(tmp_path / 'model_pool.key')) as client:
+            #runners pass the client in place of a backend
+            assert analysis_util.evaluate_scenario_total(client, config, 1, 'a', inputs, *loggers) == expected
+
+            with pytest.raises(model_pool.ModelPoolError):
+                client.evaluate('total', 2, 'hangs', {**inputs, 'number_killed': -1})
+            assert sum(instance['restarts'] for instance in client.status()) == 1
+            assert client.evaluate('total', 1, 'a', inputs) == expected
+
+            #dead instance is restarted by the health check
+            pool.instances[0].process.kill()
+            deadline = time.time() + 30
+            while sum(instance['restarts'] for instance in client.status()) < 2 and time.time() < deadline:
+                time.sleep(0.2)
+            assert all(instance['alive'] for instance in client.status())
+            client.shutdown()
+        thread.join(10)
+        assert not thread.is_alive()
+    finally:
+        pool.close()
+    assert not any(instance.process.is_alive() for instance in pool.instances)
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_path:
+        test_pool_evaluates_and_restarts_hung_instances(Path(tmp_path))
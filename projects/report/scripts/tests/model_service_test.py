@@ -0,0 +1,95 @@
+import json
+import logging
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import models.rea.backends as rea_backends
+import util.analysis_util as analysis_util
+import util.model_service as model_service
+from util.constants import *
+
+def load_config():
+    with open(CONFIG_DIR / 'total_exhibits_config.json') as f:
+        config = json.load(f)
+    config['misc']['model_engine'] = 'native'
+    config['model_service'] = {'batch_window_ms': 50, 'max_batch_size': 8}
+    return config
+
+def post(url, body):
+    request = urllib.request.Request(url, json.dumps(body).encode(), {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def test_concurrent_requests_batched_with_same_results():
+    config = load_config()
+    service = model_service.ModelService(config)
+    service.open()
+    server = model_service.create_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        requests = [{'scenario_name': f's{number}', 'inputs': {'number_killed': 1000 * number, 'maximum_age': 10 + number}} for number in range(1, 21)]
+        with ThreadPoolExecutor(20) as executor:
+            responses = list(executor.map(lambda body: post(f'{url}/evaluate', body), requests))
+
+        backend = rea_backends.create_backend(config)
+        loggers = [logging.getLogger(__name__)] * 3
+        for number, (request, response) in enumerate(zip(requests, responses), start=1):
+            inputs = {**config['excel']['input_values_default'], **request['inputs']}
+            csv_data, qc_test = analysis_util.evaluate_scenario_total(backend, config, number, request['scenario_name'], inputs, *loggers)
+            assert response['outputs'] == csv_data and response['qc_test'] == qc_test
+            #int inputs come back as they do from the runners (not 1000.0)
+            assert isinstance(response['outputs']['number_killed'], int) and isinstance(response['outputs']['maximum_age'], int)
+
+        with urllib.request.urlopen(f'{url}/metrics') as response:
+            metrics = json.loads(response.read())
+        assert metrics['requests'] == 20
+        #concurrent requests share batches, none larger than max_batch_size
+        assert metrics['batches'] < 20 and metrics['batch_size']['max'] <= 8
+
+        for inputs in ({'not_an_input': 1}, {'number_killed': 'abc'}, {'maximum_age': None}, {'maximum_age': 10.5}, [1]):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                post(f'{url}/evaluate', {'inputs': inputs})
+            assert error.value.code == 400
+
+        #failures of the model are server errors, even if they are ValueErrors
+        evaluate_batch = service._evaluate_batch
+        def failing_batch(scenarios):
+            raise ValueError('model failed')
+        service.batcher.evaluate_batch = failing_batch
+        with pytest.raises(urllib.error.HTTPError) as error:
+            post(f'{url}/evaluate', {'inputs': {'number_killed': 1000.0}})
+        assert error.value.code == 500
+        service.batcher.evaluate_batch = evaluate_batch
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+def test_failed_batch_retried_per_request():
+    def evaluate_batch(items):
+        if any(item < 0 for item in items):
+            raise ValueError('negative item')
+        return [item * 2 for item in items]
+    batcher = model_service.MicroBatcher(evaluate_batch, window_seconds=0.2, max_batch_size=8)
+    try:
+        futures = [batcher.submit(item) for item in (1, -1, 3)]
+        #only the request that fails on its own gets the error
+        assert futures[0].result(10) == 2 and futures[2].result(10) == 6
+        with pytest.raises(ValueError):
+            futures[1].result(10)
+        assert batcher.metrics()['failed_requests'] == 1
+    finally:
+        batcher.close()
+
+def test_service_needs_native_engine():
+    config = load_config()
+    config['misc']['model_engine'] = 'excel'
+    with pytest.raises(ValueError):
+        model_service.ModelService(config)
+
+if __name__ == "__main__":
+    test_concurrent_requests_batched_with_same_results()
+    test_failed_batch_retried_per_request()
+    test_service_needs_native_engine()
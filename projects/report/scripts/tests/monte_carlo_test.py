@@ -0,0 +1,83 @@
+import math
+import numpy as np
+import pytest
+import models.rea.engine as rea_engine
+import models.rea.monte_carlo as rea_monte_carlo
+
+DEFAULT_INPUTS = {
+    'number_killed': 6000,
+    'start_year_analysis': 2016,
+    'start_year_reproduction': 2016,
+    'discount_start_year': 2016,
+    'maximum_age': 10,
+    'discount_factor': 1.03,
+    'no_reintroduction_years': 10,
+    'start_year_reintroduction': 2019,
+    'annual_reintroduction': 100,
+}
+DEMOGRAPHICS = rea_engine.Demographics(juvenile_survival=0.3, adult_survival=0.8, age_at_maturity=3, fecundity=1.5)
+DISTRIBUTIONS = {
+    'discount_factor': {'distribution': 'triangular', 'low': 1.01, 'mode': 1.03, 'high': 1.05},
+    'number_killed': {'distribution': 'lognormal', 'median': 6000, 'sigma': 0.2},
+    'adult_survival': {'distribution': 'normal', 'mean': 0.8, 'sd': 0.05, 'min': 0, 'max': 0.95},
+    'maximum_age': {'distribution': 'choice', 'values': [8, 10, 12], 'weights': [1, 2, 1]},
+}
+
+def monte_carlo(**kwargs):
+    return rea_monte_carlo.MonteCarlo(DISTRIBUTIONS, DEFAULT_INPUTS, DEMOGRAPHICS, horizon_years=60, **kwargs)
+
+def test_draws_reproducible_and_independent_of_chunk_size():
+    small_chunks = monte_carlo(draws=50, seed=7, chunk_size=7).run().outputs
+    one_chunk = monte_carlo(draws=50, seed=7, chunk_size=50).run().outputs
+    for output in rea_monte_carlo.OUTPUTS:
+        assert np.array_equal(small_chunks[output], one_chunk[output])
+    assert not np.array_equal(monte_carlo(draws=50, seed=8).run().outputs['total_loss'], one_chunk['total_loss'])
+
+def test_draws_match_single_scenario_solution():
+    draws = []
+    result = monte_carlo(draws=5, seed=1, chunk_size=2).run(draws_writer=draws.append)
+    sampled = {key: np.concatenate([chunk[key] for chunk in draws]) for key in DISTRIBUTIONS}
+    for index in range(5):
+        inputs = {**DEFAULT_INPUTS, **{key: sampled[key][index] for key in DISTRIBUTIONS if key in DEFAULT_INPUTS}}
+        demographics = rea_engine.Demographics(DEMOGRAPHICS.juvenile_survival, sampled['adult_survival'][index], DEMOGRAPHICS.age_at_maturity, DEMOGRAPHICS.fecundity)
+        required = result.outputs['annual_reintroduction_exact'][index]
+        #gains equal losses at the required annual reintroduction
+        single = rea_engine.evaluate({**inputs, 'annual_reintroduction': required}, demographics, 60)
+        assert math.isclose(single['loss_ratio'], 1, rel_tol=1e-9)
+        assert math.isclose(single['total_loss'], result.outputs['total_loss'][index], rel_tol=1e-12)
+
+def test_annual_reintroduction_rounded_like_deterministic_runs():
+    #exact values within result precision of a whole number are not rounded up to the next one
+    exact, rounded = monte_carlo(decimal_precision=5).round_annual_reintroduction(np.array([12.000000001, 12.00001, 7.5, np.nan]))
+    assert np.array_equal(exact, [12.0, 12.00001, 7.5, np.nan], equal_nan=True)
+    assert np.array_equal(rounded, [12, 13, 8, np.nan], equal_nan=True)
+    outputs = monte_carlo(draws=20, seed=3, decimal_precision=5).run().outputs
+    assert np.array_equal(outputs['annual_reintroduction_exact'], np.round(monte_carlo(draws=20, seed=3).run().outputs['annual_reintroduction_exact'], 5))
+    assert np.array_equal(outputs['annual_reintroduction_rounded'], np.ceil(outputs['annual_reintroduction_exact']))
+
+def test_summary_statistics_and_convergence():
+    rng = np.random.default_rng(0)
+    values = np.append(rng.normal(100, 10, 100000), np.nan)
+    statistics = rea_monte_carlo.summarize_draws(values, quantiles=(0.05, 0.5))
+    assert statistics['invalid_draws'] == 1 and statistics['draws'] == 100001
+    assert abs(statistics['mean'] - 100) < 4 * statistics['standard_error']
+    median = statistics['quantiles']['0.5']
+    assert median['interval_95'][0] < median['value'] < median['interval_95'][1]
+    assert abs(statistics['quantiles']['0.05']['value'] - (100 - 1.645 * 10)) < 0.5
+    assert statistics['converged'] and len(statistics['running']) == len(rea_monte_carlo.CHECKPOINTS)
+    assert not rea_monte_carlo.summarize_draws(rng.lognormal(0, 3, 20))['converged']
+
+def test_invalid_distributions():
+    with pytest.raises(ValueError):
+        rea_monte_carlo.MonteCarlo({'not_an_input': {'distribution': 'uniform', 'low': 0, 'high': 1}}, DEFAULT_INPUTS, DEMOGRAPHICS, 60)
+    with pytest.raises(ValueError):
+        rea_monte_carlo.MonteCarlo({'discount_factor': {'distribution': 'beta'}}, DEFAULT_INPUTS, DEMOGRAPHICS, 60)
+    with pytest.raises(ValueError):
+        rea_monte_carlo.MonteCarlo({'fecundity': {'distribution': 'normal', 'mean': 1}}, DEFAULT_INPUTS, DEMOGRAPHICS, 60)
+
+if __name__ == "__main__":
+    test_draws_reproducible_and_independent_of_chunk_size()
+    test_draws_match_single_scenario_solution()
+    test_annual_reintroduction_rounded_like_deterministic_runs()
+    test_summary_statistics_and_convergence()
+    test_invalid_distributions()
@@ -0,0 +1,178 @@
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+import models.rea.backends as rea_backends
+import models.rea.engine as rea_engine
+from util.constants import *
+
+GOLDEN_FILE = Path(__file__).parent / 'data' / 'rea_workbook_golden.json'
+CONFIG_FILES = ('total_exhibits_config.json', 'scenarios_table_config.json', 'yearly_exhibits_config.json')
+
+DEFAULT_INPUTS = {
+    'number_killed': 6000,
+    'start_year_analysis': 2016,
+    'start_year_reproduction': 2016,
+    'discount_start_year': 2016,
+    'maximum_age': 2,
+    'discount_factor': 1.0,
+    'no_reintroduction_years': 1,
+    'start_year_reintroduction': 2016,
+    'annual_reintroduction': 100,
+}
+
+#mature after maximum age so nothing reproduces
+NO_REPRODUCTION = rea_engine.Demographics(juvenile_survival=0.5, adult_survival=0.5, age_at_maturity=5, fecundity=1.0)
+
+def test_direct_loss_hand_calculation():
+    # killed split by survivorship [1, 0.5] -> 4000 age 0, 2000 age 1
+    # year 0: 6000 alive, year 1: 4000 * 0.5 = 2000 alive, year 2: none
+    results = rea_engine.evaluate(DEFAULT_INPUTS, NO_REPRODUCTION, horizon_years=5)
+    assert results['direct_loss_yearly'].tolist() == [6000, 2000, 0, 0, 0]
+    assert results['direct_loss'] == 8000
+    assert results['indirect_loss'] == 0
+    assert results['total_gains'] == 150
+    assert results['qc_test'] == 'PASS'
+
+def test_discounting():
+    inputs = {**DEFAULT_INPUTS, 'discount_factor': 1.03, 'start_year_analysis': 2015}
+    results = rea_engine.evaluate(inputs, NO_REPRODUCTION, horizon_years=3)
+    assert results['discount_period'].tolist() == [-1, 0, 1]
+    assert np.allclose(results['discount_factor'], [1.03, 1, 1 / 1.03])
+    assert np.isclose(results['total_loss_yearly_cumulative'][-1], results['total_loss'])
+
+def test_indirect_loss_from_reproduction():
+    # age 1 individuals produce 1 recruit each; 2000 age 1 killed -> 2000 lost recruits in year 1
+    demographics = rea_engine.Demographics(juvenile_survival=0.5, adult_survival=0.5, age_at_maturity=1, fecundity=1.0)
+    results = rea_engine.evaluate(DEFAULT_INPUTS, demographics, horizon_years=3)
+    assert results['indirect_loss_yearly'][:2].tolist() == [0, 2000]
+    assert np.isclose(results['total_loss'], results['direct_loss'] + results['indirect_loss'])
+
+def test_gains_scale_with_annual_reintroduction():
+    demographics = rea_engine.Demographics(juvenile_survival=0.3, adult_survival=0.9, age_at_maturity=3, fecundity=3.7)
+    inputs = {**DEFAULT_INPUTS, 'maximum_age': 10, 'no_reintroduction_years': 10, 'start_year_reintroduction': 2019}
+    single = rea_engine.evaluate(inputs, demographics, horizon_years=179)
+    double = rea_engine.evaluate({**inputs, 'annual_reintroduction': 200}, demographics, horizon_years=179)
+    assert np.isclose(double['total_gains'], 2 * single['total_gains'])
+    assert np.isclose(double['loss_ratio'], 2 * single['loss_ratio'])
+
+def test_batch_matches_single_scenarios():
+    demographics = rea_engine.Demographics(juvenile_survival=0.3, adult_survival=0.9, age_at_maturity=3, fecundity=3.7)
+    scenarios = pd.DataFrame({
+        'scenario_name': ['a', 'b', 'c'],
+        'maximum_age': [10, 60, 25],
+        'discount_factor': [1.03, np.nan, 1.07],
+        'start_year_reproduction': [2016, 2018, 2020],
+    })
+    defaults = {**DEFAULT_INPUTS, 'discount_factor': 1.0, 'no_reintroduction_years': 10}
+    horizons = np.array([179, 50, 120])
+    batch = rea_engine.evaluate_batch(scenarios, demographics, horizons, defaults, chunk_size=2)
+    assert batch['yearly'].shape == (3, 179, len(rea_engine.YEARLY_OUTPUTS))
+    assert np.isnan(batch['yearly'][1, 50:]).all()
+
+    inputs = rea_engine.scenario_arrays(scenarios, defaults)
+    for index, horizon in enumerate(horizons):
+        single = rea_engine.evaluate({key: values[index] for key, values in inputs.items()}, demographics, horizon)
+        for key in rea_engine.YEARLY_OUTPUTS:
+            assert np.allclose(batch['yearly'][index, :horizon, rea_engine.YEARLY_OUTPUTS.index(key)], single[key])
+        for key in rea_engine.TOTAL_OUTPUTS:
+            assert np.isclose(batch[key][index], single[key])
+
+def test_compact_projection_matches_dense_reference():
+    rng = np.random.default_rng(7)
+    size, horizon = 64, 179
+    demographics = rea_engine.Demographics(juvenile_survival=rng.uniform(0.1, 0.6, size), adult_survival=rng.uniform(0.7, 0.99, size),
+                                           age_at_maturity=rng.integers(1, 6, size), fecundity=rng.uniform(0.5, 5, size))
+    maximum_ages = rng.integers(1, 61, size)
+    survival = demographics.survival_rates(maximum_ages)
+    fecundity = demographics.fecundity_rates(maximum_ages)
+    initial = rea_engine.killed_age_distribution(survival, rng.uniform(0, 1e6, size))
+    reproduction = rng.random((size, horizon)) < 0.8
+    additions = np.where(rng.random((size, horizon)) < 0.1, rng.uniform(0, 1000, (size, horizon)), 0.0)
+    for case_additions in (None, additions):
+        compact = rea_engine.project(initial, survival, fecundity, reproduction, case_additions)
+        assert np.array_equal(compact, rea_engine.project_dense(initial, survival, fecundity, reproduction, case_additions))
+
+    #full Leslie matrices (fecundity row included in reproduction years)
+    leslie = rea_engine.leslie_matrices(survival, fecundity)
+    survival_only = rea_engine.leslie_matrices(survival, fecundity, reproduction=False)
+    population = initial + additions[:, :1] * (np.arange(survival.shape[1]) == 0)
+    expected = [population.sum(axis=1)]
+    for t in range(1, horizon):
+        matrices = np.where(reproduction[:, t - 1, None, None], leslie, survival_only)
+        population = np.matmul(matrices, population[:, :, None])[:, :, 0]
+        population[:, 0] += additions[:, t]
+        expected.append(population.sum(axis=1))
+    assert np.allclose(rea_engine.project(initial, survival, fecundity, reproduction, additions), np.stack(expected, axis=1), rtol=1e-12, atol=0)
+
+def test_trajectory_cache_reuses_unaffected_trajectories():
+    demographics = rea_engine.Demographics(juvenile_survival=0.3, adult_survival=0.9, age_at_maturity=3, fecundity=3.7)
+    base = {**DEFAULT_INPUTS, 'maximum_age': 60, 'no_reintroduction_years': 10, 'start_year_reintroduction': 2019}
+    cache = rea_engine.TrajectoryCache()
+    variants = [
+        {'annual_reintroduction': 137.5},
+        {'discount_factor': 1.03},
+        {'no_reintroduction_years': 5},
+        {'start_year_reintroduction': 2021},
+        {'number_killed': 100},
+        {'maximum_age': 25},
+    ]
+    for changed in [{}] + variants:
+        inputs = {**base, **changed}
+        cached = rea_engine.evaluate(inputs, demographics, 179, cache)
+        uncached = rea_engine.evaluate(inputs, demographics, 179)
+        for key in (*rea_engine.YEARLY_OUTPUTS, *rea_engine.TOTAL_OUTPUTS, 'loss_ratio', 'qc_test'):
+            assert np.array_equal(cached[key], uncached[key]), f'{changed}: {key}'
+    #losses: base, number killed, maximum age; unit gains: base, reintroduction years, reintroduction start, maximum age
+    assert cache.misses == 7
+    assert cache.hits == 2 * len(variants) + 2 - cache.misses
+
+    #batches reuse trajectories of earlier scenarios and compute the others once
+    scenarios = pd.DataFrame([{**base, **changed} for changed in variants * 2] + [{**base, 'start_year_reproduction': 2018}])
+    misses = cache.misses
+    batch = rea_engine.evaluate_batch(scenarios, demographics, 179, cache=cache)
+    assert cache.misses == misses + 2
+    uncached = rea_engine.evaluate_batch(scenarios, demographics, 179)
+    for key in ('yearly', *rea_engine.TOTAL_OUTPUTS, 'loss_ratio'):
+        assert np.allclose(batch[key], uncached[key], rtol=1e-12, equal_nan=True)
+
+def test_tuning_settings_not_in_model_fingerprint():
+    config = {'misc': {'model_engine': 'native'}, 'native_model': {'horizon_years': 179, 'trajectory_cache_entries': 4096, 'experimental': True,
+                                                                   'demographics': {'fecundity': 3.7}}}
+    fingerprint = rea_backends.model_fingerprint(config)
+    #cached results stay valid when only cache sizes or the experimental flag change
+    assert rea_backends.model_fingerprint({**config, 'native_model': {**config['native_model'], 'trajectory_cache_entries': 16, 'experimental': False}}) == fingerprint
+    assert rea_backends.model_fingerprint({**config, 'native_model': {**config['native_model'], 'demographics': {'fecundity': 4.0}}}) != fingerprint
+
+def test_native_engine_experimental_until_verified():
+    #native_model.experimental may only be cleared once the engine matches recorded workbook outputs with the workbook's demographics
+    for config_file in CONFIG_FILES:
+        config = json.loads((CONFIG_DIR / config_file).read_text())
+        if not config['native_model'].get('experimental', True):
+            assert GOLDEN_FILE.exists(), config_file
+            assert config['native_model']['demographics'] == json.loads(GOLDEN_FILE.read_text())['demographics'], config_file
+    with pytest.raises(ValueError):
+        rea_backends.require_verified_engine({'misc': {'model_engine': 'native'}, 'native_model': {'experimental': True}})
+    rea_backends.require_verified_engine({'misc': {'model_engine': 'native'}, 'native_model': {'experimental': False}})
+    rea_backends.require_verified_engine({'misc': {'model_engine': 'excel'}, 'native_model': {'experimental': True}})
+
+@pytest.mark.skipif(not GOLDEN_FILE.exists(), reason='no recorded workbook outputs (run tests/record_workbook_golden.py on a machine with Excel)')
+def test_matches_recorded_workbook_outputs():
+    golden = json.loads(GOLDEN_FILE.read_text())
+    demographics = rea_engine.Demographics(**golden['demographics'])
+    for case in golden['cases']:
+        results = rea_engine.evaluate(case['inputs'], demographics, golden['horizon_years'])
+        for key, expected in case['outputs'].items():
+            assert np.allclose(results[key], expected, rtol=1e-6), f'{case["scenario_name"]}: {key}'
+
+if __name__ == "__main__":
+    test_direct_loss_hand_calculation()
+    test_discounting()
+    test_indirect_loss_from_reproduction()
+    test_gains_scale_with_annual_reintroduction()
+    test_batch_matches_single_scenarios()
+    test_compact_projection_matches_dense_reference()
+    test_trajectory_cache_reuses_unaffected_trajectories()
+    test_tuning_settings_not_in_model_fingerprint()
+    test_native_engine_experimental_until_verified()
@@ -0,0 +1,143 @@
+import json
+import logging
+import math
+import random
+import models.rea.backends as rea_backends
+import models.rea.solver as rea_solver
+import util.analysis_util as analysis_util
+from util.constants import *
+
+class FakeBackend:
+    '''Backend stand-in where total gains = gain_function(annual reintroduction)'''
+
+    def __init__(self, gain_function, total_loss = 1000.0):
+        self.gain_function = gain_function
+        self.total_loss = total_loss
+        self.inputs = {'annual_reintroduction': 1}
+        self.calculations = 0
+
+    def set_input(self, key, value):
+        self.inputs[key] = value
+
+    def get_input(self, key):
+        return self.inputs[key]
+
+    def calculate(self):
+        self.calculations += 1
+
+    def get_output(self, key):
+        if key == 'total_loss':
+            return self.total_loss
+        return self.gain_function(self.inputs['annual_reintroduction'])
+
+    def loss_ratio(self):
+        return self.get_output('total_gains') / self.total_loss
+
+    def run_goal_seek(self, target_value):
+        #bisection stands in for Excel GoalSeek
+        low, high = 0.0, 1e6
+        evaluations = 0
+        for evaluations in range(1, 200):
+            middle = (low + high) / 2
+            self.set_input('annual_reintroduction', middle)
+            if self.loss_ratio() < target_value:
+                low = middle
+            else:
+                high = middle
+        return evaluations
+
+class SecantBackend(rea_backends.REABackend):
+    '''Backend with the native secant goal seek and loss ratio not linear in annual reintroduction'''
+
+    def __init__(self):
+        super().__init__({'excel': {'input_cells': {}}})
+        self.inputs = {'annual_reintroduction': 1, 'discount_factor': 1.0, 'number_killed': 1000}
+
+    def set_input(self, key, value):
+        self.inputs[key] = value
+
+    def get_input(self, key):
+        return self.inputs[key]
+
+    def calculate(self):
+        pass
+
+    def loss_ratio(self):
+        return (self.inputs['annual_reintroduction'] / (self.inputs['number_killed'] * self.inputs['discount_factor'] ** 20)) ** 0.8
+
+def test_closed_form_linear_gains():
+    backend = FakeBackend(lambda annual: 2.5 * annual)
+    result = rea_solver.solve_annual_reintroduction(backend, {'target_value': 1, 'method': 'closed_form'})
+    assert result.method == 'closed_form'
+    assert result.linear
+    assert result.evaluations == 2 == backend.calculations
+    assert math.isclose(result.annual_reintroduction, 400)
+    assert backend.get_input('annual_reintroduction') == result.annual_reintroduction
+
+def test_closed_form_falls_back_when_not_linear():
+    backend = FakeBackend(lambda annual: annual ** 2)
+    result = rea_solver.solve_annual_reintroduction(backend, {'target_value': 1, 'method': 'closed_form'})
+    assert result.method == 'iterative'
+    assert result.linear is False
+    assert math.isclose(result.annual_reintroduction, math.sqrt(1000), rel_tol=1e-6)
+
+def test_iterative_method():
+    backend = FakeBackend(lambda annual: 2.5 * annual)
+    result = rea_solver.solve_annual_reintroduction(backend, {'target_value': 1})
+    assert result.method == 'iterative'
+    assert math.isclose(result.annual_reintroduction, 400, rel_tol=1e-6)
+
+def test_warm_start_follows_sweep_order():
+    fields = ['discount_factor', 'number_killed']
+    discount_factors = [1 + 0.0001 * step for step in range(40)]
+    random.seed(3)
+    random.shuffle(discount_factors)
+    scenarios = [(number, f's{number}', {'discount_factor': discount_factor, 'number_killed': number_killed})
+                 for number, (number_killed, discount_factor) in enumerate(((number_killed, discount_factor) for number_killed in (1000, 5000) for discount_factor in discount_factors), start=1)]
+    order = rea_solver.similarity_order(scenarios, fields)
+    #scenarios of each number killed are solved together, in order of discount factor
+    ordered = [scenarios[number - 1][2] for number in order]
+    assert ordered == sorted(ordered, key=lambda inputs: (inputs['number_killed'], inputs['discount_factor']))
+
+    goal_seek_config = {'target_value': 1, 'method': 'iterative'}
+    evaluations = {}
+    for warm in (False, True):
+        backend = SecantBackend()
+        warm_start = rea_solver.WarmStart(fields) if warm else None
+        evaluations[warm] = 0
+        for number in order:
+            scenario_inputs_dict = scenarios[number - 1][2]
+            backend.inputs.update(scenario_inputs_dict, annual_reintroduction=1)
+            initial_value = warm_start.nearest(scenario_inputs_dict) if warm_start else None
+            result = rea_solver.solve_annual_reintroduction(backend, goal_seek_config, number, initial_value=initial_value)
+            evaluations[warm] += result.evaluations
+            assert abs(backend._loss_ratio_at(result.annual_reintroduction) - 1) < backend.goal_seek_max_change
+            if warm_start:
+                warm_start.add(scenario_inputs_dict, result.annual_reintroduction)
+    assert evaluations[True] < 0.6 * evaluations[False]
+
+def test_batched_closed_form_matches_single_scenarios():
+    with open(CONFIG_DIR / 'total_exhibits_config.json') as f:
+        config = json.load(f)
+    config['misc']['model_engine'] = 'native'
+    config['goal_seek']['method'] = 'closed_form'
+    defaults = config['excel']['input_values_default']
+    scenarios = [(number, f's{number}', {**defaults, 'number_killed': 1000 * number, 'maximum_age': 5 + 5 * number}) for number in range(1, 7)]
+    output_cells = config['excel']['output_cells_excluded_yearly']
+    loggers = [logging.getLogger(__name__)] * 3
+    backend = rea_backends.create_backend(config)
+    assert analysis_util.batch_evaluation(backend, config)
+
+    #runners evaluate chunks with the native engine and closed form goal seek as one batch
+    totals = analysis_util.evaluate_scenarios_total_batch(backend, config, scenarios, *loggers)
+    yearly = analysis_util.evaluate_scenarios_yearly_batch(backend, config, [(name, number, inputs) for number, name, inputs in scenarios], output_cells, *loggers)
+    for (number, name, inputs), total, yearly_result in zip(scenarios, totals, yearly):
+        assert total == analysis_util.evaluate_scenario_total(backend, config, number, name, inputs, *loggers)
+        assert yearly_result == analysis_util.evaluate_scenario_yearly(backend, config, name, number, inputs, output_cells, *loggers)
+
+if __name__ == "__main__":
+    test_closed_form_linear_gains()
+    test_closed_form_falls_back_when_not_linear()
+    test_iterative_method()
+    test_warm_start_follows_sweep_order()
+    test_batched_closed_form_matches_single_scenarios()
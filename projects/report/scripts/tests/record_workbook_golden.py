@@ -0,0 +1,55 @@
+'''
+Records REA workbook outputs for the native engine golden-value test (tests/rea_engine_test.py)
+Demographic rates are read from the workbook cells listed in excel.demographic_cells of the config file
+(e.g. "demographic_cells": {"juvenile_survival": "C30", ...}); copy the recorded values to native_model.demographics
+Requires Excel; run from the scripts folder: python tests/record_workbook_golden.py <path to REA workbook>
+'''
+import json
+import sys
+from pathlib import Path
+import chincheron_util.config as config_util
+import models.rea.backends as rea_backends
+import models.rea.engine as rea_engine
+import models.rea.inputs as rea_input_class
+from util.constants import *
+
+CONFIG_FILE = 'yearly_exhibits_config.json'
+GOLDEN_FILE = Path(__file__).parent / 'data' / 'rea_workbook_golden.json'
+
+#vary one input at a time around the config defaults
+CASES = {
+    'default': {},
+    'max_age_10': {'maximum_age': 10},
+    'discount_1.00': {'discount_factor': 1.0},
+    'discount_1.07': {'discount_factor': 1.07},
+    'late_reproduction': {'start_year_reproduction': 2020},
+    'late_reintroduction': {'start_year_reintroduction': 2030, 'no_reintroduction_years': 5},
+    'early_analysis': {'start_year_analysis': 2010},
+}
+
+def record(rea_file):
+    config = config_util.load_config(CONFIG_DIR / CONFIG_FILE)
+    output_cells = {**config['excel']['output_cells_excluded'], **config['excel']['output_cells_excluded_yearly']}
+    demographic_cells = config['excel'].get('demographic_cells')
+    if demographic_cells is None or set(demographic_cells) != set(rea_engine.Demographics.__dataclass_fields__):
+        raise ValueError(f'excel.demographic_cells in {CONFIG_FILE} must give the workbook cell of each of {tuple(rea_engine.Demographics.__dataclass_fields__)}')
+    cases = []
+    with rea_backends.ExcelBackend(rea_file, config) as backend:
+        demographics = {key: backend.sheet[cell].value for key, cell in demographic_cells.items()}
+        for scenario_name, overrides in CASES.items():
+            inputs = rea_input_class.REAScenarioInputs.create_from_config(CONFIG_DIR / CONFIG_FILE, **overrides).to_dict()
+            backend.set_inputs(inputs, scenario_name)
+            backend.calculate()
+            cases.append({'scenario_name': scenario_name, 'inputs': inputs, 'outputs': backend.read_outputs(output_cells, 12)})
+
+    golden = {
+        'workbook': Path(rea_file).name,
+        'horizon_years': config['native_model']['horizon_years'],
+        'demographics': demographics,
+        'cases': cases,
+    }
+    GOLDEN_FILE.parent.mkdir(parents=True, exist_ok=True)
+    GOLDEN_FILE.write_text(json.dumps(golden, indent=2))
+
+if __name__ == "__main__":
+    record(sys.argv[1])
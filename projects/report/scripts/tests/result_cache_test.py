@@ -0,0 +1,67 @@
+import numpy as np
+from models.rea.result_cache import ResultCache, scenario_key
+
+INPUTS = {'number_killed': 1000, 'discount_factor': 0.03, 'maximum_age': 50}
+SETTINGS = {'run': 'total', 'goal_seek': {'target_value': 1, 'method': 'closed_form'}, 'decimals': 5}
+
+def test_key_normalizes_inputs():
+    numpy_inputs = {'number_killed': np.int64(1000), 'discount_factor': np.float64(0.03), 'maximum_age': 50.0}
+    assert scenario_key('model', INPUTS, SETTINGS) == scenario_key('model', numpy_inputs, SETTINGS)
+    assert scenario_key('model', INPUTS, SETTINGS) != scenario_key('other model', INPUTS, SETTINGS)
+    assert scenario_key('model', INPUTS, SETTINGS) != scenario_key('model', {**INPUTS, 'number_killed': 1001}, SETTINGS)
+    assert scenario_key('model', INPUTS, SETTINGS) != scenario_key('model', INPUTS, {**SETTINGS, 'decimals': 4})
+
+def test_results_persist_across_runs(tmp_path):
+    key = scenario_key('model', INPUTS, SETTINGS)
+    with ResultCache(tmp_path / 'results.sqlite') as cache:
+        assert cache.get(key) is None
+        cache.put(key, {'outputs': {'total_loss': np.float64(12.5), 'years': [1.0, 2.0]}, 'qc_test': 'PASS'})
+    with ResultCache(tmp_path / 'results.sqlite') as cache:
+        assert cache.get(key) == {'outputs': {'total_loss': 12.5, 'years': [1.0, 2.0]}, 'qc_test': 'PASS'}
+        assert (cache.hits, cache.misses) == (1, 0)
+
+def test_least_recently_used_evicted(tmp_path):
+    value = {'years': list(range(100))}
+    entry_size = len(str(value).replace("'", '"'))
+    with ResultCache(tmp_path / 'results.sqlite', max_size_mb=2.5 * entry_size / 1024 / 1024) as cache:
+        cache.put('a', value)
+        cache.put('b', value)
+        cache.get('a')
+        cache.put('c', value)
+        assert cache.get('b') is None
+        assert cache.get('a') == value
+        assert cache.get('c') == value
+        assert cache.evictions == 1
+
+def test_size_kept_up_to_date(tmp_path):
+    with ResultCache(tmp_path / 'results.sqlite') as cache:
+        cache.put('a', {'years': [1, 2, 3]})
+        cache.put('b', [1])
+        #replacing an entry only counts its new size
+        cache.put('a', [1, 2])
+        assert cache.size == cache._stored_size() == len('[1, 2]') + len('[1]')
+    with ResultCache(tmp_path / 'results.sqlite') as cache:
+        assert cache.size == len('[1, 2]') + len('[1]')
+
+def test_caches_share_one_file(tmp_path):
+    #e.g. concurrent jobs of a run plan; each store is committed so the other cache is never locked out
+    value = {'years': list(range(100))}
+    entry_size = len(str(value).replace("'", '"'))
+    path = tmp_path / 'results.sqlite'
+    with ResultCache(path, max_size_mb=2.5 * entry_size / 1024 / 1024) as first, ResultCache(path, max_size_mb=2.5 * entry_size / 1024 / 1024) as second:
+        first.put('a', value)
+        second.put('b', value)
+        assert first.get('b') == value and second.get('a') == value
+        #size stored by the other cache counts towards the limit
+        first.put('c', value)
+        assert first.evictions == 1
+        assert second.get('a') is None
+        assert second.get('b') == value and second.get('c') == value
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    test_key_normalizes_inputs()
+    for test in (test_results_persist_across_runs, test_least_recently_used_evicted, test_size_kept_up_to_date, test_caches_share_one_file):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
@@ -0,0 +1,56 @@
+import pytest
+import util.result_store as result_store
+
+pytestmark = pytest.mark.skipif(not result_store.available(), reason='pyarrow not installed')
+
+def test_store_round_trip_and_excel_view(tmp_path):
+    with result_store.ResultStoreWriter(tmp_path / 'store', ['years', 'total_loss_yearly', 'total_gain_yearly']) as writer:
+        writer.add_scenario('Exhibit 1', 1, 's1', {'number_killed': 10, 'discount_factor': 0.03},
+                            {'annual_reintroduction_exact': 1.5, 'annual_reintroduction_rounded': 2},
+                            {'years': [2016, 2017, 2018], 'total_loss_yearly': [1.0, 2.5, 3.0]})
+        writer.add_scenario('Exhibit 1', 2, 's2', {'number_killed': 20, 'discount_factor': 0.03},
+                            {'annual_reintroduction_exact': 3.25, 'annual_reintroduction_rounded': 4},
+                            {'years': [2016, 2017], 'total_loss_yearly': [5.0, 6.0]})
+        writer.add_scenario('Exhibit 2', 1, 's1', {'number_killed': 10, 'discount_factor': 0.03},
+                            {'annual_reintroduction_exact': 1.5, 'annual_reintroduction_rounded': 2},
+                            {'total_gain_yearly': 7.0})
+
+    store = result_store.ResultStore(tmp_path / 'store')
+    assert store.exhibits() == ['Exhibit 1', 'Exhibit 2']
+    assert store.scenarios('Exhibit 1', columns=['number_killed'])['number_killed'].tolist() == [10, 20]
+
+    series = store.series('Exhibit 1', scenario_numbers=[2], series=['total_loss_yearly'])
+    assert list(series.columns) == ['exhibit', 'scenario_number', 'year_index', 'total_loss_yearly']
+    assert series['total_loss_yearly'].tolist() == [5.0, 6.0]
+
+    assert store.wide_outputs('Exhibit 1') == {
+        's1': '', 's1:years': [2016, 2017, 2018], 's1:total_loss_yearly': [1.0, 2.5, 3.0],
+        's1: Annual Reintroduction Rounded': 2, 's1: Annual Reintroduction Exact': 1.5,
+        's2': '', 's2:years': [2016, 2017], 's2:total_loss_yearly': [5.0, 6.0],
+        's2: Annual Reintroduction Rounded': 4, 's2: Annual Reintroduction Exact': 3.25,
+    }
+    assert store.wide_outputs('Exhibit 2')['s1:total_gain_yearly'] == [7.0]
+
+def test_rows_written_in_typed_batches(tmp_path):
+    #mixed int/float inputs and numeric scenario names are converted to the column types; a batch is written every 4 rows
+    with result_store.ResultStoreWriter(tmp_path / 'store', ['years'], rows_per_batch=4) as writer:
+        for number in range(1, 6):
+            writer.add_scenario('Exhibit 1', number, number * 10, {'number_killed': 10 if number % 2 else 10.5},
+                                {'annual_reintroduction_exact': None, 'annual_reintroduction_rounded': number}, {'years': [2016, 2017.0]})
+            if number == 4:
+                assert writer.scenarios.written == 4 and writer.series.written == 8
+        with pytest.raises(ValueError):
+            writer.add_scenario('Exhibit 1', 6, 's6', {'not_an_input': 1}, {}, {})
+
+    store = result_store.ResultStore(tmp_path / 'store')
+    scenarios = store.scenarios('Exhibit 1')
+    assert scenarios['scenario_name'].tolist() == ['10', '20', '30', '40', '50']
+    assert scenarios['number_killed'].tolist() == [10, 10.5, 10, 10.5, 10]
+    assert store.series(scenario_numbers=[5])['years'].tolist() == [2016, 2017]
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_store_round_trip_and_excel_view, test_rows_written_in_typed_batches):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
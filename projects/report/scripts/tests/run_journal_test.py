@@ -0,0 +1,36 @@
+import numpy as np
+from util.run_journal import RunJournal, JOURNAL_FILE
+
+def test_finished_scenarios_survive_reopen(tmp_path):
+    with RunJournal(tmp_path) as journal:
+        journal.record({'type': 'run', 'script': 'total_exhibits', 'config_file': 'total_exhibits_config.json', 'started': '20250101_000000'})
+        journal.record_scenario(1, csv_data={'Scenario_name': 's1', 'number_killed': np.int64(10)}, qc_test='PASS')
+        journal.record_scenario(1, 'Exhibit 1', outputs={'s1:years': [1.0, 2.0]}, csv_data={'Scenario_number': 1})
+        journal.record_exhibit('Exhibit 1')
+
+    with RunJournal(tmp_path) as journal:
+        assert journal.header()['script'] == 'total_exhibits'
+        assert journal.scenarios() == {1: {'type': 'scenario', 'exhibit': None, 'scenario_number': 1,
+                                           'csv_data': {'Scenario_name': 's1', 'number_killed': 10}, 'qc_test': 'PASS'}}
+        assert journal.scenarios('Exhibit 1')[1]['outputs'] == {'s1:years': [1.0, 2.0]}
+        assert journal.finished_exhibits() == {'Exhibit 1'}
+
+def test_incomplete_last_entry_discarded(tmp_path):
+    with RunJournal(tmp_path) as journal:
+        journal.record_scenario(1, csv_data={}, qc_test='PASS')
+    #crash while writing the next entry
+    with open(tmp_path / JOURNAL_FILE, 'a') as f:
+        f.write('{"type": "scenario", "exhibit": nu')
+
+    with RunJournal(tmp_path) as journal:
+        assert list(journal.scenarios()) == [1]
+        journal.record_scenario(2, csv_data={}, qc_test='PASS')
+    with RunJournal(tmp_path) as journal:
+        assert list(journal.scenarios()) == [1, 2]
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_finished_scenarios_survive_reopen, test_incomplete_last_entry_discarded):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
@@ -0,0 +1,27 @@
+import json
+from util.run_metrics import RunMetrics, METRICS_FILE
+
+def test_stage_summary_written(tmp_path):
+    metrics = RunMetrics()
+    for seconds in (1.0, 2.0, 3.0, 4.0):
+        metrics.record('goal_seek', seconds)
+    with metrics.span('csv_write'):
+        pass
+    metrics.merge({'goal_seek': [10.0]})
+
+    metrics.write(tmp_path, script='total_exhibits', scenarios=5)
+    with open(tmp_path / METRICS_FILE) as f:
+        written = json.load(f)
+    assert written['script'] == 'total_exhibits'
+    goal_seek = written['stages']['goal_seek']
+    assert goal_seek['count'] == 5
+    assert goal_seek['total'] == 20.0
+    assert goal_seek['p50'] == 3.0
+    assert goal_seek['max'] == 10.0
+    assert written['stages']['csv_write']['count'] == 1
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_stage_summary_written(Path(tmp_dir))
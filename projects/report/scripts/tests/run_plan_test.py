@@ -0,0 +1,34 @@
+import json
+import tempfile
+from pathlib import Path
+import pytest
+import util.run_plan as run_plan
+from util.constants import *
+
+def write_config(directory, name, engine, yearly = False, workbook = 'Mussel REA_v3.1.xlsx'):
+    with open(CONFIG_DIR / ('yearly_exhibits_config.json' if yearly else 'total_exhibits_config.json')) as f:
+        config = json.load(f)
+    config['misc']['model_engine'] = engine
+    config['files']['rea_file'] = workbook
+    path = Path(directory) / f'{name}_config.json'
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    return str(path)
+
+def test_jobs_grouped_by_shared_model(tmp_path):
+    total = write_config(tmp_path, 'total', 'excel')
+    yearly = write_config(tmp_path, 'yearly', 'excel', yearly=True)
+    other_workbook = write_config(tmp_path, 'other', 'excel', workbook='Mussel REA_v3.2.xlsx')
+    native = write_config(tmp_path, 'native', 'native')
+    plan = run_plan.build_plan([total, yearly, other_workbook, native, f'monte_carlo:{total}'])
+
+    assert [[job.label for job in group.jobs] for group in plan] == [
+        ['total:total', 'yearly:yearly'], ['total:other'], ['total:native'], ['monte_carlo:total']]
+    assert plan[0].model_key is not None and plan[2].model_key is None
+
+    with pytest.raises(ValueError):
+        run_plan.build_plan([total, f'total:{total}'])
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_path:
+        test_jobs_grouped_by_shared_model(Path(tmp_path))
@@ -0,0 +1,68 @@
+import json
+import shutil
+import pandas as pd
+import pytest
+import util.analysis_util as analysis_util
+import util.logger_setup as logger_setup
+from util.run_journal import RunJournal
+from util.constants import *
+
+def write_config(directory):
+    '''Native engine, warm started iterative goal seeks over a sweep (solve order differs from scenario order)'''
+    with open(CONFIG_DIR / 'total_exhibits_config.json') as f:
+        config = json.load(f)
+    config['misc'].update(model_engine='native', workers=1, detail_logging=False)
+    #tests resuming, not the model (runners refuse the native engine while it is experimental)
+    config['native_model']['experimental'] = False
+    config['goal_seek'].update(method='iterative', warm_start=True)
+    config['directories']['copy_source'] = str(directory)
+    config['sweep'] = {'axes': [{'number_killed': [1000, 2000, 3000]}, {'discount_factor': [1.0, 1.03, 1.05]}]}
+    path = directory / 'total_config.json'
+    with open(path, 'w') as f:
+        json.dump(config, f)
+    return path
+
+def read_output(run_directory):
+    return pd.read_csv(next(run_directory.glob('output/*_output.csv')))
+
+def test_interrupted_warm_started_run_resumes(tmp_path, monkeypatch):
+    config_file = write_config(tmp_path)
+    directories = []
+    try:
+        directories.append(analysis_util.run_rea_scenario_total(config_file, use_cache=False, script_name='resume_test_reference'))
+        expected = read_output(directories[-1])
+
+        #run stops after 5 goal seeks; scenarios solved ahead of earlier ones must already be journaled
+        evaluate = analysis_util.evaluate_scenario_total
+        solved = []
+        def interrupted(*args, **kwargs):
+            if len(solved) == 5:
+                raise KeyboardInterrupt
+            solved.append(args[2])
+            return evaluate(*args, **kwargs)
+        monkeypatch.setattr(analysis_util, 'evaluate_scenario_total', interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            analysis_util.run_rea_scenario_total(config_file, use_cache=False, script_name='resume_test_interrupted')
+        logger_setup.close_loggers()
+        directories.append(sorted(RESULTS_DIR.glob('resume_test_interrupted_*'))[-1])
+        assert solved != sorted(solved)
+        with RunJournal(directories[-1]) as journal:
+            assert sorted(journal.scenarios()) == sorted(solved)
+
+        #resumed run only solves the remaining scenarios and rebuilds the same output
+        solved.clear()
+        monkeypatch.setattr(analysis_util, 'evaluate_scenario_total', lambda *args, **kwargs: (solved.append(args[2]), evaluate(*args, **kwargs))[1])
+        analysis_util.run_rea_scenario_total(config_file, use_cache=False, resume=directories[-1])
+        assert len(solved) == 9 - 5
+        pd.testing.assert_frame_equal(read_output(directories[-1]), expected)
+    finally:
+        logger_setup.close_loggers()
+        for directory in set(directories):
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            test_interrupted_warm_started_run_resumes(Path(tmp_dir), monkeypatch)
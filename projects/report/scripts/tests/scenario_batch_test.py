@@ -0,0 +1,29 @@
+import json
+import numpy as np
+import pandas as pd
+import models.rea.inputs as rea_input_class
+from util.constants import *
+
+CONFIG_PATH = CONFIG_DIR / 'total_exhibits_config.json'
+
+def test_batch_matches_per_row_inputs():
+    with open(CONFIG_PATH) as f:
+        default_values = json.load(f)['excel']['input_values_default']
+    scenarios = pd.DataFrame({
+        'scenario_name': ['a', 'b', 'c'],
+        'number_killed': [100, np.nan, 300],
+        'maximum_age': [40, 45, 50],
+        'not_an_input': ['x', 'y', 'z'],
+    })
+    batch = rea_input_class.ScenarioBatch.from_table(scenarios, default_values)
+
+    assert len(batch) == 3
+    assert batch.names == ['a', 'b', 'c']
+    for (scenario_number, scenario_name, inputs), row in zip(batch.records(), scenarios.itertuples(index=False)):
+        expected = rea_input_class.REAScenarioInputs.create_from_config(CONFIG_PATH).update_from_row(row).to_dict()
+        assert inputs == expected
+        assert [type(value) for value in inputs.values()] == [type(value) for value in expected.values()]
+    assert batch.inputs(1)['number_killed'] == default_values['number_killed']
+
+if __name__ == "__main__":
+    test_batch_matches_per_row_inputs()
@@ -0,0 +1,37 @@
+import openpyxl
+from util.excel_util import StreamingWorkbookWriter
+
+def test_exhibit_sheets_written_in_one_pass(tmp_path):
+    output_file = tmp_path / 'yearly_exhibits_output.xlsx'
+    with StreamingWorkbookWriter(output_file) as writer:
+        writer.write_sheet('DRate v DMSY', {
+            's1': '',
+            's1:years': [2016, 2017, 2018],
+            's1:dmsy': [1.5, 2.5, 3.5],
+            's1: Annual Reintroduction Rounded': 120,
+        })
+        writer.write_sheet('Killed v. DMSY', {'s2:years': [2016, 2017]})
+        assert not output_file.exists()
+
+    wb = openpyxl.load_workbook(output_file)
+    assert wb.sheetnames == ['DRate v DMSY', 'Killed v. DMSY']
+    sheet = wb['DRate v DMSY']
+    assert [cell.value for cell in sheet[1]] == ['s1', 's1:years', 's1:dmsy', 's1: Annual Reintroduction Rounded']
+    assert all(cell.alignment.wrap_text for cell in sheet[1])
+    assert sheet.column_dimensions['B'].width == 10
+    assert [row for row in sheet.iter_rows(min_row=2, values_only=True)] == [
+        (None, 2016, 1.5, 120),
+        (None, 2017, 2.5, None),
+        (None, 2018, 3.5, None),
+    ]
+
+def test_no_workbook_without_sheets(tmp_path):
+    StreamingWorkbookWriter(tmp_path / 'output.xlsx').close()
+    assert not (tmp_path / 'output.xlsx').exists()
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for test in (test_exhibit_sheets_written_in_one_pass, test_no_workbook_without_sheets):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            test(Path(tmp_dir))
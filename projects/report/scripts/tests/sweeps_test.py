@@ -0,0 +1,57 @@
+import json
+import pandas as pd
+import pytest
+import models.rea.inputs as rea_input_class
+import models.rea.sweeps as rea_sweeps
+import util.analysis_util as analysis_util
+from util.constants import *
+
+def load_defaults():
+    with open(CONFIG_DIR / 'total_exhibits_config.json') as f:
+        return json.load(f)['excel']['input_values_default']
+
+SWEEP_CONFIG = {
+    'name': 'DR {discount_factor} age {maximum_age}',
+    'axes': [
+        {'discount_factor': [1.0, 1.03]},
+        {'maximum_age': {'start': 10, 'stop': 30, 'step': 10}},
+        {'start_year_analysis': [2016, 2020], 'discount_start_year': [2016, 2020]},
+    ],
+}
+
+def test_sweep_matches_equivalent_scenario_table():
+    defaults = load_defaults()
+    sweep = rea_sweeps.Sweep.from_config(SWEEP_CONFIG, defaults)
+    assert len(sweep) == 2 * 3 * 2
+
+    #same scenarios written out row by row (first axis varies slowest)
+    rows = [
+        {'scenario_name': f'DR {discount_factor} age {maximum_age}', 'discount_factor': discount_factor, 'maximum_age': maximum_age,
+         'start_year_analysis': year, 'discount_start_year': year}
+        for discount_factor in (1.0, 1.03) for maximum_age in (10, 20, 30) for year in (2016, 2020)
+    ]
+    table = rea_input_class.ScenarioBatch.from_table(pd.DataFrame(rows), defaults)
+    assert list(sweep.records()) == list(table.records())
+    assert sweep.names[4] == table.names[4] and sweep.inputs(7) == table.inputs(7)
+
+    batches = list(sweep.batches(batch_size=5))
+    assert [len(batch) for batch in batches] == [5, 5, 2]
+    assert batches[1].inputs(0) == sweep.inputs(5) and batches[2].names == sweep.names[10:]
+    assert list(sweep.head(3).records()) == list(sweep.records())[:3]
+
+    #runners stream sweeps and tables in chunks numbered on from the previous chunk
+    for scenarios in (sweep, table):
+        chunks = list(analysis_util.scenario_chunks(scenarios, 5))
+        assert [len(chunk) for chunk in chunks] == [5, 5, 2] and sum(chunks, []) == list(table.records())
+
+def test_range_and_invalid_sweeps():
+    assert rea_sweeps.axis_values({'start': 1.0, 'stop': 1.05, 'step': 0.01}) == [1.0, 1.01, 1.02, 1.03, 1.04, 1.05]
+    assert rea_sweeps.axis_values({'start': 0, 'stop': 1, 'num': 3}) == [0.0, 0.5, 1.0]
+    with pytest.raises(ValueError):
+        rea_sweeps.Sweep.from_config({'axes': [{'not_an_input': [1]}]}, load_defaults())
+    with pytest.raises(ValueError):
+        rea_sweeps.Sweep.from_config({'axes': [{'maximum_age': [10, 20], 'discount_factor': [1.0]}]}, load_defaults())
+
+if __name__ == "__main__":
+    test_sweep_matches_equivalent_scenario_table()
+    test_range_and_invalid_sweeps()
@@ -0,0 +1,136 @@
+import json
+import openpyxl
+import models.rea.workbook_compiler as workbook_compiler
+
+SHEET = 'Matrix Inputs'
+INPUT_CELLS = {'number_killed': 'C7', 'discount_factor': 'C8'}
+OUTPUT_CELLS = {'direct_loss': 'F7', 'indirect_loss': 'F8', 'total_loss': 'F9', 'loss_ratio': 'F12', 'qc_test': 'D23', 'years': 'H8:H10'}
+
+def create_workbook(path):
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.title = SHEET
+    sheet['C7'] = 100
+    sheet['C8'] = 2
+    sheet['F7'] = '=C7*2'
+    sheet['H8'] = '=$C$8+1'
+    sheet['H9'] = '=H8*2'
+    sheet['H10'] = '=H9*2'
+    sheet['F8'] = '=SUM(H8:H10)'
+    sheet['F9'] = "=F7+'Rates'!A1*C7"
+    sheet['F12'] = '=IF(F7>0,F8/F7,0)'
+    sheet['D23'] = '=IF(AND(F12>=0,F9>0),"PASS","FAIL")'
+    rates = wb.create_sheet('Rates')
+    rates['A1'] = 0.5
+    wb.save(path)
+
+def test_compiled_values(tmp_path):
+    create_workbook(tmp_path / 'model.xlsx')
+    model = workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS)
+    assert model.read('F7', SHEET) == 200
+    assert model.read('H8:H10', SHEET) == [3, 6, 12]
+    assert model.read('F9', SHEET) == 250
+    assert model.read('F12', SHEET) == 21 / 200
+    assert model.read('D23', SHEET) == 'PASS'
+
+def test_only_downstream_cells_recalculated(tmp_path):
+    create_workbook(tmp_path / 'model.xlsx')
+    model = workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS)
+    model.calculate()
+    evaluations = model.evaluations
+
+    model.set_input('discount_factor', 3)
+    model.calculate()
+    # H8, H9, H10, F8, F12 and D23 depend on C8; F7 and F9 do not
+    assert model.evaluations - evaluations == 6
+    assert model.read('F8', SHEET) == 4 + 8 + 16
+
+    evaluations = model.evaluations
+    model.set_input('discount_factor', 3)
+    model.calculate()
+    assert model.evaluations == evaluations
+
+def test_compiled_graph_cached_by_workbook_hash(tmp_path):
+    create_workbook(tmp_path / 'model.xlsx')
+    cache_dir = tmp_path / 'cache'
+    workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS, cache_dir)
+    assert len(list(cache_dir.iterdir())) == 1
+
+    #cached graph is used even if workbook parsing would now fail
+    original = workbook_compiler.build_artifact
+    workbook_compiler.build_artifact = None
+    try:
+        model = workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS, cache_dir)
+    finally:
+        workbook_compiler.build_artifact = original
+    assert model.read('F7', SHEET) == 200
+
+    #changed workbook gets a new cache entry
+    wb = openpyxl.load_workbook(tmp_path / 'model.xlsx')
+    wb[SHEET]['F7'] = '=C7*3'
+    wb.save(tmp_path / 'model.xlsx')
+    model = workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS, cache_dir)
+    assert model.read('F7', SHEET) == 300
+    assert len(list(cache_dir.iterdir())) == 2
+
+def test_tampered_cache_not_executed(tmp_path):
+    create_workbook(tmp_path / 'model.xlsx')
+    cache_dir = tmp_path / 'cache'
+    workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS, cache_dir)
+    cache_file = next(cache_dir.iterdir())
+    marker = tmp_path / 'executed'
+    injected = f"open({str(marker)!r}, 'w')"
+    #cache files hold expression trees; anything that is not a valid tree is rejected before source is generated
+    for formula in (['op', f'+ {injected} +', ['value', 1], ['value', 2]], ['range', 'Rates', f'{injected} or 1', 1, 1, 1], ['func', f'__import__', []]):
+        artifact = json.loads(cache_file.read_text())
+        artifact['formulas'][f'{SHEET}!F7'] = formula
+        cache_file.write_text(json.dumps(artifact))
+        model = workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS, cache_dir)
+        assert model.read('F7', SHEET) == 200 and not marker.exists()
+    #cache entries of another workbook are not used
+    artifact = json.loads(cache_file.read_text())
+    artifact['workbook_hash'] = 'other'
+    artifact['formulas'][f'{SHEET}!F7'] = ['value', 1]
+    cache_file.write_text(json.dumps(artifact))
+    assert workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, INPUT_CELLS, OUTPUT_CELLS, cache_dir).read('F7', SHEET) == 200
+
+def test_blank_cells_and_error_values(tmp_path):
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.title = SHEET
+    sheet['C7'] = 100
+    #H8:H12 holds numbers, blanks and text
+    sheet['H8'] = 1
+    sheet['H10'] = 3
+    sheet['H11'] = 'x'
+    formulas = {
+        'F1': '=COUNT(H8:H12)', 'F2': '=AVERAGE(H8:H12)', 'F3': '=MIN(H8:H12)', 'F4': '=SUM(H8:H12)', 'F5': '=H9+1',
+        'F6': '=AVERAGE(J1:J3)', 'F7': '=SUM(H8:H10*2)',
+        'E1': '=1/(C7-100)', 'E2': '=E1+1', 'E3': '=IF(E1>0,1,2)', 'E4': '=AND(E1>0,TRUE)', 'E5': '=IFERROR(E2,-1)',
+        'E6': '="a"+1', 'E7': '=SUM(E1:E2)', 'E8': '=E1=1', 'E9': '=IF(C7>0,E6,0)', 'E10': '=SQRT(-C7)',
+    }
+    for coordinate, formula in formulas.items():
+        sheet[coordinate] = formula
+    wb.save(tmp_path / 'model.xlsx')
+    model = workbook_compiler.compile_workbook(tmp_path / 'model.xlsx', SHEET, {'number_killed': 'C7'}, {key: key for key in formulas})
+
+    #functions skip blanks in ranges; blanks referenced directly or in arithmetic read as 0
+    assert [model.read(key, SHEET) for key in ('F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7')] == [2, 2, 1, 4, 1, '#DIV/0!', 8]
+    #errors keep their code through references, IF, AND, comparisons and aggregates; IFERROR catches them
+    assert [model.read(key, SHEET) for key in ('E1', 'E2', 'E3', 'E4', 'E5', 'E6', 'E7', 'E8', 'E9', 'E10')] == [
+        '#DIV/0!', '#DIV/0!', '#DIV/0!', '#DIV/0!', -1, '#VALUE!', '#DIV/0!', '#DIV/0!', '#VALUE!', '#NUM!']
+
+    model.set_input('number_killed', 101)
+    assert [model.read(key, SHEET) for key in ('E1', 'E2', 'E3', 'E4', 'E5', 'E7', 'E8')] == [1, 2, 1, True, 2, 3, True]
+
+def test_operator_precedence():
+    def evaluate(formula):
+        expression = workbook_compiler.FormulaParser(formula, SHEET).parse()
+        return eval(workbook_compiler.to_python(expression), dict(workbook_compiler.RUNTIME_NAMESPACE), {'v': {}})
+    assert evaluate('=-2^2') == 4
+    assert evaluate('=2+3*2^3') == 26
+    assert evaluate('=50%*4') == 2
+    assert evaluate('=1&"a"""') == '1a"'
+    assert evaluate('=IFERROR(1/0,-1)') == -1
+    assert evaluate('=ROUND(2.5,0)+ROUND(-2.5,0)') == 0
+    assert evaluate('=1=1') is True and evaluate('=1<>1') is False
@@ -1,59 +1,120 @@
 '''Functions for running full analyses'''
 from pathlib import Path
+from collections import Counter
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import json
+import logging
+import math
+import multiprocessing.util
+import os
+import shutil
 import chincheron_util.file_util as file_util
+import numpy as np
 import pandas as pd
 import util.logger_setup as logger_setup
 import time
-import chincheron_util.excel_util as xl
-import chincheron_util.csv_util as csv_util
+from util.csv_util import CSVResultWriter
+from util.excel_util import StreamingWorkbookWriter, round_cells
+from util.run_journal import RunJournal, JOURNAL_FILE
+import util.result_store as result_store
+import util.run_metrics as run_metrics
 import models.rea.inputs as rea_input_class
-import chincheron_util.config as config_utl
+import models.rea.backends as rea_backends
+import models.rea.engine as rea_engine
+import models.rea.model_pool as model_pool
+import models.rea.solver as rea_solver
+import models.rea.sweeps as rea_sweeps
+import models.rea.monte_carlo as rea_monte_carlo
+from models.rea.result_cache import ResultCache, scenario_key
 from util.constants import * 
 import chincheron_util.config as config_util
 import chincheron_util.data_util as data_util
 import chincheron_util.math_util as math_util
 import git
 
-def run_rea_scenario_total(config_file: Path | str, debug = False):
-    '''Runs REA based on scenario input file and returns total outputs (i.e. single cell outputs) '''
+#inputs compared when looking for the most similar solved scenario (annual reintroduction is what the goal seek solves for)
+WARM_START_FIELDS = tuple(field_name for field_name in rea_input_class.INPUT_FIELDS if field_name != 'annual_reintroduction')
+#scenarios are keyed, looked up and ordered for warm starts in chunks of this many (misc.scenario_chunk_size in config)
+SCENARIO_CHUNK_SIZE = 2048
+
+def run_rea_scenario_total(config_file: Path | str, debug = False, use_cache = True, resume: Path | str | None = None, incremental = False, profile = False,
+                           script_name: str | None = None, staged_inputs: Path | str | None = None, shared_backend = None) -> Path:
+    '''
+    Runs REA based on scenario input file and returns total outputs (i.e. single cell outputs)
+    Results of previously run scenarios are reused from the result cache unless use_cache is False
+    resume: results directory of an interrupted run to continue (finished scenarios are not rerun)
+    incremental: only rerun scenarios added or changed since the last run of this script; others are carried forward
+    profile: also write a cProfile dump of the run to the results directory
+    script_name: name of results directory and output files (default: name of the running script)
+    staged_inputs: folder holding input files already copied from copy_source (e.g. shared by jobs of a run plan)
+    shared_backend: open model backend to use instead of loading one (left open at the end of the run)
+    Stage timings are written to run_metrics.json in the results directory; returns the results directory
+    '''
     #TODO add 1) total released mussesl (i.e., xyears fo release) 2) help calculating dmsy/mussel? to final outputs file
     
-    wb_rea = None
-    app = None
+    backend = shared_backend
+    profiler = None
+    result_cache = None
+    journal = None
+    output_writer = None
+    failed_writer = None
     try:
         # initial constants
         CONFIG_FILE = config_file
         CONFIG_PATH = CONFIG_DIR / CONFIG_FILE
         TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
         START_TIME = time.perf_counter()
-        config = config_utl.load_config(CONFIG_PATH)
+        #timing of each run stage (see util.run_metrics)
+        metrics = run_metrics.RunMetrics()
+        with metrics.span('config_load'):
+            config = config_util.load_config(CONFIG_PATH)
 
         #get script name of root script to use to create directory to hold results for each run of script (e.g., scenarios.py returns 'Scenarios')
-        SCRIPT_NAME = file_util.get_script_name()
-        script_run_results_directory = Path(RESULTS_DIR) / Path(f'{SCRIPT_NAME}_{TIMESTAMP}')
+        SCRIPT_NAME = script_name or file_util.get_script_name()
+        if resume:
+            script_run_results_directory = resume_run_directory(resume)
+        else:
+            script_run_results_directory = Path(RESULTS_DIR) / Path(f'{SCRIPT_NAME}_{TIMESTAMP}')
         #setup logger
-        main_logger, warning_logger, detail_logger, console_logger  = logger_setup.setup_loggers(script_run_results_directory)
+        main_logger, warning_logger, detail_logger, console_logger  = logger_setup.setup_loggers(script_run_results_directory, config['misc'].get('detail_logging', True))
+        profiler = run_metrics.start_profile(profile)
+        #report results are not written with the unverified native engine
+        rea_backends.require_verified_engine(config)
+
+        #progress journal: each finished scenario is recorded so an interrupted run can be resumed
+        journal = open_run_journal(script_run_results_directory, SCRIPT_NAME, CONFIG_FILE, TIMESTAMP, resume, main_logger, warning_logger)
+        if resume and journal.header():
+            #output files are named after the script that started the run
+            SCRIPT_NAME = journal.header()['script']
 
         #settings from config
         files = config['files']
         directories = config['directories']
-        excel_config = config['excel']
         misc_config = config['misc']
-        goal_seek_config = config['goal_seek']
-        input_cells_config = excel_config['input_cells']
-        output_cells_config = excel_config['output_cells_excluded']
-        sheets_config = excel_config['sheet_name']
+        csv_flush_rows = misc_config.get('csv_flush_rows', 100)
+        csv_flush_seconds = misc_config.get('csv_flush_seconds', 5)
 
         decimal_precision_results = misc_config['result_decimal_precision']
+        workers = misc_config.get('workers', 1)
 
         rea_file = files['rea_file']
         scenario_file = files['input_file']
-        copy_dir = directories['copy_source']
+        copy_dir = staged_inputs or directories['copy_source']
         
         output_dir = RESULTS_DIR / Path(script_run_results_directory) / Path(directories['output_folder'])
         output_dir.mkdir(parents=True, exist_ok=True)
         output_file = output_dir / Path(f'{SCRIPT_NAME}_output.csv')
+        failed_file = output_dir / 'failed_scenario.csv'
+        if resume:
+            #partial output files are rebuilt from the journal so rows are never lost or duplicated
+            output_file.unlink(missing_ok=True)
+            failed_file.unlink(missing_ok=True)
+        #output csvs are held open for the whole run and written in batches
+        output_writer = CSVResultWriter(output_file, csv_flush_rows, csv_flush_seconds, main_logger)
+        failed_writer = CSVResultWriter(failed_file, 1, csv_flush_seconds, warning_logger)
         
         input_dir = RESULTS_DIR / Path(script_run_results_directory) / Path(directories['input_folder'])
         input_dir.mkdir(parents=True, exist_ok=True)
@@ -61,115 +122,132 @@ def run_rea_scenario_total(config_file: Path | str, debug = False):
         rea_file = input_dir / rea_file
 
 
-        #copy current REA version file 
-        file_util.copy_input_from_config(copy_dir, input_dir, files)
-        main_logger.info(f'Input files copied from current working version folder')
+        #copy current REA version file (resumed runs keep the inputs copied by the original run)
+        if not resume:
+            with metrics.span('file_copy'):
+                file_util.copy_input_from_config(copy_dir, input_dir, files)
+            main_logger.info(f'Input files copied from {"staged inputs of run plan" if staged_inputs else "current working version folder"}')
 
         #load scenario input file
-        scenarios = pd.read_csv(scenario_file)
-        main_logger.info(f'Loaded {len(scenarios)} from scenarios input file into dataframe')
-
-        #load REA model and I/O sheet
-        wb_rea, app = xl.load_workbook(rea_file)
-        main_logger.info(f'REA model workbook loaded ({rea_file})')
-        io_sheet = xl.load_worksheet(wb_rea, sheets_config['input_sheet'], warning_logger)
-        main_logger.info(f'REA input sheet loaded ({io_sheet})')
-
-        # for loop runs through different scenarios and:
-        # 1) Sets inputs
-        # 2) Solves for number of annual reintroductions required for gains to equal losses
-        # 3) Reads desired outputs and writes both inputs and outputs to an output csv for later processing
-        # 4) QC check of REA QC tests
-        for scenario_number, row in enumerate(scenarios.itertuples(index=False), start =1): 
-            scenario_name = scenarios.loc[(scenario_number-1),'scenario_name']
-
-            #Step #1: Set inputs
-            # Create scenario inputs class with defaults values
-            scenario_inputs = rea_input_class.REAScenarioInputs.create_from_config(CONFIG_PATH, debug=True)
-            # and override with input values from the scenarios input dataframe for each scenario
-            scenario_inputs.update_from_row(row)
-            #must convert to dict for easier reading into later functions
-            scenario_inputs_dict = scenario_inputs.to_dict()
-            main_logger.info(f'Scenario {scenario_number}: Inputs loaded')
-
-            xl.set_excel_inputs(io_sheet, scenario_inputs_dict, input_cells_config, scenario_number, main_logger)
-            #detail logging of scenario inputs
-            log_lines = [f'Scenario {scenario_number}: Excel inputs set:']
-            #read and return all inputs from config file and scenario inputs override
-            for key in input_cells_config.keys():
-                if key in scenario_inputs_dict:
-                    clean_key = key.replace('_', ' ').title()
-                    log_lines.append(f'  {clean_key} set to: {scenario_inputs_dict[key]}')
-            detail_logger.info('\n'.join(log_lines))
-            
-            #Step #2: Solves for number of annual reintroductions required for gains to equal losses
-            # Goal Seek: set Goal:Loss ratio to 1 by changing Annual Mussel Reintroduction 
-            xl.run_goal_seek(io_sheet, input_cells_config['loss_ratio'], input_cells_config['annual_reintroduction'], goal_seek_config['target_value'])
-            main_logger.info(f'Scenario {scenario_number}: Required annual reintroduction calculated (for gain to equal loss)')
-
-            #No such thing as partial mussel so round annual mussel reintroduction down to nearest whole number and set cell to value
-            annual_reintroduction_exact = math_util.round_outputs(io_sheet[input_cells_config['annual_reintroduction']].value, decimal_precision_results)
-            detail_logger.info(f'Scenario {scenario_number}: Exact annual reintroduction: {annual_reintroduction_exact}')
-            annual_reintroduction_rounded = math_util.round_annual_reintro(annual_reintroduction_exact)
-            detail_logger.info(f'Scenario {scenario_number}: Rounded Annual reintroduction: {annual_reintroduction_rounded}')
-            total_gain_exact = math_util.round_outputs(io_sheet[output_cells_config['total_gains']].value, decimal_precision_results) 
-            io_sheet[input_cells_config['annual_reintroduction']].value =annual_reintroduction_rounded
-
-            #calculate total mussel releases over the entire release period for calcualting per mussel statistics
-            total_releases_rounded = annual_reintroduction_rounded * io_sheet[input_cells_config['no_reintroduction_years']].value
-            total_releases_exact = math_util.round_outputs(annual_reintroduction_exact * io_sheet[input_cells_config['no_reintroduction_years']].value, decimal_precision_results)
-
-            #Step #3: Reads desired outputs and writes both inputs and outputs to an output csv for later processing
-            #force excel to recalculate
-            wb_rea.app.calculate()
-            main_logger.info(f'Scenario {scenario_number}: Excel workbook recalculated')
-
-            #read model outputs and append to csv file
-            outputs = xl.read_excel_outputs(io_sheet, output_cells_config, decimal_precision_results, logger= main_logger)
-            csv_data = {
-                        'Scenario_name': scenario_name,
-                        **scenario_inputs_dict,
-                        **outputs,
-                        'total_gains_exact': total_gain_exact,
-                        'Annual Reintroduction Rounded': annual_reintroduction_rounded,
-                        'Annual Reintroduction Exact': annual_reintroduction_exact,
-                        'Total Reintroduction Rounded': total_releases_rounded,
-                        'Total Reintroduction Exact': total_releases_exact
-                        }
-            if not output_file.exists():
-                csv_util.create_output_csv(output_file, csv_data)
-            csv_util.append_output_to_csv(output_file, list(csv_data.values()))
-            
-            #detail logging of scenario outputs
-            log_lines = [f'Scenario {scenario_number}: Excel outputs written to output file:']
-            #read and return all outputs from config file
-            for key in output_cells_config.keys():
-                if key in csv_data:
-                    clean_key = key.replace('_', ' ').title()
-                    log_lines.append(f'  {clean_key}: {csv_data[key]}')
-            #inclue outputs created in processing (not in config)
-            log_lines.append(f'  Annual Reintroduction Rounded: {annual_reintroduction_rounded}')
-            log_lines.append(f'  Annual Reintroduction Exact: {annual_reintroduction_exact}')
-            detail_logger.info('\n'.join(log_lines))
-
-            # Step #4: QC check of REA QC tests
-            #Excel sheet has multiple qc tests whose results are summarized in a single cell as either 'PASS' or 'FAIL'
-            #Check this cell and write I/O to file if 'FAIL' for review
-            xl.check_qc(io_sheet, input_cells_config['qc_test'], output_dir, csv_data, scenario_number, main_logger, warning_logger)
-           
-            main_logger.info(f'Scenario {scenario_number}: Scenario completed')
-            console_logger.info(f'{scenario_number}/{len(scenarios)} complete')
-
+        #scenarios declared as a sweep in the config file are generated as they are run (no scenario input file)
+        if 'sweep' in config:
+            batch = rea_sweeps.Sweep.from_config(config['sweep'], config['excel']['input_values_default'])
+            main_logger.info(f'Generating {len(batch)} scenarios from sweep in config file')
             if debug != False:
-                if scenario_number == debug:
-                    break
+                batch = batch.head(debug)
+        else:
+            scenarios = pd.read_csv(scenario_file)
+            main_logger.info(f'Loaded {len(scenarios)} from scenarios input file into dataframe')
+            if debug != False:
+                scenarios = scenarios.head(debug)
+            #merge config defaults with scenario table once (column-wise) instead of for every scenario
+            batch = rea_input_class.ScenarioBatch.from_table(scenarios, config['excel']['input_values_default'])
+
+        #scenario keys (hash of model, scenario inputs and settings) identify unchanged scenarios across runs
+        model_fingerprint = rea_backends.model_fingerprint(config, rea_file)
+        settings = total_cache_settings(config)
+
+        #scenarios finished before an interrupted run stopped are replayed from the journal
+        journal_results = journal.scenarios()
+        if journal_results:
+            main_logger.info(f'Resuming run: {len(journal_results)} finished scenarios replayed from run journal')
+            console_logger.info(f'Resuming run: {len(journal_results)}/{len(batch)} scenarios already finished')
+
+        #incremental run: scenarios unchanged since the last run are carried forward from its journal
+        previous_results = {}
+        if incremental:
+            previous_results, _ = load_previous_results(SCRIPT_NAME, script_run_results_directory, main_logger)
+        #scenarios carried forward by scenario key (counted as the chunks are run)
+        carried = Counter()
+
+        #results of unchanged scenarios (same model, inputs and settings) are read from the result cache instead of the model
+        result_cache = ResultCache.from_config(config, PROJECT_BASE_DIR, main_logger, use_cache)
+        if result_cache:
+            result_cache.open()
+        else:
+            main_logger.info(f'Result cache not used')
+
+        def keyed_chunks():
+            '''Scenarios in chunks (a sweep is never held in memory whole) with their scenario keys and known results'''
+            for chunk in scenario_chunks(batch, config['misc'].get('scenario_chunk_size', SCENARIO_CHUNK_SIZE)):
+                scenario_keys = {
+                    scenario_number: scenario_key(model_fingerprint, scenario_inputs_dict, settings)
+                    for scenario_number, _, scenario_inputs_dict in chunk
+                }
+                carried.update(key for key in scenario_keys.values() if key in previous_results)
+                yield chunk, scenario_keys, known_results_total(chunk, scenario_keys, journal_results, previous_results, result_cache)
+
+        log_warm_start(config['goal_seek'], main_logger, warning_logger)
+        if workers > 1:
+            #each worker process owns its own model backend; results are written in scenario order as they arrive
+            run_scenarios_total_parallel(keyed_chunks(), len(batch), config, rea_file, script_run_results_directory, output_writer, failed_writer, workers,
+                                         main_logger, warning_logger, detail_logger, console_logger, result_cache, journal, metrics)
+        else:
+            # for loop runs through different scenarios and:
+            # 1) Sets inputs
+            # 2) Solves for number of annual reintroductions required for gains to equal losses
+            # 3) Reads desired outputs and writes both inputs and outputs to an output csv for later processing
+            # 4) QC check of REA QC tests
+            warm_start = None
+            if rea_solver.warm_start_enabled(config['goal_seek']):
+                #scenarios of each chunk are solved in order of similarity, each goal seek starting from the nearest solved scenario
+                warm_start = rea_solver.WarmStart(WARM_START_FIELDS)
+            #rows are written in scenario order whatever order the scenarios of a chunk are solved in
+            next_scenario = 1
+            for chunk, scenario_keys, known_results in keyed_chunks():
+                records = chunk if warm_start is None else similarity_ordered_records(chunk, known_results)
+                unknown = [record for record in records if record[0] not in known_results]
+                #load REA model backend (Excel workbook or native engine, as specified in config) when first needed
+                if unknown and backend is None:
+                    backend = rea_backends.create_backend(config, rea_file, main_logger, warning_logger)
+                    with metrics.span('model_open'):
+                        backend.open()
+                #native engine with closed form goal seek: scenarios of the chunk not known yet are evaluated as one vectorized batch
+                batch_results = {}
+                if unknown and batch_evaluation(backend, config):
+                    with metrics.span('scenario_batch'):
+                        batch_results = dict(zip((record[0] for record in unknown),
+                                                 evaluate_scenarios_total_batch(backend, config, unknown, main_logger, warning_logger, detail_logger, metrics)))
+                finished = {}
+                for scenario_number, scenario_name, scenario_inputs_dict in records: 
+                    source = None
+                    if scenario_number in known_results:
+                        csv_data, qc_test, source = known_results[scenario_number]
+                        main_logger.info(f'Scenario {scenario_number}: Results loaded from {source}')
+                    elif scenario_number in batch_results:
+                        csv_data, qc_test = batch_results[scenario_number]
+                    else:
+                        with metrics.span('scenario'):
+                            csv_data, qc_test = evaluate_scenario_total(backend, config, scenario_number, scenario_name, scenario_inputs_dict, main_logger, warning_logger, detail_logger,
+                                                                        metrics, warm_start)
+                    #journaled as soon as solved; only the rows wait for earlier scenarios of the chunk
+                    record_scenario_total(journal, result_cache, scenario_number, scenario_keys[scenario_number], csv_data, qc_test, source)
+                    finished[scenario_number] = (csv_data, qc_test)
+                    while next_scenario in finished:
+                        csv_data, qc_test = finished.pop(next_scenario)
+                        write_scenario_total(output_writer, failed_writer, csv_data, qc_test, next_scenario, config, main_logger, warning_logger, detail_logger, metrics)
+                        console_logger.info(f'{next_scenario}/{len(batch)} complete')
+                        next_scenario += 1
 
+        if incremental:
+            log_scenario_changes(len(batch), carried, previous_results, main_logger, console_logger)
+
+        if result_cache:
+            main_logger.info(result_cache.summary())
+            console_logger.info(result_cache.summary())
+        journal.record({'type': 'finished'})
             
     finally:
-        #close excel instance
-        if wb_rea: wb_rea.close()
-        if app: app.quit() 
-        main_logger.info(f'Closed excel instance')
+        #write any buffered rows and close output files
+        if output_writer: output_writer.close()
+        if failed_writer: failed_writer.close()
+        if journal: journal.close()
+        if result_cache: result_cache.close()
+        #close model backend (quits excel instance if used); a shared backend is closed by its owner
+        if backend and backend is not shared_backend:
+            backend.close()
+            main_logger.info(f'Closed model backend')
+        if profiler: run_metrics.stop_profile(profiler, script_run_results_directory, main_logger)
 
     #Measure elasped runtime of script
     END_TIME = time.perf_counter()
@@ -177,26 +255,765 @@ def run_rea_scenario_total(config_file: Path | str, debug = False):
     RUN_MINUTES = int(RUN_TIME // 60)
     RUN_SECONDS = round((RUN_TIME % 60), 1 )
 
+    metrics.write(script_run_results_directory, main_logger, script=SCRIPT_NAME, config_file=str(CONFIG_FILE), started=TIMESTAMP,
+                  run_seconds=RUN_TIME, scenarios=len(batch))
+    console_logger.info(f'Script finished. Total Runtime: {RUN_MINUTES} minutes and {RUN_SECONDS} seconds')
+    return script_run_results_directory
+
+def run_rea_monte_carlo(config_file: Path | str, profile = False, script_name: str | None = None) -> Path:
+    '''
+    Monte Carlo uncertainty of total outputs and required annual reintroduction (see models.rea.monte_carlo)
+    Draws of the distributions in the monte_carlo section of the config file are evaluated with the native engine in chunks;
+    writes a summary csv (mean, sd, standard error, quantiles per output), a json with quantile intervals and
+    convergence diagnostics, and (if write_draws is set) every draw with its sampled inputs and outputs
+    While native_model.experimental is true a warning is logged and both summaries are flagged experimental_model
+    script_name: name of results directory and output files (default: name of the running script); returns the results directory
+    '''
+    profiler = None
+    try:
+        # initial constants
+        CONFIG_FILE = config_file
+        CONFIG_PATH = CONFIG_DIR / CONFIG_FILE
+        TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
+        START_TIME = time.perf_counter()
+        metrics = run_metrics.RunMetrics()
+        with metrics.span('config_load'):
+            config = config_util.load_config(CONFIG_PATH)
+
+        SCRIPT_NAME = script_name or file_util.get_script_name()
+        script_run_results_directory = Path(RESULTS_DIR) / Path(f'{SCRIPT_NAME}_monte_carlo_{TIMESTAMP}')
+        main_logger, warning_logger, detail_logger, console_logger  = logger_setup.setup_loggers(script_run_results_directory, config['misc'].get('detail_logging', True))
+        profiler = run_metrics.start_profile(profile)
+
+        monte_carlo_config = config['monte_carlo']
+        quantiles = monte_carlo_config.get('quantiles', rea_monte_carlo.DEFAULT_QUANTILES)
+        tolerance = monte_carlo_config.get('tolerance', rea_monte_carlo.DEFAULT_TOLERANCE)
+        output_dir = script_run_results_directory / Path(config['directories']['output_folder'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        engine = config['misc'].get('model_engine', rea_backends.DEFAULT_ENGINE)
+        if engine != 'native':
+            warning_logger.warning(f'Monte Carlo draws are evaluated with the native engine, not the "{engine}" engine set by model_engine in config')
+        #summaries of the unverified native engine are flagged in the log, on the console and in the summary files
+        experimental = config['native_model'].get('experimental', True)
+        if experimental:
+            message = ('Monte Carlo draws use the EXPERIMENTAL native engine: native_model demographics are placeholders and results are not '
+                       'verified against the workbook; summaries are flagged experimental and must not be used for report results')
+            warning_logger.warning(message)
+            console_logger.warning(message)
+        monte_carlo = rea_monte_carlo.MonteCarlo.from_config(config)
+        main_logger.info(f'Monte Carlo: {monte_carlo.draws} draws (seed {monte_carlo.seed}, chunks of {monte_carlo.chunk_size}) '
+                         f'of {list(monte_carlo.distributions)}')
+        console_logger.info(f'Running {monte_carlo.draws} Monte Carlo draws')
+
+        draws_writer = None
+        if monte_carlo_config.get('write_draws', False):
+            draws_file = output_dir / f'{SCRIPT_NAME}_monte_carlo_draws.csv'
+            def draws_writer(columns):
+                with metrics.span('csv_write'):
+                    pd.DataFrame(columns).to_csv(draws_file, mode='a', header=not draws_file.exists(), index=False)
+
+        result = monte_carlo.run(draws_writer, metrics)
+        summary = result.summary(quantiles, tolerance)
+
+        #one row per output with the main statistics; full diagnostics in json
+        rows = []
+        for output, statistics in summary.items():
+            row = {'output': output, **{key: statistics.get(key) for key in ('draws', 'invalid_draws', 'mean', 'sd', 'standard_error', 'min', 'max')}}
+            row.update({f'q{quantile}': value['value'] for quantile, value in statistics.get('quantiles', {}).items()})
+            row['converged'] = statistics['converged']
+            row['experimental_model'] = experimental
+            rows.append(row)
+            if statistics['invalid_draws']:
+                warning_logger.warning(f'Monte Carlo: {statistics["invalid_draws"]} draws of {output} not finite (excluded from statistics)')
+            if not statistics['converged']:
+                warning_logger.warning(f'Monte Carlo: {output} not converged within tolerance {tolerance}; consider more draws')
+        pd.DataFrame(rows).to_csv(output_dir / f'{SCRIPT_NAME}_monte_carlo_summary.csv', index=False)
+        with open(output_dir / f'{SCRIPT_NAME}_monte_carlo_summary.json', 'w') as f:
+            json.dump({'config_file': str(CONFIG_FILE), 'experimental_model': experimental, 'seed': monte_carlo.seed, 'draws': monte_carlo.draws,
+                       'distributions': monte_carlo_config['distributions'], 'outputs': summary}, f, indent=2)
+        for row in rows:
+            detail_logger.info('%s', row)
+        main_logger.info(f'Monte Carlo summary written to {output_dir}')
+
+    finally:
+        if profiler: run_metrics.stop_profile(profiler, script_run_results_directory, main_logger)
+
+    END_TIME = time.perf_counter()
+    RUN_TIME = END_TIME - START_TIME
+    RUN_MINUTES = int(RUN_TIME // 60)
+    RUN_SECONDS = round((RUN_TIME % 60), 1 )
+
+    metrics.write(script_run_results_directory, main_logger, script=SCRIPT_NAME, config_file=str(CONFIG_FILE), started=TIMESTAMP,
+                  run_seconds=RUN_TIME, draws=monte_carlo.draws)
     console_logger.info(f'Script finished. Total Runtime: {RUN_MINUTES} minutes and {RUN_SECONDS} seconds')
+    return script_run_results_directory
+
+def watch_inputs(run_function, config_file: Path | str, poll_seconds: float = 2, **kwargs):
+    '''
+    Watch mode: runs run_function (run_rea_scenario_total or run_rea_scenario_yearly) incrementally, then again each time
+    the config file, input files in the copy source folder or figure configs change on disk (stop with Ctrl+C)
+    Each run logs to its own results directory; watch status and failed runs are also logged to a watch folder in the results directory
+    '''
+    config_path = CONFIG_DIR / config_file
+    watch_directory = Path(RESULTS_DIR) / 'watch' / f'watch_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+
+    def watched_files():
+        try:
+            config = config_util.load_config(config_path)
+        except Exception:
+            #config being edited or invalid: watch it alone until it loads again (the run logs the error)
+            return [config_path]
+        directories = config['directories']
+        paths = [config_path, *(Path(directories['copy_source']) / name for name in config['files'].values())]
+        if 'config_folder' in directories:
+            paths += sorted((PROJECT_BASE_DIR / directories['config_folder']).iterdir())
+        return paths
+
+    def modification_times():
+        return {path: path.stat().st_mtime_ns for path in watched_files() if path.exists()}
+
+    previous = None
+    while True:
+        current = modification_times()
+        if current != previous:
+            if previous is not None:
+                changed = sorted(path.name for path in set(current) | set(previous) if current.get(path) != previous.get(path))
+                _, _, _, console_logger = logger_setup.setup_loggers(watch_directory, False)
+                console_logger.info(f'Inputs changed ({", ".join(changed)}); rerunning changed scenarios')
+            error = None
+            try:
+                run_function(config_file, incremental=True, **kwargs)
+            except Exception as e:
+                #keep watching; fixing the inputs triggers another run
+                error = e
+                #warning log of the failed run (if it got as far as setting up its loggers)
+                logging.getLogger('warnings').error('Run failed', exc_info=e)
+            finally:
+                logger_setup.close_loggers()
+            _, warning_logger, _, console_logger = logger_setup.setup_loggers(watch_directory, False)
+            if error is not None:
+                warning_logger.error('Run failed', exc_info=error)
+                console_logger.info(f'Run failed: {error!r} (see {watch_directory / "logs"})')
+            #changes made while the run was in progress trigger another run
+            previous = current
+            console_logger.info(f'Watching {len(previous)} input files for changes (Ctrl+C to stop)')
+        time.sleep(poll_seconds)
+
+def resume_run_directory(resume: Path | str) -> Path:
+    '''Results directory of an interrupted run (path, or folder name in the results directory) containing a run journal'''
+    run_directory = Path(resume)
+    if not run_directory.exists():
+        run_directory = RESULTS_DIR / resume
+    if not (run_directory / JOURNAL_FILE).exists():
+        raise FileNotFoundError(f'No run journal ({JOURNAL_FILE}) found in {run_directory}; cannot resume run')
+    return run_directory.resolve()
+
+def open_run_journal(run_directory, script_name, config_file, timestamp, resume, main_logger, warning_logger) -> RunJournal:
+    '''Open the run journal of a new run (recording run details) or of a resumed run'''
+    journal = RunJournal(run_directory, main_logger)
+    journal.open()
+    if resume:
+        header = journal.header()
+        main_logger.info(f'Resuming run in {run_directory} (started {header and header["started"]})')
+        if header and header['config_file'] != str(config_file):
+            warning_logger.warning(f'Resumed run was started with config file {header["config_file"]}, now using {config_file}')
+        journal.record({'type': 'run', 'script': script_name, 'config_file': str(config_file), 'started': timestamp, 'resumed': True})
+    else:
+        journal.record({'type': 'run', 'script': script_name, 'config_file': str(config_file), 'started': timestamp})
+    return journal
+
+def previous_run_directory(script_name, current_directory) -> Path | None:
+    '''Most recent earlier results directory of this script that has a run journal'''
+    run_directories = sorted(RESULTS_DIR.glob(f'{script_name}_*'), reverse=True)
+    for run_directory in run_directories:
+        if run_directory.resolve() != Path(current_directory).resolve() and (run_directory / JOURNAL_FILE).exists():
+            return run_directory
+    return None
+
+def load_previous_results(script_name, current_directory, main_logger) -> tuple[dict, dict]:
+    '''
+    Finished scenarios of the last run of this script by scenario key ({key: journal entry})
+    and figure config hashes of its finished exhibits ({worksheet: hash})
+    '''
+    run_directory = previous_run_directory(script_name, current_directory)
+    if run_directory is None:
+        main_logger.info(f'Incremental run: no previous run of {script_name} found; all scenarios will be run')
+        return {}, {}
+    with RunJournal(run_directory, main_logger) as previous_journal:
+        entries = previous_journal.entries
+    main_logger.info(f'Incremental run: comparing scenarios against previous run {run_directory.name}')
+    scenarios = {entry['key']: entry for entry in entries if entry['type'] == 'scenario' and entry.get('key')}
+    exhibits = {entry['exhibit']: entry.get('config_hash') for entry in entries if entry['type'] == 'exhibit'}
+    return scenarios, exhibits
+
+def figure_config_hash(figure_config) -> str:
+    return hashlib.sha256(json.dumps(figure_config, sort_keys=True).encode()).hexdigest()
+
+def log_scenario_changes(scenario_count, carried, previous_results, main_logger, console_logger):
+    '''Log number of scenarios unchanged (carried: Counter of scenario keys found in previous results), added or changed and removed since the previous run'''
+    unchanged = sum(carried.values())
+    removed = len(previous_results) - len(carried)
+    message = f'{unchanged} scenarios unchanged since previous run (carried forward), {scenario_count - unchanged} added or changed, {removed} removed'
+    main_logger.info(message)
+    console_logger.info(message)
+
+def total_cache_settings(config):
+    '''Settings (besides model and scenario inputs) that change total results; part of the result cache key'''
+    return {
+        'run': 'total',
+        'input_cells': config['excel']['input_cells'],
+        'outputs': config['excel']['output_cells_excluded'],
+        'goal_seek': config['goal_seek'],
+        'decimals': config['misc']['result_decimal_precision'],
+    }
+
+def yearly_cache_settings(config, output_cells):
+    '''Settings (besides model and scenario inputs) that change yearly results for an exhibit; part of the result cache key'''
+    return {
+        'run': 'yearly',
+        'input_cells': config['excel']['input_cells'],
+        'outputs': output_cells,
+        'goal_seek': config['goal_seek'],
+        'decimals': config['misc']['result_decimal_precision'],
+    }
+
+def cached_scenario_total(result_cache, key, scenario_name):
+    '''Returns (csv data, qc result) stored in the result cache for key, or None if not cached'''
+    if result_cache is None:
+        return None
+    cached = result_cache.get(key)
+    if cached is None:
+        return None
+    #scenario names are not part of the key so rows with the same inputs share results
+    return {'Scenario_name': scenario_name, **cached['csv_data']}, cached['qc_test']
+
+def store_scenario_total(result_cache, key, csv_data, qc_test):
+    if result_cache is None:
+        return
+    csv_data = {header: value for header, value in csv_data.items() if header != 'Scenario_name'}
+    result_cache.put(key, {'csv_data': csv_data, 'qc_test': qc_test})
+
+def format_scenario_inputs(label, input_cells_config, scenario_inputs_dict) -> str:
+    '''Detail log lines of inputs set on the model'''
+    log_lines = [f'{label}: Excel inputs set:']
+    #read and return all inputs from config file and scenario inputs override
+    for key in input_cells_config.keys():
+        if key in scenario_inputs_dict:
+            clean_key = key.replace('_', ' ').title()
+            log_lines.append(f'  {clean_key} set to: {scenario_inputs_dict[key]}')
+    return '\n'.join(log_lines)
+
+def format_scenario_outputs(scenario_number, output_cells_config, csv_data) -> str:
+    '''Detail log lines of outputs written to the output csv'''
+    log_lines = [f'Scenario {scenario_number}: Excel outputs written to output file:']
+    #read and return all outputs from config file
+    for key in output_cells_config.keys():
+        if key in csv_data:
+            clean_key = key.replace('_', ' ').title()
+            log_lines.append(f'  {clean_key}: {csv_data[key]}')
+    #inclue outputs created in processing (not in config)
+    log_lines.append(f'  Annual Reintroduction Rounded: {csv_data["Annual Reintroduction Rounded"]}')
+    log_lines.append(f'  Annual Reintroduction Exact: {csv_data["Annual Reintroduction Exact"]}')
+    return '\n'.join(log_lines)
+
+def scenario_chunks(scenarios, chunk_size = SCENARIO_CHUNK_SIZE):
+    '''Yields lists of at most chunk_size (scenario number, scenario name, scenario inputs dict) of a ScenarioBatch or Sweep, numbered from 1 across chunks'''
+    offset = 0
+    for batch in scenarios.batches(chunk_size):
+        yield [(offset + scenario_number, scenario_name, scenario_inputs_dict) for scenario_number, scenario_name, scenario_inputs_dict in batch.records()]
+        offset += len(batch)
+
+def known_results_total(chunk, scenario_keys, journal_results, previous_results, result_cache) -> dict:
+    '''
+    Results of a chunk of scenarios that are not run: {scenario number: (csv data, qc result, source)}
+    Sources in order: run journal (finished before an interrupted run stopped), previous run (incremental runs) and result cache
+    '''
+    known_results = {}
+    for scenario_number, scenario_name, _ in chunk:
+        key = scenario_keys[scenario_number]
+        if scenario_number in journal_results:
+            entry = journal_results[scenario_number]
+            known_results[scenario_number] = (entry['csv_data'], entry['qc_test'], 'run journal')
+        elif key in previous_results:
+            entry = previous_results[key]
+            csv_data = {'Scenario_name': scenario_name, **{header: value for header, value in entry['csv_data'].items() if header != 'Scenario_name'}}
+            known_results[scenario_number] = (csv_data, entry['qc_test'], 'previous run')
+        else:
+            cached = cached_scenario_total(result_cache, key, scenario_name)
+            if cached:
+                known_results[scenario_number] = (*cached, 'result cache')
+    return known_results
+
+def similarity_ordered_records(records, known_results) -> list:
+    '''Records (one chunk of scenarios) in solve order: scenarios with known results first, then the others ordered by similarity of inputs'''
+    records_by_number = {record[0]: record for record in records}
+    known = [record for record in records if record[0] in known_results]
+    order = rea_solver.similarity_order([record for record in records if record[0] not in known_results], WARM_START_FIELDS)
+    return known + [records_by_number[scenario_number] for scenario_number in order]
+
+def log_warm_start(goal_seek_config, main_logger, warning_logger):
+    '''Logs whether goal seeks are warm started; a warm_start setting the goal seek method does not use is flagged'''
+    if rea_solver.warm_start_enabled(goal_seek_config):
+        main_logger.info(f'Goal seeks warm started from the most similar solved scenario')
+    elif goal_seek_config.get('warm_start', False):
+        method = goal_seek_config.get('method', rea_solver.DEFAULT_METHOD)
+        warning_logger.warning(f'warm_start in goal_seek config ignored: warm starts are only used by the iterative method (method is "{method}")')
+
+def solve_scenario(backend, goal_seek_config, label, scenario_number, scenario_inputs_dict, main_logger, warning_logger, metrics, warm_start = None):
+    '''Solve annual reintroduction of the scenario set on the backend (from the most similar solved scenario if warm_start is given)'''
+    initial_value = warm_start.nearest(scenario_inputs_dict) if warm_start is not None else None
+    with metrics.span('goal_seek'):
+        solution = rea_solver.solve_annual_reintroduction(backend, goal_seek_config, scenario_number, warning_logger, initial_value)
+    start = f', started from {initial_value}' if initial_value is not None else ''
+    main_logger.info(f'{label}: Required annual reintroduction calculated (for gain to equal loss) using {solution.method} solver ({solution.evaluations} evaluations{start})')
+    #Excel GoalSeek does not report evaluations
+    if solution.evaluations is not None:
+        metrics.count('goal_seek_evaluations', solution.evaluations)
+    if warm_start is not None:
+        warm_start.add(scenario_inputs_dict, solution.annual_reintroduction)
+    return solution
+
+def evaluate_scenario_total(backend, config, scenario_number, scenario_name, scenario_inputs_dict, main_logger, warning_logger, detail_logger, metrics = None, warm_start = None):
+    '''
+    Runs a single scenario on the model backend and returns total outputs
+    Returns dict of scenario inputs and outputs (one output csv row) and result of model QC tests
+    Stage timings and goal seek evaluations are recorded in metrics (util.run_metrics.RunMetrics) if given
+    warm_start: solutions of scenarios already solved (models.rea.solver.WarmStart); the goal seek starts from the most similar
+    '''
+    if isinstance(backend, model_pool.ModelPoolClient):
+        #whole scenario evaluated by an instance of the model pool daemon
+        return backend.evaluate('total', scenario_number, scenario_name, scenario_inputs_dict)
+    metrics = run_metrics.default_metrics(metrics)
+    excel_config = config['excel']
+    input_cells_config = excel_config['input_cells']
+    output_cells_config = excel_config['output_cells_excluded']
+    goal_seek_config = config['goal_seek']
+    decimal_precision_results = config['misc']['result_decimal_precision']
+
+    #Step #1: Set inputs
+    with metrics.span('input_set'):
+        backend.set_inputs(scenario_inputs_dict, scenario_number)
+    #detail logging of scenario inputs (message only built if detail logging is on)
+    detail_logger.info(logger_setup.LazyMessage(format_scenario_inputs, f'Scenario {scenario_number}', input_cells_config, scenario_inputs_dict))
+    
+    #Step #2: Solves for number of annual reintroductions required for gains to equal losses
+    # Goal Seek: set Goal:Loss ratio to 1 by changing Annual Mussel Reintroduction 
+    solution = solve_scenario(backend, goal_seek_config, f'Scenario {scenario_number}', scenario_number, scenario_inputs_dict, main_logger, warning_logger, metrics, warm_start)
+
+    #No such thing as partial mussel so round annual mussel reintroduction down to nearest whole number and set cell to value
+    annual_reintroduction_exact = math_util.round_outputs(solution.annual_reintroduction, decimal_precision_results)
+    detail_logger.info('Scenario %s: Exact annual reintroduction: %s', scenario_number, annual_reintroduction_exact)
+    annual_reintroduction_rounded = math_util.round_annual_reintro(annual_reintroduction_exact)
+    detail_logger.info('Scenario %s: Rounded Annual reintroduction: %s', scenario_number, annual_reintroduction_rounded)
+    total_gain_exact = math_util.round_outputs(backend.get_output('total_gains'), decimal_precision_results) 
+    backend.set_input('annual_reintroduction', annual_reintroduction_rounded)
 
-def run_rea_scenario_yearly(config_file: Path | str):
-    '''Runs REA based on scenario input file (excel) and returns yearly outputs (i.e. ranged cell outputs) '''
+    #calculate total mussel releases over the entire release period for calcualting per mussel statistics
+    total_releases_rounded = annual_reintroduction_rounded * backend.get_input('no_reintroduction_years')
+    total_releases_exact = math_util.round_outputs(annual_reintroduction_exact * backend.get_input('no_reintroduction_years'), decimal_precision_results)
+
+    #Step #3: Reads desired outputs
+    #force model to recalculate
+    with metrics.span('recalculate'):
+        backend.calculate()
+    main_logger.info(f'Scenario {scenario_number}: Model recalculated')
+
+    #read model outputs
+    with metrics.span('output_read'):
+        outputs = backend.read_outputs(output_cells_config, decimal_precision_results)
+    csv_data = {
+                'Scenario_name': scenario_name,
+                **scenario_inputs_dict,
+                **outputs,
+                'total_gains_exact': total_gain_exact,
+                'Annual Reintroduction Rounded': annual_reintroduction_rounded,
+                'Annual Reintroduction Exact': annual_reintroduction_exact,
+                'Total Reintroduction Rounded': total_releases_rounded,
+                'Total Reintroduction Exact': total_releases_exact
+                }
+
+    # Step #4: Result of REA QC tests
+    #Excel sheet has multiple qc tests whose results are summarized in a single cell as either 'PASS' or 'FAIL'
+    return csv_data, backend.qc_status()
+
+def batch_evaluation(backend, config) -> bool:
+    '''True if scenarios can be evaluated as vectorized batches: a backend with evaluate_batch (native engine) and closed form goal seek'''
+    return hasattr(backend, 'evaluate_batch') and config['goal_seek'].get('method', rea_solver.DEFAULT_METHOD) == 'closed_form'
+
+def solve_scenarios_batch(backend, config, scenarios, metrics):
+    '''
+    Closed form goal seek of several scenarios ([(scenario number, label, scenario inputs dict)]) as vectorized passes:
+    unit gains, gains at the solution and outputs at the rounded solution (see evaluate_scenario_total for the steps)
+    Returns dict with exact and rounded annual reintroduction (rounded as evaluate_scenario_total), batch results at the
+    solution ('solved') and at the rounded solution ('final'), and 'linear' (False where gains are not linear in annual
+    reintroduction, so the scenario has to be run on its own)
+    '''
+    goal_seek_config = config['goal_seek']
+    decimal_precision_results = config['misc']['result_decimal_precision']
+    target_value = goal_seek_config['target_value']
+    tolerance = goal_seek_config.get('linearity_tolerance', rea_solver.DEFAULT_LINEARITY_TOLERANCE)
+    table = pd.DataFrame([scenario_inputs_dict for _, _, scenario_inputs_dict in scenarios])
+
+    def evaluate(annual_reintroduction):
+        return backend.evaluate_batch(table.assign(annual_reintroduction=annual_reintroduction))
+
+    with metrics.span('goal_seek'):
+        unit = evaluate(1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            solutions = target_value * unit['total_loss'] / unit['total_gains']
+        solved = evaluate(np.where(np.isfinite(solutions), solutions, 1))
+    exact = [math_util.round_outputs(float(solution), decimal_precision_results) for solution in solutions]
+    rounded = [math_util.round_annual_reintro(value) if math.isfinite(value) else None for value in exact]
+    with metrics.span('recalculate'):
+        final = evaluate([value if value is not None else 1 for value in rounded])
+    linear = [
+        unit['total_gains'][index] != 0 and math.isfinite(solutions[index]) and math.isclose(solved['loss_ratio'][index], target_value, rel_tol=tolerance)
+        for index in range(len(scenarios))
+    ]
+    return {'exact': exact, 'rounded': rounded, 'solved': solved, 'final': final, 'linear': linear}
+
+def evaluate_scenarios_total_batch(backend, config, scenarios, main_logger, warning_logger, detail_logger, metrics = None) -> list:
+    '''
+    Runs several scenarios ([(scenario number, scenario name, scenario inputs dict)]) and returns [(csv data, QC result)]
+    in the layout of evaluate_scenario_total
+    With the native engine and closed form goal seek, the steps of evaluate_scenario_total run as vectorized passes over
+    all scenarios (see solve_scenarios_batch); scenarios whose gains are not linear in annual reintroduction, and other
+    engines or solvers, are run one at a time
+    '''
+    metrics = run_metrics.default_metrics(metrics)
+    if not batch_evaluation(backend, config) or not scenarios:
+        return [evaluate_scenario_total(backend, config, *scenario, main_logger, warning_logger, detail_logger, metrics) for scenario in scenarios]
+
+    output_cells_config = config['excel']['output_cells_excluded']
+    decimal_precision_results = config['misc']['result_decimal_precision']
+    batch = solve_scenarios_batch(backend, config, scenarios, metrics)
+    exact, rounded, solved, final = batch['exact'], batch['rounded'], batch['solved'], batch['final']
+
+    results = []
+    for index, (scenario_number, scenario_name, scenario_inputs_dict) in enumerate(scenarios):
+        if not batch['linear'][index]:
+            warning_logger.warning(f'Scenario {scenario_number}: Total gains not linear in annual reintroduction; running scenario on its own')
+            results.append(evaluate_scenario_total(backend, config, scenario_number, scenario_name, scenario_inputs_dict, main_logger, warning_logger, detail_logger, metrics))
+            continue
+        no_reintroduction_years = scenario_inputs_dict['no_reintroduction_years']
+        csv_data = {
+            'Scenario_name': scenario_name,
+            **scenario_inputs_dict,
+            **{key: round_cells(float(final[key][index]), decimal_precision_results) for key in output_cells_config},
+            'total_gains_exact': math_util.round_outputs(float(solved['total_gains'][index]), decimal_precision_results),
+            'Annual Reintroduction Rounded': rounded[index],
+            'Annual Reintroduction Exact': exact[index],
+            'Total Reintroduction Rounded': rounded[index] * no_reintroduction_years,
+            'Total Reintroduction Exact': math_util.round_outputs(exact[index] * no_reintroduction_years, decimal_precision_results),
+        }
+        results.append((csv_data, str(final['qc_test'][index])))
+    main_logger.info(f'Scenarios {scenarios[0][0]}-{scenarios[-1][0]}: {len(scenarios)} scenarios evaluated as one batch')
+    return results
+
+def evaluate_scenario_yearly(backend, config, label, scenario_number, scenario_inputs_dict, output_cells, main_logger, warning_logger, detail_logger, metrics = None, warm_start = None):
+    '''
+    Runs a single scenario on the model backend and returns yearly outputs
+    Returns dict of outputs read (output_cells) and exact and rounded annual reintroduction
+    Stage timings and goal seek evaluations are recorded in metrics (util.run_metrics.RunMetrics) if given
+    warm_start: solutions of scenarios already solved (models.rea.solver.WarmStart); the goal seek starts from the most similar
+    '''
+    if isinstance(backend, model_pool.ModelPoolClient):
+        #whole scenario evaluated by an instance of the model pool daemon
+        return backend.evaluate('yearly', label, scenario_number, scenario_inputs_dict, output_cells)
+    metrics = run_metrics.default_metrics(metrics)
+    input_cells_config = config['excel']['input_cells']
+    goal_seek_config = config['goal_seek']
+    decimal_precision_results = config['misc']['result_decimal_precision']
+
+    #Step #1: Set inputs
+    with metrics.span('input_set'):
+        backend.set_inputs(scenario_inputs_dict, scenario_number)
+    #detail logging of scenario inputs (message only built if detail logging is on)
+    detail_logger.info(logger_setup.LazyMessage(format_scenario_inputs, label, input_cells_config, scenario_inputs_dict))
+
+    #Step #2: Solves for number of annual reintroductions required for gains to equal losses
+    # Goal Seek: set Goal:Loss ratio to 1 by changing Annual Mussel Reintroduction 
+    solution = solve_scenario(backend, goal_seek_config, label, scenario_number, scenario_inputs_dict, main_logger, warning_logger, metrics, warm_start)
+
+    #No such thing as partial mussel so round annual mussel reintroduction down to nearest whole number and set cell to value
+    annual_reintroduction_exact = math_util.round_outputs(solution.annual_reintroduction, decimal_precision_results)
+    detail_logger.info('%s: Exact annual reintroduction: %s', label, annual_reintroduction_exact)
+    annual_reintroduction_rounded = math_util.round_annual_reintro(annual_reintroduction_exact)
+    detail_logger.info('%s: Rounded Annual reintroduction: %s', label, annual_reintroduction_rounded)
+    backend.set_input('annual_reintroduction', annual_reintroduction_rounded)
+
+    #Step #3: Reads desired outputs
+    #force model to recalculate
+    with metrics.span('recalculate'):
+        backend.calculate()
+    main_logger.info(f'{label}: Model recalculated')
+
+    with metrics.span('output_read'):
+        outputs = backend.read_outputs(output_cells, decimal_precision_results)
+    return {
+        'outputs': outputs,
+        'annual_reintroduction_exact': annual_reintroduction_exact,
+        'annual_reintroduction_rounded': annual_reintroduction_rounded,
+    }
+
+def evaluate_scenarios_yearly_batch(backend, config, scenarios, output_cells, main_logger, warning_logger, detail_logger, metrics = None) -> list:
+    '''
+    Runs several scenarios ([(label, scenario number, scenario inputs dict)]) and returns their yearly outputs in the layout of evaluate_scenario_yearly
+    Vectorized like evaluate_scenarios_total_batch (native engine and closed form goal seek); other scenarios are run one at a time
+    '''
+    metrics = run_metrics.default_metrics(metrics)
+    if not batch_evaluation(backend, config) or not scenarios:
+        return [evaluate_scenario_yearly(backend, config, label, scenario_number, scenario_inputs_dict, output_cells, main_logger, warning_logger, detail_logger, metrics)
+                for label, scenario_number, scenario_inputs_dict in scenarios]
+
+    decimal_precision_results = config['misc']['result_decimal_precision']
+    batch = solve_scenarios_batch(backend, config, [(scenario_number, label, scenario_inputs_dict) for label, scenario_number, scenario_inputs_dict in scenarios], metrics)
+
+    results = []
+    for index, (label, scenario_number, scenario_inputs_dict) in enumerate(scenarios):
+        if not batch['linear'][index]:
+            warning_logger.warning(f'{label}: Total gains not linear in annual reintroduction; running scenario on its own')
+            results.append(evaluate_scenario_yearly(backend, config, label, scenario_number, scenario_inputs_dict, output_cells, main_logger, warning_logger, detail_logger, metrics))
+            continue
+        with metrics.span('output_read'):
+            scenario_results = rea_engine.scenario_results(batch['final'], index)
+            outputs = {}
+            for key in output_cells:
+                value = scenario_results[key]
+                outputs[key] = round_cells(value.tolist() if hasattr(value, 'tolist') else value, decimal_precision_results)
+        results.append({
+            'outputs': outputs,
+            'annual_reintroduction_exact': batch['exact'][index],
+            'annual_reintroduction_rounded': batch['rounded'][index],
+        })
+    main_logger.info(f'{scenarios[0][0]} to {scenarios[-1][0]}: {len(scenarios)} input sets evaluated as one batch')
+    return results
+
+def record_scenario_total(journal, result_cache, scenario_number, result_key, csv_data, qc_test, source = None):
+    '''
+    Records a finished scenario in the run journal with its scenario key as soon as it is finished (before its row is written in scenario order),
+    so results finished out of order are not lost if the run stops; results evaluated by the model (source None) are also stored in the result cache
+    '''
+    if source is None:
+        store_scenario_total(result_cache, result_key, csv_data, qc_test)
+    #scenarios replayed from the journal are already recorded in it
+    if journal and source != 'run journal':
+        journal.record_scenario(scenario_number, key=result_key, csv_data=csv_data, qc_test=qc_test)
+
+def write_scenario_total(output_writer, failed_writer, csv_data, qc_test, scenario_number, config, main_logger, warning_logger, detail_logger, metrics = None):
+    '''
+    Writes inputs and outputs of a single scenario to the output csv and checks result of model QC tests
+    Scenario is recorded in the run journal beforehand (see record_scenario_total)
+    '''
+    metrics = run_metrics.default_metrics(metrics)
+    output_cells_config = config['excel']['output_cells_excluded']
+
+    with metrics.span('csv_write'):
+        output_writer.write_row(csv_data)
+    
+    #detail logging of scenario outputs (message only built if detail logging is on)
+    detail_logger.info(logger_setup.LazyMessage(format_scenario_outputs, scenario_number, output_cells_config, csv_data))
+
+    #Check QC result and write I/O to file if 'FAIL' for review
+    with metrics.span('qc'):
+        rea_backends.check_qc(qc_test, failed_writer, csv_data, scenario_number, main_logger, warning_logger)
+
+    main_logger.info(f'Scenario {scenario_number}: Scenario completed')
+
+#model backend, loggers and stage timings owned by each worker process (set by _init_worker)
+_worker = {}
+
+def _init_worker(config, rea_file, run_directory):
+    '''Process pool initializer: setup per-worker logs and open a model backend owned by this worker'''
+    worker_directory = Path(run_directory) / 'workers' / f'worker_{os.getpid()}'
+    main_logger, warning_logger, detail_logger, _ = logger_setup.setup_loggers(worker_directory, config['misc'].get('detail_logging', True))
+    #worker processes exit without running atexit hooks, so queued log records are written here
+    multiprocessing.util.Finalize(None, logger_setup.close_loggers, exitpriority=0)
+
+    #excel instances cannot share one open workbook file, so each worker gets its own copy
+    rea_file = Path(rea_file)
+    if config['misc'].get('model_engine', rea_backends.DEFAULT_ENGINE) == 'excel':
+        worker_rea_file = worker_directory / rea_file.name
+        shutil.copy(rea_file, worker_rea_file)
+        rea_file = worker_rea_file
+
+    metrics = run_metrics.RunMetrics()
+    backend = rea_backends.create_backend(config, rea_file, main_logger, warning_logger)
+    with metrics.span('model_open'):
+        backend.open()
+    #close backend (quits excel instance) when worker process exits
+    multiprocessing.util.Finalize(backend, backend.close, exitpriority=10)
+    _worker.update(backend=backend, config=config, loggers=(main_logger, warning_logger, detail_logger), metrics=metrics)
+
+def _run_shard(shard):
+    '''
+    Runs a shard of scenarios on this worker's backend
+    Returns list of (scenario number, csv data, qc result, error) so one failing scenario does not lose the others
+    and stage timings and counts of the worker since its last shard
+    '''
+    main_logger, warning_logger, detail_logger = _worker['loggers']
+    metrics = _worker['metrics']
+    #shards hold neighbouring scenarios when warm starts are used (see run_scenarios_total_parallel)
+    warm_start = rea_solver.WarmStart(WARM_START_FIELDS) if rea_solver.warm_start_enabled(_worker['config']['goal_seek']) else None
+    results = []
+    if batch_evaluation(_worker['backend'], _worker['config']):
+        #whole shard as one vectorized batch; if the batch fails its scenarios are run one at a time below
+        try:
+            with metrics.span('scenario_batch'):
+                batch_results = evaluate_scenarios_total_batch(_worker['backend'], _worker['config'], shard, main_logger, warning_logger, detail_logger, metrics)
+            results = [(scenario_number, csv_data, qc_test, None) for (scenario_number, _, _), (csv_data, qc_test) in zip(shard, batch_results)]
+            shard = []
+        except Exception as e:
+            warning_logger.error(f'Scenarios {shard[0][0]}-{shard[-1][0]}: Batch failed; running scenarios one at a time', exc_info=e)
+    for scenario_number, scenario_name, scenario_inputs_dict in shard:
+        try:
+            with metrics.span('scenario'):
+                csv_data, qc_test = evaluate_scenario_total(_worker['backend'], _worker['config'], scenario_number, scenario_name, scenario_inputs_dict,
+                                                            main_logger, warning_logger, detail_logger, metrics, warm_start)
+            results.append((scenario_number, csv_data, qc_test, None))
+        except Exception as e:
+            warning_logger.error(f'Scenario {scenario_number}: Failed', exc_info=e)
+            results.append((scenario_number, None, None, repr(e)))
+    durations, counts = metrics.durations, metrics.counts
+    metrics.durations, metrics.counts = {}, {}
+    return results, durations, counts
+
+def run_scenarios_total_parallel(chunks, scenario_count, config, rea_file, run_directory, output_writer, failed_writer, workers,
+                                 main_logger, warning_logger, detail_logger, console_logger, result_cache = None, journal = None, metrics = None):
+    '''
+    Shards chunks of scenarios across worker processes (misc.workers in config) and writes results in original scenario order
+    chunks: iterable of (records, {scenario number: scenario key}, {scenario number: (csv data, qc result, source)}) holding consecutive scenarios,
+    with results known from the run journal, previous run or result cache (those scenarios are not sent to workers)
+    Finished results are written as soon as all earlier scenarios are done; failed scenarios are logged and skipped
+    Stage timings of workers are added to metrics (util.run_metrics.RunMetrics) if given
+    '''
+    metrics = run_metrics.default_metrics(metrics)
+    next_scenario = 1
+    failed = []
+    #one pool of workers (each with an open model backend) runs every chunk
+    executor = None
+
+    def write_ready(pending):
+        '''Write results in scenario order as soon as they are available (results are journaled as they arrive)'''
+        nonlocal next_scenario
+        while next_scenario in pending:
+            scenario_number, csv_data, qc_test, error = pending.pop(next_scenario)
+            if error is None:
+                write_scenario_total(output_writer, failed_writer, csv_data, qc_test, scenario_number, config, main_logger, warning_logger, detail_logger, metrics)
+                console_logger.info(f'{scenario_number}/{scenario_count} complete')
+            else:
+                failed.append(scenario_number)
+                warning_logger.warning(f'Scenario {scenario_number}: Failed in worker process ({error})')
+                console_logger.info(f'{scenario_number}/{scenario_count} failed')
+            next_scenario += 1
+
+    try:
+        for records, scenario_keys, known_results in chunks:
+            pending = {}
+            rows = []
+            for scenario_number, scenario_name, scenario_inputs_dict in records:
+                if scenario_number in known_results:
+                    csv_data, qc_test, source = known_results[scenario_number]
+                    record_scenario_total(journal, result_cache, scenario_number, scenario_keys[scenario_number], csv_data, qc_test, source)
+                    pending[scenario_number] = (scenario_number, csv_data, qc_test, None)
+                else:
+                    rows.append((scenario_number, scenario_name, scenario_inputs_dict))
+            main_logger.info(f'Scenarios {records[0][0]}-{records[-1][0]}: {len(pending)} loaded from run journal, previous run or result cache')
+
+            if rea_solver.warm_start_enabled(config['goal_seek']):
+                #neighbouring scenarios go to the same shard so each worker's goal seeks start from similar solved scenarios
+                order = rea_solver.similarity_order(rows, WARM_START_FIELDS)
+                rows_by_number = {row[0]: row for row in rows}
+                rows = [rows_by_number[scenario_number] for scenario_number in order]
+            shard_size = config['misc'].get('worker_shard_size') or max(1, math.ceil(len(rows) / (workers * 4)))
+            shards = [rows[start:start + shard_size] for start in range(0, len(rows), shard_size)]
+            main_logger.info(f'Running {len(rows)} scenarios in {len(shards)} shards on {workers} worker processes')
+
+            write_ready(pending)
+            if not shards:
+                continue
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config, rea_file, run_directory))
+            futures = {executor.submit(_run_shard, shard): shard for shard in shards}
+            broken = False
+            for future in as_completed(futures):
+                try:
+                    results, durations, counts = future.result()
+                    metrics.merge(durations, counts)
+                except Exception as e:
+                    #worker process died; every scenario in its shard is reported as failed
+                    warning_logger.error(f'Worker failed while running scenarios {futures[future][0][0]}-{futures[future][-1][0]}', exc_info=e)
+                    results = [(scenario_number, None, None, repr(e)) for scenario_number, _, _ in futures[future]]
+                    if isinstance(e, BrokenProcessPool):
+                        #later chunks get a new pool
+                        broken = True
+                for result in results:
+                    scenario_number, csv_data, qc_test, error = result
+                    if error is None:
+                        record_scenario_total(journal, result_cache, scenario_number, scenario_keys[scenario_number], csv_data, qc_test)
+                    pending[scenario_number] = result
+                write_ready(pending)
+            if broken:
+                executor.shutdown()
+                executor = None
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if failed:
+        warning_logger.warning(f'{len(failed)} scenarios failed: {failed}')
+        console_logger.info(f'{len(failed)} scenarios failed (see warnings log)')
+
+def run_rea_scenario_yearly(config_file: Path | str, use_cache = True, resume: Path | str | None = None, incremental = False, profile = False,
+                            script_name: str | None = None, staged_inputs: Path | str | None = None, shared_backend = None) -> Path:
+    '''
+    Runs REA based on scenario input file (excel) and returns yearly outputs (i.e. ranged cell outputs)
+    Results of previously run scenarios are reused from the result cache unless use_cache is False
+    resume: results directory of an interrupted run to continue (finished exhibits and scenarios are not rerun)
+    incremental: only rerun scenarios added or changed (including by a changed figure config) since the last run of this script
+    profile: also write a cProfile dump of the run to the results directory
+    script_name: name of results directory and output files (default: name of the running script)
+    staged_inputs: folder holding input files already copied from copy_source (e.g. shared by jobs of a run plan)
+    shared_backend: open model backend to use instead of loading one (left open at the end of the run)
+    Stage timings are written to run_metrics.json in the results directory; returns the results directory
+    '''
     
-    wb_rea = None
-    app = None
+    backend = shared_backend
+    profiler = None
+    result_cache = None
+    journal = None
+    output_workbook = None
+    store_writer = None
+    input_writers = {}
     try:
         # initial constants
         CONFIG_FILE = config_file
         CONFIG_PATH = CONFIG_DIR / CONFIG_FILE
         TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
         START_TIME = time.perf_counter()
-        config = config_utl.load_config(CONFIG_PATH)
+        #timing of each run stage (see util.run_metrics)
+        metrics = run_metrics.RunMetrics()
+        with metrics.span('config_load'):
+            config = config_util.load_config(CONFIG_PATH)
 
         #get script name of root script to use to create directory to hold results for each run of script (e.g., scenarios.py returns 'Scenarios')
-        SCRIPT_NAME = file_util.get_script_name()
-        script_run_results_directory = Path(RESULTS_DIR) / Path(f'{SCRIPT_NAME}_{TIMESTAMP}')
+        SCRIPT_NAME = script_name or file_util.get_script_name()
+        if resume:
+            script_run_results_directory = resume_run_directory(resume)
+        else:
+            script_run_results_directory = Path(RESULTS_DIR) / Path(f'{SCRIPT_NAME}_{TIMESTAMP}')
         #setup logger
-        main_logger, warning_logger, detail_logger, console_logger  = logger_setup.setup_loggers(script_run_results_directory)
+        main_logger, warning_logger, detail_logger, console_logger  = logger_setup.setup_loggers(script_run_results_directory, config['misc'].get('detail_logging', True))
+        profiler = run_metrics.start_profile(profile)
+        #report results are not written with the unverified native engine
+        rea_backends.require_verified_engine(config)
+
+        #progress journal: each finished scenario and exhibit is recorded so an interrupted run can be resumed
+        journal = open_run_journal(script_run_results_directory, SCRIPT_NAME, CONFIG_FILE, TIMESTAMP, resume, main_logger, warning_logger)
+        if resume and journal.header():
+            #output files are named after the script that started the run
+            SCRIPT_NAME = journal.header()['script']
 
         #settings from config
         files = config['files']
@@ -210,10 +1027,12 @@ def run_rea_scenario_yearly(config_file: Path | str):
         sheets_config = excel_config['sheet_name']
 
         decimal_precision_results = misc_config['result_decimal_precision']
+        csv_flush_rows = misc_config.get('csv_flush_rows', 100)
+        csv_flush_seconds = misc_config.get('csv_flush_seconds', 5)
 
         rea_file = files['rea_file']
         scenario_file = files['input_file']
-        copy_dir = directories['copy_source']
+        copy_dir = staged_inputs or directories['copy_source']
         
         output_dir = RESULTS_DIR / Path(script_run_results_directory) / Path(directories['output_folder'])
         output_dir.mkdir(parents=True, exist_ok=True)
@@ -233,18 +1052,45 @@ def run_rea_scenario_yearly(config_file: Path | str):
         hash = repo.head.object.hexsha  
         main_logger.info(f'Code version used to generate output: {hash}')
 
-        #copy current REA version file 
-        file_util.copy_input_from_config(copy_dir, input_dir, files)
-        main_logger.info(f'Input files copied from current working version folder')
+        #copy current REA version file (resumed runs keep the inputs copied by the original run)
+        if not resume:
+            with metrics.span('file_copy'):
+                file_util.copy_input_from_config(copy_dir, input_dir, files)
+            main_logger.info(f'Input files copied from {"staged inputs of run plan" if staged_inputs else "current working version folder"}')
+        else:
+            #output workbook and scenario inputs csvs are rebuilt, replaying finished scenarios from the journal
+            output_file.unlink(missing_ok=True)
+            for output_input_file in output_input_dir.glob('*.csv'):
+                output_input_file.unlink()
 
-        #load REA model and I/O sheet
-        wb_rea, app = xl.load_workbook(rea_file)
-        main_logger.info(f'REA model workbook loaded ({rea_file})')
-        io_sheet = xl.load_worksheet(wb_rea, sheets_config['input_sheet'], warning_logger)
-        main_logger.info(f'REA input sheet loaded ({io_sheet})')
+        #output workbook is built in one pass (one worksheet per exhibit) and saved at the end of the run
+        output_workbook = StreamingWorkbookWriter(output_file, logger=main_logger)
+        #optional columnar result store (Arrow); the output workbook is then written as a view of the store
+        store_dir = output_dir / Path(f'{SCRIPT_NAME}_results')
+        store_writer = result_store.ResultStoreWriter.from_config(config, store_dir, main_logger, warning_logger)
+
+        #scenario keys (hash of model, scenario inputs and settings) identify unchanged scenarios across runs
+        model_fingerprint = rea_backends.model_fingerprint(config, rea_file)
+
+        #incremental run: scenarios unchanged since the last run are carried forward from its journal
+        previous_results, previous_exhibits = {}, {}
+        if incremental:
+            previous_results, previous_exhibits = load_previous_results(SCRIPT_NAME, script_run_results_directory, main_logger)
+
+        #results of unchanged scenarios (same model, inputs and settings) are read from the result cache instead of the model
+        result_cache = ResultCache.from_config(config, PROJECT_BASE_DIR, main_logger, use_cache)
+        if result_cache:
+            result_cache.open()
+        else:
+            main_logger.info(f'Result cache not used')
 
         
-        #for each config file in config folder, run specified scenarios
+        #Step #1: collect scenarios of every exhibit (figure config in config folder) before running any
+        #all worksheets of the scenario input file are read in one pass and merged with config defaults once per exhibit
+        scenario_tables = rea_input_class.read_scenario_tables(scenario_file)
+        main_logger.info(f'Loaded {len(scenario_tables)} worksheets from "{scenario_file.stem}" workbook')
+        default_values = excel_config['input_values_default']
+        exhibits = []
         for file in config_folder.iterdir():
             figure_config = config_util.load_config(file)
             figure_worksheet = figure_config['worksheet_name']
@@ -253,132 +1099,181 @@ def run_rea_scenario_yearly(config_file: Path | str):
             main_logger.info(f'Exhibit "{file.stem}": Desired outputs: \n'
                              f'{desired_yearly_outputs}')
 
-            #update output_cells_config based on desired yearly outputs values for this sheet
-            #must reinitiate both variables for each figure
-            output_cells_config = excel_config['output_cells_excluded_yearly'].copy()
-            keys_to_delete = [key for key in output_cells_config if key not in desired_yearly_outputs]
-            detail_logger.info(f'Exhibit "{file.stem}": keys to delete \n'
-                               f'{keys_to_delete}')
-            for key in keys_to_delete:
-                del output_cells_config[key]
+            #output cells for this exhibit, in config order
+            output_cells_config = {key: cell for key, cell in excel_config['output_cells_excluded_yearly'].items() if key in desired_yearly_outputs}
             detail_logger.info(f'Exhibit "{file.stem}": Outputs to read:\n'
                                f'   {output_cells_config.keys()}\n'
                                f'   {output_cells_config.values()}')
-                        
-            #create empty outputs for each figure
-            figure_outputs = {}
-            # #will also nned to reinitiate the output cells config inside of loop?           
 
-            #load scenario input file for figure
-            try:
-                scenarios = pd.read_excel(scenario_file, figure_worksheet)
-                main_logger.info(f'Exhibit "{file.stem}": Loaded {len(scenarios)} scenarios from "{scenario_file.stem}" workbook and "{figure_worksheet}" worksheet into dataframe')
-            except ValueError as e:
+            #scenarios for figure: sweep declared in figure config or scenario table in worksheet of scenario input file
+            if 'sweep' in figure_config:
+                scenarios = rea_sweeps.Sweep.from_config(figure_config['sweep'], default_values)
+                main_logger.info(f'Exhibit "{file.stem}": Generating {len(scenarios)} scenarios from sweep in figure config')
+            elif figure_worksheet not in scenario_tables:
                 warning_logger.warning(f'Exhibit "{file.stem}": Worksheet {figure_worksheet} not found')
                 continue
-            
-            # for loop runs through different scenarios and:
-            # 1) Sets inputs
-            # 2) Solves for number of annual reintroductions required for gains to equal losses
-            # 3) Reads desired outputs and writes both inputs and outputs to an output csv for later processing
-            # 4) QC check of REA QC tests
-            for scenario_number, row in enumerate(scenarios.itertuples(index=False), start =1): 
-                scenario_name = scenarios.loc[(scenario_number-1),'scenario_name']
-
-                #Step #1: Set inputs
-                # Create scenario inputs class with defaults values
-                scenario_inputs = rea_input_class.REAScenarioInputs.create_from_config(CONFIG_PATH, debug=True)
-                # and override with input values from the scenarios input dataframe for each scenario
-                scenario_inputs.update_from_row(row)
-                # print(f'scenario inputs updated: {scenario_inputs}')
-                #must convert to dict for easier reading into later functions
-                scenario_inputs_dict = scenario_inputs.to_dict()
-                main_logger.info(f'Exhibit "{file.stem}", scenario {scenario_number} ({scenario_name}): Inputs loaded')
-
-                xl.set_excel_inputs(io_sheet, scenario_inputs_dict, input_cells_config, scenario_number, main_logger)
-                #detail logging of scenario inputs
-                log_lines = [f'Exhibit "{file.stem}", scenario {scenario_number} ({scenario_name}): Excel inputs set:']
-                #read and return all inputs from config file and scenario inputs override
-                for key in input_cells_config.keys():
-                    if key in scenario_inputs_dict:
-                        clean_key = key.replace('_', ' ').title()
-                        log_lines.append(f'  {clean_key} set to: {scenario_inputs_dict[key]}')
-                detail_logger.info('\n'.join(log_lines))
-                
-                #Step #2: Solves for number of annual reintroductions required for gains to equal losses
-                # Goal Seek: set Goal:Loss ratio to 1 by changing Annual Mussel Reintroduction 
-                xl.run_goal_seek(io_sheet, input_cells_config['loss_ratio'], input_cells_config['annual_reintroduction'], goal_seek_config['target_value'])
-                main_logger.info(f'Exhibit "{file.stem}", scenario {scenario_number} ({scenario_name}): Required annual reintroduction calculated (for gain to equal loss)')
-
-                #No such thing as partial mussel so round annual mussel reintroduction down to nearest whole number and set cell to value
-                annual_reintroduction_exact = math_util.round_outputs(io_sheet[input_cells_config['annual_reintroduction']].value, decimal_precision_results)
-                detail_logger.info(f'Exhibit "{file.stem}", scenario {scenario_number} ({scenario_name}): Exact annual reintroduction: {annual_reintroduction_exact}')
-                annual_reintroduction_rounded = math_util.round_annual_reintro(annual_reintroduction_exact)
-                detail_logger.info(f'Exhibit "{file.stem}", scenario {scenario_number} ({scenario_name}): Rounded Annual reintroduction: {annual_reintroduction_rounded}')
-                io_sheet[input_cells_config['annual_reintroduction']].value =annual_reintroduction_rounded
-
-                #Step #3: Reads desired outputs and writes both inputs and outputs to an output csv for later processing
-                #force excel to recalculate
-                wb_rea.app.calculate()
-                main_logger.info(f'Exhibit "{file.stem}", scenario {scenario_number} ({scenario_name}): Excel workbook recalculated')
-
-                #read model outputs and append to csv file
-                outputs = xl.read_excel_outputs(io_sheet, output_cells_config, decimal_precision_results, scenarios, scenario_number, main_logger)
-                detail_logger.info(f'Exhibit "{file.stem}", scenario {scenario_number} ({scenario_name}): Read outputs directly from excel: {outputs.keys()}')
-
-                #append annual reintroduction results
-                outputs[f'{scenario_name}: Annual Reintroduction Rounded'] = annual_reintroduction_rounded
-                outputs[f'{scenario_name}: Annual Reintroduction Exact'] = annual_reintroduction_exact
-               
-                #append resutls of each scenario to figure_outputs (for exporting) 
-                figure_outputs = data_util.append_to_dictionary(figure_outputs, outputs)
-                
-
-                output_input_file = output_input_dir / Path(f'{figure_worksheet}.csv')
-
-                csv_data = {'Scenario_number': scenario_number, **scenario_inputs_dict}
-                if not output_input_file.exists():
-                    csv_util.create_output_csv(output_input_file, csv_data)
-                csv_util.append_output_to_csv(output_input_file, list(csv_data.values()))
-
-                console_logger.info(f'{scenario_name} complete')
-            
-            #export final figure results to excel file
-            output_data = {**figure_outputs}
-            xl.append_output_excel_file(output_file, output_data, figure_worksheet, console_logger, warning_logger)
+            else:
+                scenarios = rea_input_class.ScenarioBatch.from_table(scenario_tables[figure_worksheet], default_values)
+                main_logger.info(f'Exhibit "{file.stem}": Loaded {len(scenarios)} scenarios from "{scenario_file.stem}" workbook and "{figure_worksheet}" worksheet')
+
+            config_hash = figure_config_hash(figure_config)
+            if incremental and previous_exhibits.get(figure_worksheet) != config_hash:
+                main_logger.info(f'Exhibit "{file.stem}": New or figure config changed since previous run')
+            exhibits.append({
+                'name': file.stem,
+                'worksheet': figure_worksheet,
+                'config_hash': config_hash,
+                'output_cells': output_cells_config,
+                'scenarios': scenarios,
+            })
 
-            xl.text_wrap_headers(output_file)
+        #Step #2: run each exhibit chunk by chunk, evaluating each distinct set of scenario inputs once and reading the union of outputs requested by any exhibit
+        union_output_cells = {
+            key: cell for key, cell in excel_config['output_cells_excluded_yearly'].items()
+            if any(key in exhibit['output_cells'] for exhibit in exhibits)
+        }
+        settings = yearly_cache_settings(config, union_output_cells)
+        chunk_size = misc_config.get('scenario_chunk_size', SCENARIO_CHUNK_SIZE)
+        exhibit_scenarios = sum(len(exhibit['scenarios']) for exhibit in exhibits)
 
+        #results finished before an interrupted run stopped (journal), unchanged since the previous run or in the result cache are not recomputed
+        journal_results = journal.results()
+        #results of input sets evaluated or loaded in this run, reused by later scenarios and exhibits with the same inputs
+        results = {}
+        sources = {'run journal': 0, 'previous run': 0, 'result cache': 0, 'model': 0}
+        log_warm_start(goal_seek_config, main_logger, warning_logger)
+        warm_start = None
+        if rea_solver.warm_start_enabled(goal_seek_config):
+            #input sets of each chunk are solved in order of similarity, each goal seek starting from the nearest solved input set
+            warm_start = rea_solver.WarmStart(WARM_START_FIELDS)
+
+        def finish(result_key, scenario_number, figure_worksheet, result, source):
+            '''Record the result of an input set (journal, result cache if evaluated by the model) for reuse by later scenarios'''
+            if source == 'model' and result_cache:
+                result_cache.put(result_key, result)
+            #scenarios replayed from the journal are already recorded in it
+            if source != 'run journal':
+                journal.record_scenario(scenario_number, figure_worksheet, key=result_key, result=result)
+            results[result_key] = result
+            sources[source] += 1
+            console_logger.info(f'{len(results)} distinct input sets complete')
+
+        for exhibit in exhibits:
+            figure_worksheet = exhibit['worksheet']
+            figure_outputs = {}
+            for chunk in scenario_chunks(exhibit['scenarios'], chunk_size):
+                result_keys = [scenario_key(model_fingerprint, scenario_inputs_dict, settings) for _, _, scenario_inputs_dict in chunk]
+                distinct = {}
+                for (scenario_number, scenario_name, scenario_inputs_dict), result_key in zip(chunk, result_keys):
+                    if result_key not in results:
+                        distinct.setdefault(result_key, (f'Exhibit "{exhibit["name"]}", scenario {scenario_number} ({scenario_name})', scenario_number, scenario_inputs_dict))
+                evaluations = list(distinct.items())
+                if warm_start is not None:
+                    order = rea_solver.similarity_order([(number, None, entry[2]) for number, (_, entry) in enumerate(evaluations)], WARM_START_FIELDS)
+                    evaluations = [evaluations[number] for number in order]
+
+                unknown = []
+                for result_key, (label, scenario_number, scenario_inputs_dict) in evaluations:
+                    result, source = None, None
+                    if result_key in journal_results:
+                        result, source = journal_results[result_key]['result'], 'run journal'
+                    elif result_key in previous_results:
+                        result, source = previous_results[result_key]['result'], 'previous run'
+                    elif result_cache:
+                        result, source = result_cache.get(result_key), 'result cache'
+
+                    if result:
+                        main_logger.info(f'{label}: Results loaded from {source}')
+                        finish(result_key, scenario_number, figure_worksheet, result, source)
+                    else:
+                        unknown.append((result_key, (label, scenario_number, scenario_inputs_dict)))
+
+                #load REA model backend (Excel workbook or native engine, as specified in config) when first needed
+                if unknown and backend is None:
+                    backend = rea_backends.create_backend(config, rea_file, main_logger, warning_logger)
+                    with metrics.span('model_open'):
+                        backend.open()
+                if unknown and batch_evaluation(backend, config):
+                    #native engine with closed form goal seek: input sets of the chunk not known yet are evaluated as one vectorized batch
+                    with metrics.span('scenario_batch'):
+                        batch_results = evaluate_scenarios_yearly_batch(backend, config, [evaluation for _, evaluation in unknown], union_output_cells,
+                                                                        main_logger, warning_logger, detail_logger, metrics)
+                    for (result_key, (_, scenario_number, _)), result in zip(unknown, batch_results):
+                        finish(result_key, scenario_number, figure_worksheet, result, 'model')
+                else:
+                    for result_key, (label, scenario_number, scenario_inputs_dict) in unknown:
+                        with metrics.span('scenario'):
+                            result = evaluate_scenario_yearly(backend, config, label, scenario_number, scenario_inputs_dict, union_output_cells, main_logger, warning_logger, detail_logger,
+                                                              metrics, warm_start)
+                        finish(result_key, scenario_number, figure_worksheet, result, 'model')
+
+                #Step #3: fan results out to the exhibit's worksheet and scenario inputs csv
+                for (scenario_number, scenario_name, scenario_inputs_dict), result_key in zip(chunk, result_keys):
+                    result = results[result_key]
+                    #prefix headers with scenario name; empty column between yearly scenarios for readability
+                    outputs = {scenario_name: '', **{f'{scenario_name}:{key}': result['outputs'][key] for key in exhibit['output_cells']}}
+                    #append annual reintroduction results
+                    outputs[f'{scenario_name}: Annual Reintroduction Rounded'] = result['annual_reintroduction_rounded']
+                    outputs[f'{scenario_name}: Annual Reintroduction Exact'] = result['annual_reintroduction_exact']
+                    detail_logger.info('Exhibit "%s", scenario %s (%s): Outputs: %s', exhibit['name'], scenario_number, scenario_name, outputs.keys())
+
+                    #append resutls of each scenario to figure_outputs (for exporting) 
+                    if store_writer:
+                        store_writer.add_scenario(figure_worksheet, scenario_number, scenario_name, scenario_inputs_dict,
+                                                  {key: result[key] for key in ('annual_reintroduction_exact', 'annual_reintroduction_rounded')},
+                                                  {key: result['outputs'][key] for key in exhibit['output_cells']})
+                    else:
+                        figure_outputs = data_util.append_to_dictionary(figure_outputs, outputs)
+
+                    #one buffered writer per exhibit scenario inputs csv
+                    if figure_worksheet not in input_writers:
+                        output_input_file = output_input_dir / Path(f'{figure_worksheet}.csv')
+                        input_writers[figure_worksheet] = CSVResultWriter(output_input_file, csv_flush_rows, csv_flush_seconds, main_logger)
+                    with metrics.span('csv_write'):
+                        input_writers[figure_worksheet].write_row({'Scenario_number': scenario_number, **scenario_inputs_dict})
+
+            #export final figure results to output workbook (headers text wrapped as written)
+            if not store_writer:
+                with metrics.span('workbook_write'):
+                    output_workbook.write_sheet(figure_worksheet, figure_outputs)
+
+            if figure_worksheet in input_writers:
+                input_writers[figure_worksheet].close()
+            journal.record_exhibit(figure_worksheet, config_hash=exhibit['config_hash'])
             console_logger.info(f'{figure_worksheet} complete')
-            
-            
 
+        message = (f'{exhibit_scenarios} scenarios in {len(exhibits)} exhibits share {len(results)} distinct input sets '
+                   f'({exhibit_scenarios - len(results)} evaluations reused across exhibits)')
+        main_logger.info(message)
+        console_logger.info(message)
+        main_logger.info('Distinct input sets: ' + ', '.join(f'{count} from {source}' for source, count in sources.items()))
+
+        if store_writer:
+            store_writer.close()
+            store = result_store.ResultStore(store_dir)
+            for exhibit in store.exhibits():
+                with metrics.span('workbook_write'):
+                    output_workbook.write_sheet(exhibit, store.wide_outputs(exhibit))
+            main_logger.info(f'Output workbook generated from result store')
             
-            # #detail logging of scenario outputs
-            # log_lines = [f'Scenario {scenario_number}: Excel outputs written to output file:']
-            # #read and return all outputs from config file
-            # for key in output_cells_config.keys():
-            #     if key in csv_data:
-            #         clean_key = key.replace('_', ' ').title()
-            #         log_lines.append(f'  {clean_key}: {csv_data[key]}')
-            # #inclue outputs created in processing (not in config)
-            # log_lines.append(f'  Annual Reintroduction Rounded: {annual_reintroduction_rounded}')
-            # log_lines.append(f'  Annual Reintroduction Exact: {annual_reintroduction_exact}')
-            # detail_logger.info('\n'.join(log_lines))
-
-            # # Step #4: QC check of REA QC tests
-            # #Excel sheet has multiple qc tests whose results are summarized in a single cell as either 'PASS' or 'FAIL'
-            # #Check this cell and write I/O to file if 'FAIL' for review
-            # xl.check_qc(io_sheet, input_cells_config['qc_test'], output_dir, csv_data, scenario_number, main_logger, warning_logger)
-        
-            # main_logger.info(f'Scenario {scenario_number}: Scenario completed')
-            # console_logger.info(f'{scenario_number}/{len(scenarios)} complete')
-            
+        if result_cache:
+            main_logger.info(result_cache.summary())
+            console_logger.info(result_cache.summary())
+        journal.record({'type': 'finished'})
+
     finally:
-        #close excel instance
-        if wb_rea: wb_rea.close()
-        if app: app.quit() 
-        main_logger.info(f'Closed excel instance')
+        #save output workbook with the exhibits finished so far; write any buffered rows and close scenario input files
+        if output_workbook: output_workbook.close()
+        if store_writer: store_writer.close()
+        for writer in input_writers.values():
+            writer.close()
+        if result_cache: result_cache.close()
+        if journal: journal.close()
+        #close model backend (quits excel instance if used); a shared backend is closed by its owner
+        if backend and backend is not shared_backend:
+            backend.close()
+            main_logger.info(f'Closed model backend')
+        if profiler: run_metrics.stop_profile(profiler, script_run_results_directory, main_logger)
 
     #Measure elasped runtime of script
     END_TIME = time.perf_counter()
@@ -386,4 +1281,7 @@ def run_rea_scenario_yearly(config_file: Path | str):
     RUN_MINUTES = int(RUN_TIME // 60)
     RUN_SECONDS = round((RUN_TIME % 60), 1 )
 
-    console_logger.info(f'Script finished. Total Runtime: {RUN_MINUTES} minutes and {RUN_SECONDS} seconds')
\ No newline at end of file
+    metrics.write(script_run_results_directory, main_logger, script=SCRIPT_NAME, config_file=str(CONFIG_FILE), started=TIMESTAMP,
+                  run_seconds=RUN_TIME, scenarios=exhibit_scenarios)
+    console_logger.info(f'Script finished. Total Runtime: {RUN_MINUTES} minutes and {RUN_SECONDS} seconds')
+    return script_run_results_directory
\ No newline at end of file
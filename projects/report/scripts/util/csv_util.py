@@ -1,5 +1,6 @@
 '''Define functions for manipulating csv files'''
 import csv
+import time
 import logging
 from pathlib import Path
 
@@ -24,4 +25,64 @@ def append_output_to_csv(path, row_data):
     with open(path, 'a', newline='') as file:
         writer = csv.writer(file)
         writer.writerow(list(row_data))
-        
\ No newline at end of file
+        
+class CSVResultWriter:
+    '''
+    Keeps an output csv open for the whole run and writes rows in batches
+    Header is written once (from the keys of the first row) unless the file already has content
+    Buffered rows are written every flush_rows rows or flush_seconds seconds, and on close
+    File is only created when the first row is written
+    '''
+
+    def __init__(self, path: Path | str, flush_rows: int = 100, flush_seconds: float = 5.0, logger: logging.Logger | None = None):
+        self.path = Path(path)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.file = None
+        self.writer = None
+        self.buffer = []
+        self.rows_written = 0
+        self.last_flush = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self, headers):
+        write_header = not self.path.exists() or self.path.stat().st_size == 0
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(headers)
+            self.file.flush()
+            self.logger.info(f'Ouput file created ({self.path.name})')
+
+    def write_row(self, row_data: dict):
+        '''Buffer one row (dict of header: value)'''
+        if self.file is None:
+            self._open(list(row_data.keys()))
+        self.buffer.append(list(row_data.values()))
+        if len(self.buffer) >= self.flush_rows or time.perf_counter() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        '''Write buffered rows and flush file to disk'''
+        if self.file is None:
+            return
+        self.writer.writerows(self.buffer)
+        self.file.flush()
+        self.rows_written += len(self.buffer)
+        self.buffer.clear()
+        self.last_flush = time.perf_counter()
+
+    def close(self):
+        if self.file is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.file.close()
+            self.file = None
@@ -1,9 +1,16 @@
-'''Define functions for manipulating excel files using xlwings'''
+'''Define functions for manipulating excel files using xlwings (openpyxl for writing output workbooks)'''
 import xlwings as xw
+from dataclasses import dataclass, field
 from pathlib import Path
 import logging
 import chincheron_util.csv_util as csv_util
+import numpy as np
 import pandas as pd
+from itertools import zip_longest
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+from openpyxl.utils.cell import get_column_letter, range_boundaries
 
 def load_workbook(workbook: Path |str, visible: bool = False) -> tuple[xw.Book, xw.App]:
     '''Loads Excel file using xlwing in background (headless) mode'''
@@ -66,6 +73,96 @@ def round_cells(value, decimals):
     else:
         return value
 
+@dataclass
+class CellBlock:
+    '''Contiguous rectangular range of cells and the config keys (with their own bounds) it covers'''
+    min_col: int
+    min_row: int
+    max_col: int
+    max_row: int
+    members: list = field(default_factory=list)
+
+    @property
+    def address(self):
+        return f'{get_column_letter(self.min_col)}{self.min_row}:{get_column_letter(self.max_col)}{self.max_row}'
+
+def plan_cell_blocks(cells):
+    '''
+    Group config cell addresses (dict of key: "C7" or "H8:H186") into as few contiguous rectangular blocks as possible
+    Cells/ranges are first joined down columns (e.g., C7, C8, C9 -> C7:C9) and then across adjacent columns
+    covering the same rows (e.g., H8:H186 ... R8:R186 -> H8:R186)
+    Plan once per run and reuse with read_blocks/write_blocks for every scenario
+    '''
+    bounds = sorted(((range_boundaries(address.replace('$', '')), key) for key, address in cells.items()), key=lambda item: (item[0][0], item[0][2], item[0][1]))
+
+    #join vertically (same columns, consecutive rows)
+    columns = []
+    for (min_col, min_row, max_col, max_row), key in bounds:
+        last = columns[-1] if columns else None
+        if last and (last.min_col, last.max_col) == (min_col, max_col) and last.max_row + 1 == min_row:
+            last.max_row = max_row
+        else:
+            last = CellBlock(min_col, min_row, max_col, max_row)
+            columns.append(last)
+        last.members.append((key, (min_col, min_row, max_col, max_row)))
+
+    #join horizontally (same rows, adjacent columns)
+    blocks = []
+    for block in sorted(columns, key=lambda block: (block.min_row, block.max_row, block.min_col)):
+        last = blocks[-1] if blocks else None
+        if last and (last.min_row, last.max_row) == (block.min_row, block.max_row) and last.max_col + 1 == block.min_col:
+            last.max_col = block.max_col
+            last.members.extend(block.members)
+        else:
+            blocks.append(block)
+    return blocks
+
+def round_array(values, decimals):
+    '''
+    Round 2D block of cell values with NumPy when every cell is a number
+    Falls back to round_cells if the block contains text, booleans or empty cells
+    '''
+    values = np.asarray(values, dtype=object)
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values.flat):
+        return np.round(values.astype(float), decimals)
+    return np.array(round_cells(values.tolist(), decimals), dtype=object).reshape(values.shape)
+
+def _shape_like_range(values, bounds):
+    '''Match xlwings default shapes: scalar for single cell, list for a single row/column, list of lists otherwise'''
+    min_col, min_row, max_col, max_row = bounds
+    if min_col == max_col and min_row == max_row:
+        value = values[0, 0]
+        return value.item() if isinstance(value, np.generic) else value
+    if min_col == max_col:
+        return values[:, 0].tolist()
+    if min_row == max_row:
+        return values[0, :].tolist()
+    return values.tolist()
+
+def read_blocks(sheet, blocks, decimals = None):
+    '''Read every planned block with one range call each and split the values back into config keys'''
+    outputs = {}
+    for block in blocks:
+        values = np.array(sheet.range(block.address).options(ndim=2).value, dtype=object)
+        if decimals is not None:
+            values = round_array(values, decimals)
+        for key, (min_col, min_row, max_col, max_row) in block.members:
+            part = values[min_row - block.min_row:max_row - block.min_row + 1, min_col - block.min_col:max_col - block.min_col + 1]
+            outputs[key] = _shape_like_range(part, (min_col, min_row, max_col, max_row))
+    return outputs
+
+def write_blocks(sheet, blocks, input_values):
+    '''Write input values (dict of key: value) with one range call per planned block'''
+    for block in blocks:
+        rows = [[None] * (block.max_col - block.min_col + 1) for _ in range(block.max_row - block.min_row + 1)]
+        for key, (min_col, min_row, max_col, max_row) in block.members:
+            value = input_values[key]
+            value = value.item() if isinstance(value, np.generic) else value
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    rows[row - block.min_row][col - block.min_col] = value
+        sheet.range(block.address).value = rows
+
 def read_excel_outputs(sheet, output_cells, decimals, scenarios = None, scenario_number = None,  logger = None):
     '''Read desired output cells from excel workbook
     Can optionally pass the current scenario row to append scenario name to headers (for yearly outputs primarily)
@@ -148,77 +245,56 @@ def create_output_excel_file(path: Path | str, headers: list | dict, sheet_name
         #     logger.info(f'Ouput file created')
     finally:
         if wb: wb.close()
-        
-def append_output_excel_file(path: Path | str, output_dic: dict, sheet_name = None, main_logger: logging.Logger | None = None, warning_logger: logging.Logger | None = None):
-    '''Append outputs to excel file and populate with specified headers'''
-    
-    #setup loggers
-    if main_logger is None:
-        main_logger = logging.getLogger(__name__)
-    if warning_logger is None:
-        warning_logger = logging.getLogger(__name__)
-
-    path = Path(path)
-
-    if not path.exists():
-        main_logger.info(f'{path} does not exist. Creating...')
-        create_output_excel_file(path, output_dic, sheet_name, main_logger, warning_logger)
-    
-    
-    try:
-            
-        if isinstance(output_dic, dict):
-            headers = list(output_dic.keys()) 
-            
-        path = Path(path) 
 
-        wb = xw.Book(path)
-
-
-        #create worksheet
-        new_sheet = wb.sheets.add(name= sheet_name) 
-        main_logger.info(f'Worksheet {sheet_name} created')
-
-        #write headers ()
-        new_sheet.range('A1').value = headers
-        
-        #tracking columns for loop below
-        col_num = 1
-        row_num = 2
-
-        #write data
-        for key in output_dic:
-            col_output = output_dic[key]
-            start_cell = new_sheet.cells(row_num, col_num)
-            start_cell.options(transpose=True).value = col_output
-            col_num += 1
-            # new_sheet.range('A2').options(transpose=True).value = col_output
-            # new_sheet.range('a2').options(transpose=True).value = (output_dic.values())
-
-        wb.save(path)
-        # with open(path, 'w', newline='') as file:
-        #     writer = csv.writer(file)
-        #     writer.writerow(headers)
-        #     logger.info(f'Ouput file created')
-    finally:
-        if wb: wb.close()
-    
-def text_wrap_headers(path: Path | str):
-    '''Formats all worksheets in provided workbook so that headers are text wrapped'''
-    try:
-        path = Path(path)
-        wb = xw.Book(path)
-
-        for sheet in wb.sheets:
-            row = sheet.range('1:1').expand('right')
-            # row.select()
-            row.column_width = 10
-            row.api.WrapText = True
-        
-        wb.save(path)
-    finally:
-        if wb: wb.close()
+class StreamingWorkbookWriter:
+    '''
+    Builds an output workbook (one worksheet per exhibit) in a single pass with openpyxl write-only mode
+    Rows are streamed to disk as each worksheet is written, so memory use does not grow with the number of exhibits
+    Headers are text wrapped as they are written; workbook is saved once, on close (no Excel required)
+    '''
 
-    # open
-    # loop through worksheets
-    #     text wrap top line
\ No newline at end of file
+    def __init__(self, path: Path | str, header_width: float = 10, logger: logging.Logger | None = None):
+        self.path = Path(path)
+        self.header_width = header_width
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet_names = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_sheet(self, sheet_name: str, columns: dict):
+        '''
+        Write worksheet from {header: column values}; each column is written as a block under its header
+        Scalars (e.g. empty separator columns, annual reintroduction) take a single cell
+        '''
+        sheet = self.workbook.create_sheet(title=sheet_name)
+        for col in range(1, len(columns) + 1):
+            sheet.column_dimensions[get_column_letter(col)].width = self.header_width
+
+        header_row = []
+        for header in columns:
+            cell = WriteOnlyCell(sheet, value=header)
+            cell.alignment = Alignment(wrap_text=True)
+            header_row.append(cell)
+        sheet.append(header_row)
+
+        blocks = [values if isinstance(values, (list, tuple)) else [values] for values in columns.values()]
+        for row in zip_longest(*blocks):
+            sheet.append(row)
+        self.sheet_names.append(sheet_name)
+        self.logger.info(f'Worksheet {sheet_name} written')
+
+    def close(self):
+        '''Save workbook (skipped if no worksheets were written)'''
+        if self.workbook is None:
+            return
+        try:
+            if self.sheet_names:
+                self.workbook.save(self.path)
+                self.logger.info(f'Output workbook saved ({self.path.name}, {len(self.sheet_names)} worksheets)')
+        finally:
+            self.workbook = None
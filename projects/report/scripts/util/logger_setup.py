@@ -1,61 +1,122 @@
 from pathlib import Path
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 from datetime import datetime
 
-def setup_loggers(directory):
-    '''Setup loggers for different logging info'''
+#loggers returned by setup_loggers and the log files/terminal each one writes to
+LOGGER_NAMES = ('main', 'warnings', 'details', 'console')
+MAIN_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DETAIL_FORMAT = '%(asctime)s - %(message)s'
+
+#queue listener (and its handlers) of the current setup: {'directory', 'pid', 'listener', 'registered'}
+_state = {}
+
+class LazyMessage:
+    '''
+    Log message built only when a handler formats the record (on the queue listener thread)
+    e.g. detail_logger.info(LazyMessage(format_lines, scenario_inputs)); nothing is built if the logger level is off
+    '''
+    __slots__ = ('function', 'args')
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return self.function(*self.args)
+
+class _LoggerFilter(logging.Filter):
+    '''Pass records of the named loggers only (routes records from the shared queue to the right files)'''
+    def __init__(self, *names):
+        super().__init__()
+        self.names = set(names)
+
+    def filter(self, record):
+        return record.name in self.names
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''Enqueue records unformatted so messages (and LazyMessages) are formatted on the listener thread'''
+    def prepare(self, record):
+        return record
+
+def _file_handler(path, log_format, *logger_names):
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter(log_format))
+    handler.addFilter(_LoggerFilter(*logger_names))
+    return handler
+
+def setup_loggers(directory, detail_logging = True):
+    '''
+    Setup loggers for different logging info
+    Records are put on a queue and written by one background listener with one handler per log file, so log I/O stays
+    off the scenario loop. Calling again for the same directory returns the same loggers; a new directory replaces the setup
+    detail_logging: False turns the details logger off (detail messages are then never built)
+    '''
+    directory = Path(directory)
+    if _state.get('listener') and _state['pid'] == os.getpid() and _state['directory'] == directory:
+        return _loggers()
+    close_loggers()
 
     # Create timestamped folder for this run
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     log_dir = directory / 'logs'
     log_dir.mkdir(parents=True, exist_ok=True)
 
-    #main logger for general info
-    main_logger = logging. getLogger('main')
-    main_logger.setLevel(logging.INFO)
-    main_handler = logging.FileHandler(log_dir / 'main_log.log')
-    main_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    main_handler.setFormatter(main_formatter)
-    main_logger.addHandler(main_handler)
-    #also write to detailed log
-    main_detail_handler = logging.FileHandler(log_dir / 'detailed_outputs.log')
-    main_detail_formatter = logging.Formatter('%(asctime)s - %(message)s')
-    main_detail_handler.setFormatter(main_detail_formatter)
-    main_logger.addHandler(main_detail_handler)
-
-    # Warning logger for warnings and errors
-    warning_logger = logging.getLogger('warnings')
-    warning_logger.setLevel(logging.WARNING)
-    warning_handler = logging.FileHandler(log_dir / 'warnings.log')
-    warning_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    warning_handler.setFormatter(warning_formatter)
-    warning_logger.addHandler(warning_handler)
-        
-    # Detailed logger for detailed variable outputs
-    detail_logger = logging.getLogger('details')
-    detail_logger.setLevel(logging.INFO)
-    detail_handler = logging.FileHandler(log_dir / 'detailed_outputs.log')
-    detail_formatter = logging.Formatter('%(asctime)s - %(message)s')
-    detail_handler.setFormatter(detail_formatter)
-    detail_logger.addHandler(detail_handler)
-
-    #setup console logger for logging to main log file AND console
-    console_logger = logging.getLogger('console')
-    console_logger.setLevel(logging.INFO)
-    #file specific setup
-    console_file_handler = logging.FileHandler(log_dir / 'main_log.log')
-    console_file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    console_file_handler.setFormatter(console_file_formatter)
-    console_logger.addHandler(console_file_handler)
-    #terminal setup
+    #one handler per file: main log (main and console loggers), detailed outputs (main and details loggers) and warnings
+    handlers = [
+        _file_handler(log_dir / 'main_log.log', MAIN_FORMAT, 'main', 'console'),
+        _file_handler(log_dir / 'detailed_outputs.log', DETAIL_FORMAT, 'main', 'details'),
+        _file_handler(log_dir / 'warnings.log', MAIN_FORMAT, 'warnings'),
+    ]
+    #console logger also writes to terminal
     console_handler = logging.StreamHandler()
-    console_formatter = logging.Formatter('%(message)s')
-    console_handler.setFormatter(console_formatter)
-    console_logger.addHandler(console_handler)
+    console_handler.setFormatter(logging.Formatter('%(message)s'))
+    console_handler.addFilter(_LoggerFilter('console'))
+    handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+
+    levels = {
+        'main': logging.INFO,
+        'warnings': logging.WARNING,
+        'details': logging.INFO if detail_logging else logging.WARNING,
+        'console': logging.INFO,
+    }
+    for name, level in levels.items():
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+    if not _state.get('registered'):
+        #write queued records before the interpreter exits
+        atexit.register(close_loggers)
+    _state.update(directory=directory, pid=os.getpid(), listener=listener, registered=True)
+    return _loggers()
 
-    main_logger.propagate = False
-    warning_logger.propagate = False
-    detail_logger.propagate = False
-    console_logger.propagate = False
+def _loggers():
+    return tuple(logging.getLogger(name) for name in LOGGER_NAMES)
 
-    return main_logger, warning_logger, detail_logger, console_logger
\ No newline at end of file
+def close_loggers():
+    '''
+    Write queued records, close log files and detach handlers added by setup_loggers
+    (e.g. between runs in one process, so logs go to the new run folder)
+    '''
+    listener = _state.pop('listener', None)
+    #a forked worker process inherits the setup of its parent but not the listener thread
+    if listener is not None and _state.get('pid') == os.getpid():
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    for name in LOGGER_NAMES:
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            handler.close()
+            logger.removeHandler(handler)
+    _state.pop('directory', None)
@@ -0,0 +1,292 @@
+'''
+Local HTTP/JSON service evaluating single REA scenarios (total outputs) for notebooks and other tools
+Concurrent requests arriving within a short window are coalesced into one batch (one vectorized pass with the native
+engine, see analysis_util.evaluate_scenarios_total_batch), and each request gets its own result:
+    python -m util.model_service total_exhibits_config.json
+    POST /evaluate  {"scenario_name": "s1", "inputs": {"number_killed": 1000, ...}}  (missing inputs use input_values_default)
+        -> {"scenario_name": "s1", "outputs": {output csv row}, "qc_test": "PASS"}
+    GET /metrics    -> requests, throughput, batch sizes and request latency
+    GET /health
+Settings are read from the model_service section of the config file:
+    "model_service": {"host": "127.0.0.1", "port": 8765, "batch_window_ms": 5, "max_batch_size": 256}
+The service needs the native engine ("model_engine": "native" in the misc section): batches are only vectorized by the
+native engine, and an Excel instance cannot be driven from the service's batching thread
+Inputs must be numbers (whole numbers for the int fields of REAScenarioInputs); an invalid request or input gets a 400
+response, a failure of the model a 500 response
+'''
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import itertools
+import json
+import logging
+import math
+from pathlib import Path
+import queue
+import threading
+import time
+import numpy as np
+import chincheron_util.config as config_util
+import models.rea.backends as rea_backends
+import models.rea.inputs as rea_input_class
+import util.analysis_util as analysis_util
+import util.logger_setup as logger_setup
+from util.constants import *
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_BATCH_WINDOW_MS = 5
+DEFAULT_MAX_BATCH_SIZE = 256
+#number of most recent requests and batches kept for latency and batch size percentiles
+METRICS_WINDOW = 10000
+#type of each scenario input (int or float), so service rows match rows of the runners
+INPUT_TYPES = {field_name: field.type for field_name, field in rea_input_class.REAScenarioInputs.__dataclass_fields__.items()}
+
+class ScenarioInputError(ValueError):
+    '''Raised for scenario inputs a request may not send (unknown fields, values that are not numbers of the field's type)'''
+
+class MicroBatcher:
+    '''
+    Coalesces items submitted from many threads into batches for evaluate_batch (list of items -> list of results)
+    A batch is started by the first waiting item and closed after window_seconds or when max_batch_size items are waiting
+    '''
+
+    def __init__(self, evaluate_batch, window_seconds = DEFAULT_BATCH_WINDOW_MS / 1000, max_batch_size = DEFAULT_MAX_BATCH_SIZE):
+        self.evaluate_batch = evaluate_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.pending = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.failed = 0
+        self.batches = 0
+        self.batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self.batch_seconds = deque(maxlen=METRICS_WINDOW)
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self.pending.put((item, future, time.perf_counter()))
+        return future
+
+    def _next_batch(self):
+        batch = [self.pending.get()]
+        deadline = time.perf_counter() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch[0][0] is None:
+                return
+            start = time.perf_counter()
+            results, errors = self._evaluate([item for item, _, _ in batch])
+            end = time.perf_counter()
+            with self.lock:
+                self.batches += 1
+                self.batch_sizes.append(len(batch))
+                self.batch_seconds.append(end - start)
+                for (_, future, submitted), result, error in zip(batch, results, errors):
+                    self.requests += 1
+                    self.latencies.append(end - submitted)
+                    if error is None:
+                        future.set_result(result)
+                    else:
+                        self.failed += 1
+                        future.set_exception(error)
+
+    def _evaluate(self, items):
+        '''Results and errors of a batch; if the batch fails, items are retried one at a time so only failing items get the error'''
+        try:
+            return self.evaluate_batch(items), [None] * len(items)
+        except Exception as e:
+            if len(items) == 1:
+                return [None], [e]
+        results, errors = [], []
+        for item in items:
+            result, error = self._evaluate([item])
+            results += result
+            errors += error
+        return results, errors
+
+    def close(self):
+        self.pending.put((None, Future(), time.perf_counter()))
+        self.thread.join()
+
+    def metrics(self) -> dict:
+        '''Throughput since start, batch sizes and latencies (seconds) of recent batches and requests'''
+        def percentiles(values):
+            if not values:
+                return None
+            values = np.array(values)
+            return {'mean': float(values.mean()), 'p50': float(np.percentile(values, 50)), 'p95': float(np.percentile(values, 95)),
+                    'p99': float(np.percentile(values, 99)), 'max': float(values.max())}
+        with self.lock:
+            uptime = time.perf_counter() - self.started
+            return {
+                'uptime_seconds': uptime,
+                'requests': self.requests,
+                'failed_requests': self.failed,
+                'batches': self.batches,
+                'requests_per_second': self.requests / uptime if uptime else 0.0,
+                'batch_size': percentiles(self.batch_sizes),
+                'batch_seconds': percentiles(self.batch_seconds),
+                'latency_seconds': percentiles(self.latencies),
+            }
+
+class ModelService:
+    '''
+    Model backend behind a MicroBatcher; evaluate() is called from any thread and returns (output csv row, QC result)
+    Without a backend given, the config file must use the native engine
+    '''
+
+    def __init__(self, config, rea_file: Path | str | None = None, backend = None, main_logger = None, warning_logger = None, detail_logger = None):
+        engine = config['misc'].get('model_engine', rea_backends.DEFAULT_ENGINE)
+        if backend is None and engine != 'native':
+            raise ValueError(f'Model service needs the native engine (set "model_engine": "native" in the misc section of the config file, not "{engine}")')
+        self.config = config
+        service_config = config.get('model_service', {})
+        self.default_values = config['excel']['input_values_default']
+        self.loggers = tuple(logger if logger is not None else logging.getLogger(__name__) for logger in (main_logger, warning_logger, detail_logger))
+        self.backend = backend if backend is not None else rea_backends.create_backend(config, rea_file, *self.loggers[:2])
+        self.scenario_numbers = itertools.count(1)
+        self.batcher = MicroBatcher(self._evaluate_batch, service_config.get('batch_window_ms', DEFAULT_BATCH_WINDOW_MS) / 1000,
+                                    service_config.get('max_batch_size', DEFAULT_MAX_BATCH_SIZE))
+
+    def open(self):
+        self.backend.open()
+
+    def close(self):
+        self.batcher.close()
+        self.backend.close()
+
+    def _evaluate_batch(self, scenarios):
+        return analysis_util.evaluate_scenarios_total_batch(self.backend, self.config, scenarios, *self.loggers)
+
+    def evaluate(self, scenario_inputs: dict, scenario_name = None, timeout = None):
+        '''
+        Total outputs of one scenario (inputs not given are filled from input_values_default)
+        Raises ScenarioInputError for invalid inputs; errors of the model are raised as they are
+        '''
+        if not isinstance(scenario_inputs, dict):
+            raise ScenarioInputError(f'Scenario inputs must be an object of input values, not {scenario_inputs!r}')
+        unknown = set(scenario_inputs) - set(rea_input_class.INPUT_FIELDS)
+        if unknown:
+            raise ScenarioInputError(f'Unknown scenario inputs {sorted(unknown)} (expected {rea_input_class.INPUT_FIELDS})')
+        inputs = {field_name: coerce_input(field_name, scenario_inputs.get(field_name, self.default_values.get(field_name)))
+                  for field_name in rea_input_class.INPUT_FIELDS}
+        scenario_number = next(self.scenario_numbers)
+        return self.batcher.submit((scenario_number, scenario_name or f'request {scenario_number}', inputs)).result(timeout)
+
+def coerce_input(field_name, value):
+    '''
+    Scenario input converted to the type of its REAScenarioInputs field (e.g. 1000.0 -> 1000 for number_killed)
+    Checked here: the engine would otherwise replace values it cannot read with defaults
+    '''
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ScenarioInputError(f'Scenario input "{field_name}" must be a number, not {value!r}')
+    if isinstance(value, bool) or not math.isfinite(number):
+        raise ScenarioInputError(f'Scenario input "{field_name}" must be a finite number, not {value!r}')
+    if INPUT_TYPES[field_name] is int:
+        if not number.is_integer():
+            raise ScenarioInputError(f'Scenario input "{field_name}" must be a whole number, not {value!r}')
+        return int(number)
+    return number
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    '''JSON endpoints of the service (server.service is the ModelService)'''
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, self.server.service.batcher.metrics())
+        elif self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/evaluate':
+            self._send(404, {'error': f'Unknown path {self.path}'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            scenario_inputs, scenario_name = request.get('inputs', {}), request.get('scenario_name')
+        except (ValueError, AttributeError) as e:
+            self._send(400, {'error': f'Invalid request: {e}'})
+            return
+        #only invalid inputs are the client's fault; anything raised by the model is a server error
+        try:
+            csv_data, qc_test = self.server.service.evaluate(scenario_inputs, scenario_name)
+        except ScenarioInputError as e:
+            self._send(400, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send(500, {'error': repr(e)})
+            return
+        self._send(200, {'scenario_name': csv_data['Scenario_name'], 'outputs': csv_data, 'qc_test': qc_test})
+
+    def log_message(self, format, *args):
+        #request lines go to the detail log instead of stderr
+        logging.getLogger('details').info(format, *args)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    #bursts of concurrent clients are what the batching is for (default listen backlog is 5)
+    request_queue_size = 128
+
+def create_server(service: ModelService, host = DEFAULT_HOST, port = DEFAULT_PORT) -> ThreadingHTTPServer:
+    server = _Server((host, port), _RequestHandler)
+    server.service = service
+    return server
+
+def serve(config_file: Path | str):
+    '''Run the service for the model of a config file until interrupted (Ctrl+C)'''
+    config = config_util.load_config(CONFIG_DIR / config_file)
+    service_config = config.get('model_service', {})
+    directory = Path(RESULTS_DIR) / 'model_service' / f'service_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    main_logger, warning_logger, detail_logger, console_logger = logger_setup.setup_loggers(directory, config['misc'].get('detail_logging', True))
+    rea_file = Path(config['directories']['copy_source']) / config['files']['rea_file']
+
+    service = ModelService(config, rea_file, None, main_logger, warning_logger, detail_logger)
+    service.open()
+    server = create_server(service, service_config.get('host', DEFAULT_HOST), service_config.get('port', DEFAULT_PORT))
+    console_logger.info(f'Model service listening on http://{server.server_address[0]}:{server.server_address[1]} (logs in {directory})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        main_logger.info(json.dumps(service.batcher.metrics()))
+        service.close()
+        console_logger.info(f'Model service stopped')
+        logger_setup.close_loggers()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('config', help='config file whose model the service evaluates (model_service section sets host, port and batching)')
+    args = parser.parse_args()
+    serve(args.config)
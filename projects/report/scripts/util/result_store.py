@@ -0,0 +1,205 @@
+'''
+Columnar store of yearly results (Arrow IPC files, requires the optional pyarrow package)
+A store is a directory holding two tables and the series of each exhibit:
+    scenarios.arrow -> one row per exhibit scenario: exhibit, scenario number and name, scenario inputs and scalar outputs
+    series.arrow    -> one row per exhibit scenario and year: exhibit, scenario number, year index and one float column per yearly series
+    exhibits.json   -> {exhibit: [series names in exhibit order]}
+Columns have fixed types (numbers are stored as float64) and rows are written in record batches as scenarios are added
+Files are uncompressed so they can be memory-mapped: selecting a few scenarios or series only touches those columns
+The Excel output workbook is a view generated from the store (wide_outputs / export_workbook)
+Settings are read from the result_store section of the config file:
+    "result_store": {"enabled": true}
+'''
+import json
+import logging
+from pathlib import Path
+from util.excel_util import StreamingWorkbookWriter
+from models.rea.inputs import INPUT_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+SCENARIOS_FILE = 'scenarios.arrow'
+SERIES_FILE = 'series.arrow'
+EXHIBITS_FILE = 'exhibits.json'
+SCALAR_FIELDS = ('annual_reintroduction_exact', 'annual_reintroduction_rounded')
+#rows buffered before a record batch is written
+ROWS_PER_BATCH = 65536
+
+def available() -> bool:
+    return pa is not None
+
+class _TableWriter:
+    '''Arrow IPC file written one record batch at a time; rows are buffered column by column and converted to the schema types'''
+
+    def __init__(self, path, schema, rows_per_batch):
+        self.schema = schema
+        self.rows_per_batch = rows_per_batch
+        self.sink = pa.OSFile(str(path), 'wb')
+        self.writer = pa.ipc.new_file(self.sink, schema)
+        self.columns = {name: [] for name in schema.names}
+        self.rows = 0
+        self.written = 0
+
+    def write(self, columns: dict, rows):
+        '''Append rows ({column: list of values}); columns not given are null'''
+        unknown = set(columns) - set(self.columns)
+        if unknown:
+            raise ValueError(f'Columns {sorted(unknown)} are not in the result store schema')
+        for name, column in self.columns.items():
+            column.extend(columns.get(name, [None] * rows))
+        self.rows += rows
+        if self.rows >= self.rows_per_batch:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        arrays = [pa.array(self.columns[field.name], field.type) for field in self.schema]
+        self.writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self.written += self.rows
+        self.columns = {name: [] for name in self.schema.names}
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        self.sink.close()
+
+def _read_table(path):
+    '''Memory-map Arrow IPC file (no copy of column data until values are used)'''
+    return pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+
+class ResultStoreWriter:
+    '''
+    Writes exhibit scenarios to the store in record batches of rows_per_batch rows (the store is complete when closed)
+    Use add_scenario for each exhibit scenario, in the order they should appear in the Excel view
+    series_names: every yearly series an exhibit may hold (one float64 column each)
+    '''
+
+    def __init__(self, path: Path | str, series_names, logger: logging.Logger | None = None, rows_per_batch = ROWS_PER_BATCH):
+        if not available():
+            raise ImportError('pyarrow is required to write a result store (pip install pyarrow)')
+        self.path = Path(path)
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.path.mkdir(parents=True, exist_ok=True)
+        key_fields = [pa.field('exhibit', pa.string()), pa.field('scenario_number', pa.int64())]
+        scenario_schema = pa.schema(key_fields + [pa.field('scenario_name', pa.string())]
+                                    + [pa.field(name, pa.float64()) for name in (*INPUT_FIELDS, *SCALAR_FIELDS)])
+        series_schema = pa.schema(key_fields + [pa.field('year_index', pa.int64())] + [pa.field(name, pa.float64()) for name in series_names])
+        self.scenarios = _TableWriter(self.path / SCENARIOS_FILE, scenario_schema, rows_per_batch)
+        self.series = _TableWriter(self.path / SERIES_FILE, series_schema, rows_per_batch)
+        self.exhibits = {}
+        self.closed = False
+
+    @classmethod
+    def from_config(cls, config, path: Path | str, logger = None, warning_logger = None):
+        '''Create writer from the result_store section of the config file; returns None if disabled or pyarrow is missing'''
+        if not config.get('result_store', {}).get('enabled', False):
+            return None
+        if not available():
+            (warning_logger or logging.getLogger(__name__)).warning('Result store enabled in config but pyarrow is not installed; results not stored')
+            return None
+        return cls(path, list(config['excel']['output_cells_excluded_yearly']), logger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_scenario(self, exhibit, scenario_number, scenario_name, scenario_inputs: dict, scalars: dict, series: dict):
+        '''series: {name: list of yearly values (scalars are stored as one year)}'''
+        self.exhibits.setdefault(exhibit, list(series))
+        scenario_name = None if scenario_name is None else str(scenario_name)
+        row = {'exhibit': exhibit, 'scenario_number': scenario_number, 'scenario_name': scenario_name, **scenario_inputs, **scalars}
+        self.scenarios.write({key: [value] for key, value in row.items()}, 1)
+
+        series = {name: values if isinstance(values, list) else [values] for name, values in series.items()}
+        years = max((len(values) for values in series.values()), default=0)
+        columns = {'exhibit': [exhibit] * years, 'scenario_number': [scenario_number] * years, 'year_index': list(range(years))}
+        for name, values in series.items():
+            columns[name] = values + [None] * (years - len(values))
+        self.series.write(columns, years)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.scenarios.close()
+        self.series.close()
+        (self.path / EXHIBITS_FILE).write_text(json.dumps(self.exhibits))
+        self.logger.info(f'Result store written: {self.scenarios.written} scenarios, {self.series.written} yearly rows ({self.path})')
+
+class ResultStore:
+    '''Read access to a result store; tables are memory-mapped and filtered before values are converted'''
+
+    def __init__(self, path: Path | str):
+        if not available():
+            raise ImportError('pyarrow is required to read a result store (pip install pyarrow)')
+        self.path = Path(path)
+        self.scenario_table = _read_table(self.path / SCENARIOS_FILE)
+        self.series_table = _read_table(self.path / SERIES_FILE)
+        self.exhibit_series = json.loads((self.path / EXHIBITS_FILE).read_text())
+
+    def exhibits(self) -> list:
+        return list(self.exhibit_series)
+
+    @staticmethod
+    def _filter(table, exhibit = None, scenario_numbers = None):
+        if exhibit is not None:
+            table = table.filter(pc.equal(table['exhibit'], exhibit))
+        if scenario_numbers is not None:
+            table = table.filter(pc.is_in(table['scenario_number'], pa.array(list(scenario_numbers), table.schema.field('scenario_number').type)))
+        return table
+
+    def scenarios(self, exhibit = None, scenario_numbers = None, columns = None):
+        '''Scenario inputs and scalar outputs (DataFrame), optionally for one exhibit, some scenarios and some columns'''
+        table = self._filter(self.scenario_table, exhibit, scenario_numbers)
+        if columns is not None:
+            table = table.select(['exhibit', 'scenario_number', *columns])
+        return table.to_pandas()
+
+    def series(self, exhibit = None, scenario_numbers = None, series = None):
+        '''Yearly series in long layout (DataFrame, one row per scenario and year), optionally for some scenarios and series'''
+        if series is not None:
+            table = self.series_table.select(['exhibit', 'scenario_number', 'year_index', *series])
+        else:
+            table = self.series_table
+        return self._filter(table, exhibit, scenario_numbers).to_pandas()
+
+    def wide_outputs(self, exhibit) -> dict:
+        '''
+        Exhibit results laid out for the Excel output worksheet ({header: column values}):
+        per scenario an empty column, "<scenario>:<series>" columns and annual reintroduction
+        '''
+        series_names = self.exhibit_series[exhibit]
+        scenarios = self._filter(self.scenario_table, exhibit).select(
+            ['scenario_number', 'scenario_name', 'annual_reintroduction_rounded', 'annual_reintroduction_exact']).to_pylist()
+        series_table = self._filter(self.series_table.select(['exhibit', 'scenario_number', *series_names]), exhibit)
+        scenario_column = series_table['scenario_number'].to_pylist()
+
+        outputs = {}
+        start = 0
+        for scenario in scenarios:
+            #rows of a scenario are contiguous and in scenario order
+            end = start
+            while end < len(scenario_column) and scenario_column[end] == scenario['scenario_number']:
+                end += 1
+            scenario_name = scenario['scenario_name']
+            outputs[scenario_name] = ''
+            for name in series_names:
+                outputs[f'{scenario_name}:{name}'] = series_table[name].slice(start, end - start).to_pylist()
+            outputs[f'{scenario_name}: Annual Reintroduction Rounded'] = scenario['annual_reintroduction_rounded']
+            outputs[f'{scenario_name}: Annual Reintroduction Exact'] = scenario['annual_reintroduction_exact']
+            start = end
+        return outputs
+
+def export_workbook(store: ResultStore, output_file: Path | str, logger = None):
+    '''Write Excel view of the store: one worksheet per exhibit'''
+    with StreamingWorkbookWriter(output_file, logger=logger) as workbook:
+        for exhibit in store.exhibits():
+            workbook.write_sheet(exhibit, store.wide_outputs(exhibit))
@@ -0,0 +1,101 @@
+'''
+Progress journal for resuming interrupted runs
+One JSON line is appended (and synced to disk) for each finished scenario, holding everything written to the
+run's output files for that scenario, so a resumed run can rebuild consistent outputs and skip finished scenarios
+A line cut short by a crash is discarded when the journal is reopened
+'''
+import json
+import logging
+import os
+from pathlib import Path
+
+JOURNAL_FILE = 'progress_journal.jsonl'
+
+def _json_default(value):
+    '''numpy scalars (e.g. inputs read from a scenario table) are stored as python numbers'''
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} values cannot be written to the run journal')
+
+class RunJournal:
+    '''
+    Append-only journal of finished scenarios (and finished exhibits for yearly runs) in a run directory
+    Entries: {"type": "run" | "scenario" | "exhibit" | "finished", ...}
+    '''
+
+    def __init__(self, run_directory: Path | str, logger: logging.Logger | None = None):
+        self.path = Path(run_directory) / JOURNAL_FILE
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.entries = []
+        self.file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        '''Load existing entries (dropping an incomplete last line) and open journal for appending'''
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self._load()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('incomplete line')
+                    self.entries.append(json.loads(line))
+                except ValueError:
+                    self.logger.warning(f'Run journal: discarded incomplete entry at end of {self.path.name}')
+                    break
+                valid_bytes += len(line)
+        if valid_bytes < self.path.stat().st_size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        self.logger.info(f'Run journal loaded: {len(self.entries)} entries')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def record(self, entry: dict):
+        '''Append entry as one line and sync it to disk before returning'''
+        line = json.dumps(entry, default=_json_default) + '\n'
+        self.file.write(line)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.entries.append(json.loads(line))
+
+    def record_scenario(self, scenario_number, exhibit = None, **data):
+        self.record({'type': 'scenario', 'exhibit': exhibit, 'scenario_number': int(scenario_number), **data})
+
+    def record_exhibit(self, exhibit, **data):
+        self.record({'type': 'exhibit', 'exhibit': exhibit, **data})
+
+    def scenarios(self, exhibit = None) -> dict:
+        '''Finished scenarios for exhibit (None for total runs): {scenario number: entry}'''
+        return {
+            entry['scenario_number']: entry for entry in self.entries
+            if entry['type'] == 'scenario' and entry.get('exhibit') == exhibit
+        }
+
+    def results(self) -> dict:
+        '''Finished scenarios by scenario key: {key: entry}'''
+        return {
+            entry['key']: entry for entry in self.entries
+            if entry['type'] == 'scenario' and entry.get('key')
+        }
+
+    def finished_exhibits(self) -> set:
+        return {entry['exhibit'] for entry in self.entries if entry['type'] == 'exhibit'}
+
+    def header(self) -> dict | None:
+        '''First "run" entry (script and config file of the original run)'''
+        return next((entry for entry in self.entries if entry['type'] == 'run'), None)
@@ -0,0 +1,96 @@
+'''
+Per-stage timing of runs (config load, file copy, model open, input set, goal seek, recalculate, output read, csv write, QC)
+Durations of each stage are collected with RunMetrics.span and summarized per run (count, total, mean, p50, p95, max)
+into a machine-readable metrics file in the run directory
+Counts per event (e.g. goal seek evaluations per scenario) are collected with RunMetrics.count and summarized the same way
+'''
+from contextlib import contextmanager
+import cProfile
+import json
+import logging
+from pathlib import Path
+import time
+import numpy as np
+
+METRICS_FILE = 'run_metrics.json'
+PROFILE_FILE = 'profile.prof'
+
+class RunMetrics:
+    '''Collects durations (seconds) of each run stage and counts of other per-event quantities'''
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        self.durations.setdefault(stage, []).append(seconds)
+
+    def count(self, name, value):
+        self.counts.setdefault(name, []).append(value)
+
+    def merge(self, durations: dict, counts: dict | None = None):
+        '''Add durations (and counts) collected elsewhere (e.g. RunMetrics.durations returned by a worker process)'''
+        for stage, values in durations.items():
+            self.durations.setdefault(stage, []).extend(values)
+        for name, values in (counts or {}).items():
+            self.counts.setdefault(name, []).extend(values)
+
+    def summary(self, values_by_name: dict | None = None) -> dict:
+        '''{stage: {count, total, mean, p50, p95, max}} in seconds (or of values_by_name, e.g. counts)'''
+        summary = {}
+        for stage, values in (self.durations if values_by_name is None else values_by_name).items():
+            values = np.array(values)
+            summary[stage] = {
+                'count': len(values),
+                'total': float(values.sum()),
+                'mean': float(values.mean()),
+                'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)),
+                'max': float(values.max()),
+            }
+        return summary
+
+    def write(self, run_directory: Path | str, logger: logging.Logger | None = None, **run_info) -> Path:
+        '''Write run info (script, config file, runtime, ...) and stage summary to the metrics file; log one line per stage'''
+        path = Path(run_directory) / METRICS_FILE
+        summary = self.summary()
+        counts = self.summary(self.counts)
+        with open(path, 'w') as f:
+            json.dump({**run_info, 'stages': summary, **({'counts': counts} if counts else {})}, f, indent=2)
+        if logger is not None:
+            log_lines = ['Stage timings (seconds): count, mean, p50, p95, max, total']
+            for stage, stats in summary.items():
+                log_lines.append(f'  {stage}: {stats["count"]}, {stats["mean"]:.4f}, {stats["p50"]:.4f}, {stats["p95"]:.4f}, {stats["max"]:.4f}, {stats["total"]:.2f}')
+            for name, stats in counts.items():
+                log_lines.append(f'  {name} (count): {stats["count"]}, {stats["mean"]:.2f}, {stats["p50"]:.1f}, {stats["p95"]:.1f}, {stats["max"]:.0f}, {stats["total"]:.0f}')
+            logger.info('\n'.join(log_lines))
+        return path
+
+def default_metrics(metrics: RunMetrics | None) -> RunMetrics:
+    '''Functions taking an optional metrics argument time into a throwaway collector when none is passed'''
+    return metrics if metrics is not None else RunMetrics()
+
+def start_profile(enabled) -> cProfile.Profile | None:
+    if not enabled:
+        return None
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+def stop_profile(profile: cProfile.Profile | None, run_directory: Path | str, logger: logging.Logger | None = None):
+    '''Stop profiler and dump stats to the run directory (view with python -m pstats or snakeviz)'''
+    if profile is None:
+        return
+    profile.disable()
+    path = Path(run_directory) / PROFILE_FILE
+    profile.dump_stats(path)
+    if logger is not None:
+        logger.info(f'Profile written to {path}')
@@ -0,0 +1,255 @@
+'''
+Run plan: several analysis configs run as one plan of jobs (see run_analyses.py)
+Each job is a config file and a kind: total (scenario input file or sweep), yearly (figure configs) or monte_carlo
+    total_exhibits_config.json yearly_exhibits_config.json monte_carlo:total_exhibits_config.json
+(kind is yearly for configs with a config_folder for figure configs and total otherwise, unless given as a prefix)
+Input files are copied once per copy source folder into the plan folder and every job copies its inputs from there,
+so all jobs use the same snapshot of the REA workbook and the source folder is read once
+Jobs on the same Excel or compiled workbook run one after another in one process sharing one loaded model; other jobs
+(native engine, Monte Carlo, other workbooks) run concurrently in separate processes
+The plan folder (results/working/<plan>_<timestamp>) holds the staged inputs, console output of each job and
+run_plan.json with the status, runtime and results directory of each job
+'''
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+import json
+import logging
+import multiprocessing
+import os
+from pathlib import Path
+import queue
+import sys
+import time
+import traceback
+import chincheron_util.config as config_util
+import chincheron_util.file_util as file_util
+import models.rea.backends as rea_backends
+import util.analysis_util as analysis_util
+import util.logger_setup as logger_setup
+from util.constants import *
+
+PLAN_FILE = 'run_plan.json'
+JOB_KINDS = {
+    'total': analysis_util.run_rea_scenario_total,
+    'yearly': analysis_util.run_rea_scenario_yearly,
+    'monte_carlo': analysis_util.run_rea_monte_carlo,
+}
+#engines whose loaded model is worth sharing between jobs (the native engine loads nothing)
+SHARED_ENGINES = ('excel', 'compiled')
+
+@dataclass
+class Job:
+    '''One analysis of a run plan'''
+    kind: str
+    config_file: str
+    config: dict = field(repr=False)
+    staged_inputs: Path | None = None
+
+    @classmethod
+    def from_spec(cls, spec: str):
+        '''Create job from "[kind:]config_file"'''
+        kind, separator, config_file = spec.rpartition(':')
+        #windows paths (C:\\...) have a drive letter before the colon
+        if not separator or kind not in JOB_KINDS:
+            kind, config_file = None, spec
+        config = config_util.load_config(CONFIG_DIR / config_file)
+        if kind is None:
+            kind = 'yearly' if 'config_folder' in config['directories'] else 'total'
+        return cls(kind, config_file, config)
+
+    @property
+    def name(self) -> str:
+        '''Name of results directory and output files (config file name without "_config", like the entry scripts)'''
+        return Path(self.config_file).stem.removesuffix('_config')
+
+    @property
+    def label(self) -> str:
+        return f'{self.kind}:{self.name}'
+
+    def model_key(self) -> tuple | None:
+        '''Jobs with the same key can share one loaded model; None if the job has no model worth sharing'''
+        engine = self.config['misc'].get('model_engine', rea_backends.DEFAULT_ENGINE)
+        #Monte Carlo runs the native engine; parallel total runs load a model in each of their own workers
+        if self.kind == 'monte_carlo' or engine not in SHARED_ENGINES or (self.kind == 'total' and self.config['misc'].get('workers', 1) > 1):
+            return None
+        excel_config = self.config['excel']
+        #backends read input cells, sheet name and total output cells from the config they were created with
+        backend_settings = {key: excel_config.get(key) for key in ('sheet_name', 'input_cells', 'output_cells_excluded')}
+        return (engine, str(Path(self.config['directories']['copy_source']) / self.config['files']['rea_file']),
+                json.dumps(backend_settings, sort_keys=True), json.dumps(self.config.get('compiled_model'), sort_keys=True))
+
+@dataclass
+class JobGroup:
+    '''Jobs run one after another in one process (sharing a loaded model if model_key is set)'''
+    jobs: list[Job]
+    model_key: tuple | None = None
+
+def build_plan(specs: list[str]) -> list[JobGroup]:
+    '''Jobs from "[kind:]config_file" specs, grouped by shared model (jobs keep the order given within a group)'''
+    jobs = [Job.from_spec(spec) for spec in specs]
+    #results directories are named after the job (Monte Carlo runs add "_monte_carlo")
+    directory_names = [(job.name, job.kind == 'monte_carlo') for job in jobs]
+    duplicates = sorted({job.label for job, name in zip(jobs, directory_names) if directory_names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f'Jobs would write to the same results directory: {duplicates}')
+
+    groups = {}
+    plan = []
+    for job in jobs:
+        key = job.model_key()
+        if key is None:
+            plan.append(JobGroup([job]))
+        elif key in groups:
+            groups[key].jobs.append(job)
+        else:
+            groups[key] = JobGroup([job], key)
+            plan.append(groups[key])
+    return plan
+
+def stage_inputs(plan: list[JobGroup], plan_directory: Path, logger: logging.Logger):
+    '''Copy input files of all jobs once per copy source folder into the plan folder (sets staged_inputs of each job)'''
+    sources = {}
+    for group in plan:
+        for job in group.jobs:
+            sources.setdefault(job.config['directories']['copy_source'], []).append(job)
+    for number, (copy_source, jobs) in enumerate(sources.items(), start=1):
+        staged_inputs = plan_directory / 'inputs' / f'source_{number}'
+        file_names = {name for job in jobs for name in job.config['files'].values()}
+        file_util.copy_input_from_config(copy_source, staged_inputs, {name: name for name in sorted(file_names)})
+        logger.info(f'Staged {len(file_names)} input files from {copy_source} for {[job.label for job in jobs]}')
+        for job in jobs:
+            job.staged_inputs = staged_inputs
+
+@contextmanager
+def _redirect_output(path):
+    '''Send everything written to stdout and stderr (including handlers holding the original streams) to path'''
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    with open(path, 'a') as output:
+        os.dup2(output.fileno(), 1)
+        os.dup2(output.fileno(), 2)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            for descriptor in saved:
+                os.close(descriptor)
+
+def _open_shared_backend(group: JobGroup, plan_directory: Path):
+    '''Load the model of a group once (logs of loading go to the plan folder)'''
+    job = group.jobs[0]
+    main_logger, warning_logger, _, _ = logger_setup.setup_loggers(plan_directory / 'models' / job.name)
+    backend = rea_backends.create_backend(job.config, job.staged_inputs / job.config['files']['rea_file'], main_logger, warning_logger)
+    backend.open()
+    return backend
+
+def _run_group(group: JobGroup, plan_directory: Path, options: dict, events):
+    '''
+    Run the jobs of a group in this (worker) process and put progress events on events:
+    ('started', label), ('finished', label, seconds, results directory) or ('failed', label, seconds, error)
+    Console output of each job goes to jobs/<kind>_<name>.log in the plan folder
+    '''
+    backend = None
+    output_dir = plan_directory / 'jobs'
+    output_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        for job in group.jobs:
+            events.put(('started', job.label))
+            start = time.perf_counter()
+            with _redirect_output(output_dir / f'{job.kind}_{job.name}.log'):
+                try:
+                    if group.model_key is not None and backend is None:
+                        backend = _open_shared_backend(group, plan_directory)
+                    if job.kind == 'monte_carlo':
+                        kwargs = {'profile': options['profile']}
+                    else:
+                        kwargs = {**options, 'staged_inputs': job.staged_inputs, 'shared_backend': backend}
+                    results_directory = JOB_KINDS[job.kind](job.config_file, script_name=job.name, **kwargs)
+                    events.put(('finished', job.label, time.perf_counter() - start, str(results_directory)))
+                except Exception as e:
+                    traceback.print_exc()
+                    events.put(('failed', job.label, time.perf_counter() - start, repr(e)))
+                    #the model may be left in a bad state; the next job of the group loads it again
+                    if backend is not None:
+                        backend.close()
+                        backend = None
+                finally:
+                    logger_setup.close_loggers()
+    finally:
+        if backend is not None:
+            backend.close()
+
+def run_plan(specs: list[str], max_workers: int | None = None, use_cache = True, incremental = False, profile = False, plan_name = 'run_analyses') -> int:
+    '''
+    Run the jobs of several analysis configs as one plan with combined progress
+    max_workers: number of job groups run at the same time (default: all)
+    Returns exit status: 0 if every job finished, 1 otherwise
+    '''
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    start = time.perf_counter()
+    plan_directory = Path(RESULTS_DIR) / f'{plan_name}_{timestamp}'
+    main_logger, warning_logger, _, console_logger = logger_setup.setup_loggers(plan_directory)
+
+    plan = build_plan(specs)
+    jobs = {job.label: job for group in plan for job in group.jobs}
+    for number, group in enumerate(plan, start=1):
+        shared = ' (shared model)' if group.model_key is not None else ''
+        main_logger.info(f'Group {number}{shared}: {[job.label for job in group.jobs]}')
+    stage_inputs(plan, plan_directory, main_logger)
+
+    status = {label: {'kind': job.kind, 'config_file': job.config_file, 'status': 'pending'} for label, job in jobs.items()}
+    options = {'use_cache': use_cache, 'incremental': incremental, 'profile': profile}
+    max_workers = max_workers or len(plan)
+    console_logger.info(f'Running {len(jobs)} jobs in {len(plan)} groups ({max_workers} at a time)')
+
+    def handle(event):
+        label = event[1]
+        if event[0] == 'started':
+            status[label]['status'] = 'running'
+            console_logger.info(f'{label} started')
+            return
+        status[label].update(status=event[0], seconds=round(event[2], 1))
+        if event[0] == 'finished':
+            status[label]['results_directory'] = event[3]
+        else:
+            status[label]['error'] = event[3]
+            warning_logger.warning(f'{label} failed: {event[3]} (see jobs/{label.replace(":", "_")}.log)')
+        done = sum(entry['status'] in ('finished', 'failed') for entry in status.values())
+        console_logger.info(f'[{done}/{len(jobs)} jobs] {label} {event[0]} in {event[2]:.1f} seconds')
+
+    #spawned workers start clean (no inherited log listener or Excel state)
+    context = multiprocessing.get_context('spawn')
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        events = manager.Queue()
+        futures = {executor.submit(_run_group, group, plan_directory, options, events): group for group in plan}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            while True:
+                try:
+                    handle(events.get_nowait())
+                except queue.Empty:
+                    break
+            for future in finished:
+                if future.exception() is not None:
+                    #worker process died; jobs of its group that did not report are failed
+                    for job in futures[future].jobs:
+                        if status[job.label]['status'] in ('pending', 'running'):
+                            handle(('failed', job.label, 0.0, repr(future.exception())))
+
+    failed = [label for label, entry in status.items() if entry['status'] != 'finished']
+    run_time = time.perf_counter() - start
+    with open(plan_directory / PLAN_FILE, 'w') as f:
+        json.dump({'started': timestamp, 'run_seconds': run_time,
+                   'groups': [[job.label for job in group.jobs] for group in plan], 'jobs': status}, f, indent=2)
+    if failed:
+        console_logger.info(f'{len(failed)} of {len(jobs)} jobs failed: {failed}')
+    console_logger.info(f'Run plan finished in {run_time:.1f} seconds (see {plan_directory / PLAN_FILE})')
+    logger_setup.close_loggers()
+    return 1 if failed else 0
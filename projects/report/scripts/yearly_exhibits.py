@@ -1,3 +1,4 @@
+import argparse
 from pathlib import Path
 from datetime import datetime
 import util.file_util as file_util
@@ -17,7 +18,17 @@ import util.analysis_util as analysis_util
 
 if __name__ == "__main__":
     CONFIG_FILE = 'yearly_exhibits_config.json'
-    analysis_util.run_rea_scenario_yearly(CONFIG_FILE)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--no-cache', action='store_true', help='rerun every scenario instead of reusing results from the result cache')
+    parser.add_argument('--resume', metavar='RUN_DIR', help='continue an interrupted run in this results directory, skipping finished scenarios')
+    parser.add_argument('--incremental', action='store_true', help='only rerun scenarios added or changed since the last run; carry forward the rest')
+    parser.add_argument('--watch', action='store_true', help='run incrementally whenever input files or configs change')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile dump of the run to the results directory')
+    args = parser.parse_args()
+    if args.watch:
+        analysis_util.watch_inputs(analysis_util.run_rea_scenario_yearly, CONFIG_FILE, use_cache=not args.no_cache)
+    else:
+        analysis_util.run_rea_scenario_yearly(CONFIG_FILE, use_cache=not args.no_cache, resume=args.resume, incremental=args.incremental, profile=args.profile)
 
     # how to deal with config file (i.e., where to specify, here or in analysis_util)
 